@@ -1,13 +1,41 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
 from contextlib import asynccontextmanager
 import uvicorn
+from services import jobs, r_pool
+
+class EventStreamAwareGZipMiddleware:
+    """
+    GZipMiddleware for every response except Server-Sent Events. The
+    Starlette that fastapi 0.104 pins gzips text/event-stream like any other
+    body, and the compressor holds events back until enough bytes pile up,
+    so job progress would arrive in bursts or only at the end. Event streams
+    are recognised from the request (the /events routes, or an Accept of
+    text/event-stream), since the middleware must choose before the app runs.
+    """
+    def __init__(self, app, minimum_size: int = 500):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (
+            scope["path"].endswith("/events") or "text/event-stream" in Headers(scope=scope).get("accept", "")
+        ):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Load models, establish connections
+    # Warm the R workers so ltm/NOHARM are loaded once, not per request
+    await r_pool.start_pool()
     yield
     # Shutdown: Clean up resources
+    jobs.manager.shutdown()
+    await r_pool.shutdown_pool()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -19,6 +47,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress large responses (simulation results, response matrix pages) for clients that accept gzip
+app.add_middleware(EventStreamAwareGZipMiddleware, minimum_size=1000)
 
 # Import routers
 from routers import quiz, simulation, analysis
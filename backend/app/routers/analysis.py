@@ -1,12 +1,30 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Callable, List, Dict, Optional, Union
 from enum import Enum
+import json
 import numpy as np
 import pandas as pd
 from factor_analyzer import FactorAnalyzer
-import rpy2.robjects as robjects
-from rpy2.robjects import pandas2ri
+from services import irt_calibration
+from services.ctt import classical_statistics, item_flags
+from services.dimensionality import (
+    EIGENVALUE_FLOOR, category_counts, effective_observations, informative_items, kaiser_meyer_olkin,
+    parallel_analysis, polychoric_correlation, smooth_correlation
+)
+from services.irt_bootstrap import batches, replicate_seeds, run_replicates, summarize_replicates, BootstrapSummary
+from services.irt_estimation import fit_irt, item_fit
+from services.irt_information import (
+    category_information, information_curves, marginal_reliability, measurement_precision, theta_grid
+)
+from services.irt_models import POLYTOMOUS_MODELS, PolytomousParameters, parameters_from_lists, parameters_to_lists
+from services.irt_polytomous import fit_polytomous, polytomous_item_fit
+from services.analysis_cache import analysis_cache
+from services.jobs import Job, JobStatus, manager as job_manager
+from services.response_matrix import ResponseMatrix
+from services.storage import SimulationRecord, storage
 
 class AnalysisType(str, Enum):
     EFA = "efa"
@@ -16,6 +34,30 @@ class ModelType(str, Enum):
     RASCH = "rasch"
     TWO_PL = "2pl"
     THREE_PL = "3pl"
+    GRM = "grm"  # graded response, for polytomous items
+    GPCM = "gpcm"  # generalized partial credit, for polytomous items
+
+class EstimationEngine(str, Enum):
+    NATIVE = "native"  # NumPy/SciPy marginal maximum likelihood
+    LTM = "ltm"  # R's ltm package, kept as a cross-check
+
+class AnalysisKind(str, Enum):
+    DIMENSIONALITY = "dimensionality"
+    IRT_FIT = "irt-fit"
+    BOOTSTRAP = "bootstrap"
+    CTT = "ctt"
+
+class BootstrapMethod(str, Enum):
+    NONPARAMETRIC = "nonparametric"  # resample students with replacement
+    PARAMETRIC = "parametric"  # simulate from the fitted model
+
+class ParallelAnalysisResult(BaseModel):
+    eigenvalues: List[float]  # observed, descending
+    simulated_mean: List[float]
+    simulated_percentile: List[float]
+    percentile: float
+    num_replicates: int
+    num_factors: int
 
 class DimensionalityResult(BaseModel):
     method: AnalysisType
@@ -23,80 +65,171 @@ class DimensionalityResult(BaseModel):
     factor_loadings: Dict[str, float]
     problematic_items: List[str]
     fit_statistics: Dict[str, float]
+    parallel_analysis: Optional[ParallelAnalysisResult] = None  # EFA only
 
 class IRTModelFit(BaseModel):
     model_type: ModelType
+    # Same layout for every model and fitting backend: [discrimination,
+    # difficulty] for Rasch and 2PL, [discrimination, difficulty, guessing]
+    # for 3PL, [discrimination, threshold_1, ..., threshold_K-1] for GRM/GPCM
     item_parameters: Dict[str, List[float]]
     model_fit_statistics: Dict[str, float]
     item_fit_statistics: Dict[str, Dict[str, float]]
 
+class BootstrapResult(BaseModel):
+    model_type: ModelType
+    method: BootstrapMethod
+    num_replicates: int  # completed so far
+    confidence_level: float
+    item_parameters: Dict[str, List[float]]  # full-sample estimates
+    # null until at least two replicates have finished
+    standard_errors: Dict[str, List[Optional[float]]]
+    confidence_intervals: Dict[str, List[Optional[List[float]]]]  # [lower, upper] per parameter
+
+class OptionStatistics(BaseModel):
+    option: str
+    proportion: float
+    point_biserial: float  # choosing the option vs. total score
+    mean_item_score: Optional[float] = None  # None if nobody chose it
+    is_key: bool
+
+class ClassicalTestResult(BaseModel):
+    alpha: float
+    num_students: int
+    item_statistics: Dict[str, Dict[str, float]]
+    distractors: Dict[str, List[OptionStatistics]] = {}  # simulations that stored the chosen options
+    flagged_items: Dict[str, List[str]]  # item -> reasons, flagged items only
+
+class RefinementRequest(BaseModel):
+    simulation_id: str
+    problematic_items: Optional[List[str]] = None  # defaults to the items CTT flags
+
+class ItemRefinement(BaseModel):
+    item_id: str
+    action: str  # "remove", "revise" or "keep"
+    reasons: List[str]
+    statistics: Dict[str, float]
+
+class RefinementResult(BaseModel):
+    simulation_id: str
+    alpha: float
+    items: List[ItemRefinement]
+
 class TestInformation(BaseModel):
     test_information_curve: Dict[str, List[float]]
     item_information_curves: Dict[str, Dict[str, List[float]]]
     reliability_coefficient: float
     measurement_precision: Dict[str, float]
 
+class AnalysisJobRequest(BaseModel):
+    simulation_id: str
+    analysis: AnalysisKind
+    analysis_type: AnalysisType = AnalysisType.EFA  # dimensionality only
+    model_type: ModelType = ModelType.TWO_PL  # irt-fit only
+    engine: EstimationEngine = EstimationEngine.NATIVE  # irt-fit only
+    incremental: bool = False  # irt-fit only, native engine
+    num_replicates: int = Field(200, ge=2, le=10000)  # bootstrap only
+    bootstrap_method: BootstrapMethod = BootstrapMethod.NONPARAMETRIC  # bootstrap only
+    confidence_level: float = Field(0.95, gt=0, lt=1)  # bootstrap only
+    seed: Optional[int] = None  # bootstrap only
+
+class AnalysisJob(BaseModel):
+    job_id: str
+    analysis: AnalysisKind
+    simulation_id: str
+    status: JobStatus
+    progress: Dict[str, float]
+    error: Optional[str] = None
+    result: Optional[Union[DimensionalityResult, IRTModelFit, BootstrapResult, ClassicalTestResult]] = None
+
 router = APIRouter()
 
-def perform_efa_analysis(data: pd.DataFrame) -> DimensionalityResult:
+ANALYSIS_KINDS = {kind.value for kind in AnalysisKind}
+PARALLEL_ANALYSIS_REPLICATES = 200
+PARALLEL_ANALYSIS_PERCENTILE = 95.0
+# Flags that make removing an item, rather than revising it, the suggestion. An
+# alpha that rises by less than ctt.MIN_ALPHA_GAIN without the item
+# ("alpha_increases_slightly_if_deleted") only calls for a revision.
+REMOVAL_FLAGS = {"negative_discrimination", "alpha_increases_if_deleted"}
+TOO_FEW_VARYING_ITEMS = "EFA needs at least two items that students answered in more than one category"
+
+def perform_efa_analysis(data: ResponseMatrix) -> DimensionalityResult:
     """
     Perform Exploratory Factor Analysis to check dimensionality.
+    
+    Works on polychoric (tetrachoric for 0/1 items) correlations over the
+    students who answered both items, so unseen items are skipped rather than
+    imputed. The number of factors comes from Horn's parallel analysis (see
+    services/dimensionality.py) over the items whose categories all have
+    enough students, or over every item that varies when fewer than two
+    have; loadings are those of a one-factor model of all items.
     """
-    # Standardize the data
-    fa = FactorAnalyzer(rotation=None, n_factors=1)
-    fa.fit(data)
+    polychoric = polychoric_correlation(data)
+    items = informative_items(polychoric.category_counts)
+    if len(items) < 2:
+        items = informative_items(polychoric.category_counts, min_count=1)
+    if len(items) < 2:
+        raise ValueError(TOO_FEW_VARYING_ITEMS)
+    informative = np.ix_(items, items)
+    parallel = parallel_analysis(
+        polychoric.correlation[informative],
+        effective_observations(polychoric.num_observations[informative]),
+        num_replicates=PARALLEL_ANALYSIS_REPLICATES,
+        percentile=PARALLEL_ANALYSIS_PERCENTILE,
+        seed=0,  # deterministic, so cached and recomputed results agree
+        standard_error=polychoric.standard_error[informative]
+    )
+    
+    fa = FactorAnalyzer(rotation=None, n_factors=1, is_corr_matrix=True)
+    fa.fit(smooth_correlation(polychoric.correlation))
     
     # Get factor loadings
     loadings = fa.loadings_
-    loadings_dict = {f"item_{i+1}": float(loading[0]) 
-                    for i, loading in enumerate(loadings)}
+    loadings_dict = {item_id: float(loading[0]) 
+                    for item_id, loading in zip(data.item_ids, loadings)}
     
     # Calculate fit statistics
-    variance_explained = fa.get_factor_variance()[0][0]
-    eigenvalues = fa.get_eigenvalues()[0]
+    variance_explained = fa.get_factor_variance()[1][0]  # proportion of total variance
+    eigenvalues = parallel.eigenvalues
+    # Sampling adequacy of the observed (Pearson) correlations
+    kmo, _ = kaiser_meyer_olkin(data.pairwise_correlation())
     
     # Identify problematic items (loading < 0.3)
     problematic = [item for item, loading in loadings_dict.items() 
                   if abs(loading) < 0.3]
     
-    # Check unidimensionality (using various criteria)
-    is_unidimensional = (
-        variance_explained >= 0.2 and  # At least 20% variance explained
-        eigenvalues[0] / eigenvalues[1] >= 3  # Ratio criterion
-    )
-    
     return DimensionalityResult(
         method=AnalysisType.EFA,
-        is_unidimensional=is_unidimensional,
+        is_unidimensional=parallel.num_factors == 1,
         factor_loadings=loadings_dict,
         problematic_items=problematic,
         fit_statistics={
+            "num_factors": float(parallel.num_factors),
             "variance_explained": float(variance_explained),
-            "eigenvalue_ratio": float(eigenvalues[0] / eigenvalues[1]),
-            "kaiser_meyer_olkin": float(fa.kmo_)
-        }
+            "eigenvalue_ratio": float(eigenvalues[0] / max(eigenvalues[1], EIGENVALUE_FLOOR)),
+            "kaiser_meyer_olkin": float(kmo)
+        },
+        parallel_analysis=ParallelAnalysisResult(
+            eigenvalues=parallel.eigenvalues.tolist(),
+            simulated_mean=parallel.simulated_mean.tolist(),
+            simulated_percentile=parallel.simulated_percentile.tolist(),
+            percentile=parallel.percentile,
+            num_replicates=parallel.num_replicates,
+            num_factors=parallel.num_factors
+        )
     )
 
 def perform_noharm_analysis(data: pd.DataFrame) -> DimensionalityResult:
     """
     Perform NOHARM analysis using R through rpy2.
+    
+    Runs inside an R worker (see services/r_pool.py), where NOHARM and the
+    `perform_noharm` helper are already loaded.
     """
-    # Convert pandas DataFrame to R dataframe
-    pandas2ri.activate()
-    r_dataframe = pandas2ri.py2rpy(data)
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
     
-    # Load and run NOHARM analysis through R
-    robjects.r('''
-        library(NOHARM)
-        perform_noharm <- function(data) {
-            model <- NOHARM(data, factors=1)
-            list(
-                loadings=model$loadings,
-                fit=model$fit,
-                rmsr=model$rmsr
-            )
-        }
-    ''')
+    r_dataframe = pandas2ri.py2rpy(data)
     
     # Get results from R
     r_results = robjects.r['perform_noharm'](r_dataframe)
@@ -122,31 +255,20 @@ def perform_noharm_analysis(data: pd.DataFrame) -> DimensionalityResult:
 
 def fit_rasch_model(data: pd.DataFrame) -> IRTModelFit:
     """
-    Fit Rasch model using R's ltm package.
+    Fit Rasch model using R's ltm package. Runs inside an R worker.
     """
-    pandas2ri.activate()
-    r_dataframe = pandas2ri.py2rpy(data)
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
     
-    # Load and run Rasch analysis through R
-    robjects.r('''
-        library(ltm)
-        fit_rasch <- function(data) {
-            model <- rasch(data)
-            list(
-                coef=coef(model),
-                aic=AIC(model),
-                bic=BIC(model),
-                item_fit=itemfit(model)
-            )
-        }
-    ''')
+    r_dataframe = pandas2ri.py2rpy(data)
     
     r_results = robjects.r['fit_rasch'](r_dataframe)
     
-    # Convert parameters to Python dictionary
+    # coef is items x (Dffclt, Dscrmn), the discrimination shared by all items
+    coef = np.asarray(r_results.rx2('coef'))
     item_parameters = {
-        f"item_{i+1}": [float(diff)]  # Only difficulty parameter for Rasch
-        for i, diff in enumerate(r_results.rx2('coef'))
+        f"item_{i+1}": [float(disc), float(diff)]
+        for i, (diff, disc) in enumerate(coef)
     }
     
     return IRTModelFit(
@@ -167,30 +289,19 @@ def fit_rasch_model(data: pd.DataFrame) -> IRTModelFit:
 
 def fit_2pl_model(data: pd.DataFrame) -> IRTModelFit:
     """
-    Fit 2PL model using R's ltm package.
+    Fit 2PL model using R's ltm package. Runs inside an R worker.
     """
-    pandas2ri.activate()
-    r_dataframe = pandas2ri.py2rpy(data)
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
     
-    robjects.r('''
-        library(ltm)
-        fit_2pl <- function(data) {
-            model <- ltm(data ~ z1)
-            list(
-                coef=coef(model),
-                aic=AIC(model),
-                bic=BIC(model),
-                item_fit=itemfit(model)
-            )
-        }
-    ''')
+    r_dataframe = pandas2ri.py2rpy(data)
     
     r_results = robjects.r['fit_2pl'](r_dataframe)
     
-    # Extract discrimination and difficulty parameters
+    # coef is items x (Dffclt, Dscrmn); emit [discrimination, difficulty]
     coef_matrix = np.array(r_results.rx2('coef'))
     item_parameters = {
-        f"item_{i+1}": [float(coef_matrix[i,0]), float(coef_matrix[i,1])]  # [discrimination, difficulty]
+        f"item_{i+1}": [float(coef_matrix[i,1]), float(coef_matrix[i,0])]
         for i in range(coef_matrix.shape[0])
     }
     
@@ -210,6 +321,276 @@ def fit_2pl_model(data: pd.DataFrame) -> IRTModelFit:
         }
     )
 
+def fit_irt_native(
+    data: ResponseMatrix,
+    model_type: ModelType,
+    simulation_id: Optional[str] = None,
+    progress: Optional[Callable[[int, float], None]] = None
+) -> IRTModelFit:
+    """
+    Fit a Rasch, 2PL, 3PL, GRM or GPCM model by marginal maximum likelihood
+    (EM with Gauss-Hermite quadrature) without going through R. Missing
+    responses are skipped rather than imputed.
+    
+    With a `simulation_id` the fit is incremental: rows appended since the
+    simulation's previous fit are folded into its stored EM state and
+    item-fit tables.
+    """
+    item_ids = data.item_ids
+    if model_type.value in POLYTOMOUS_MODELS:
+        estimate = fit_polytomous(data, model_type.value, progress=progress)
+        chi_square, df, p_values = polytomous_item_fit(data, estimate)
+    else:
+        if simulation_id is not None:
+            estimate, (chi_square, df, p_values) = irt_calibration.calibrate_with_item_fit(
+                simulation_id, data, model_type.value, progress=progress
+            )
+        else:
+            estimate = fit_irt(data, model_type.value, progress=progress)
+            chi_square, df, p_values = item_fit(data, estimate)
+    
+    return IRTModelFit(
+        model_type=model_type,
+        item_parameters=parameters_to_lists(estimate.params, model_type.value, item_ids),
+        model_fit_statistics={
+            "aic": float(estimate.aic),
+            "bic": float(estimate.bic),
+            "log_likelihood": float(estimate.log_likelihood),
+            "iterations": float(estimate.n_iter),
+            "converged": float(estimate.converged)
+        },
+        item_fit_statistics={
+            item_id: {
+                "chi_square": float(chi_square[j]),
+                "df": float(df[j]),
+                "p_value": float(p_values[j])
+            }
+            for j, item_id in enumerate(item_ids)
+        }
+    )
+
+def perform_ctt_analysis(
+    data: ResponseMatrix,
+    max_scores: List[float],
+    choices: Optional[ResponseMatrix] = None,
+    options: Optional[List[List[str]]] = None
+) -> ClassicalTestResult:
+    """
+    Classical test theory screening: p-values, item-total and corrected
+    item-total correlations, Cronbach's alpha and alpha-if-deleted, plus a
+    distractor analysis when the chosen options were stored (see
+    services/ctt.py). Distractors are only flagged on dichotomous quizzes.
+    """
+    num_options = [len(item_options) for item_options in options] if options is not None else None
+    items, distractors = classical_statistics(data, max_scores, choices, num_options)
+    dichotomous = all(score == 1 for score in max_scores)
+    flags = item_flags(items, distractors if dichotomous else None, num_options)
+    
+    item_statistics = {
+        item_id: {
+            "num_answered": float(items.num_answered[j]),
+            "mean": float(items.mean[j]),
+            "p_value": float(items.p_value[j]),
+            "item_total": float(items.item_total[j]),
+            "corrected_item_total": float(items.corrected_item_total[j]),
+            "alpha_if_deleted": float(items.alpha_if_deleted[j])
+        }
+        for j, item_id in enumerate(data.item_ids)
+    }
+    option_statistics = {}
+    if distractors is not None:
+        option_statistics = {
+            item_id: [
+                OptionStatistics(
+                    option=option,
+                    proportion=float(distractors.proportion[j, k]),
+                    point_biserial=float(distractors.point_biserial[j, k]),
+                    mean_item_score=None if np.isnan(distractors.mean_item_score[j, k])
+                    else float(distractors.mean_item_score[j, k]),
+                    is_key=bool(distractors.key[j] == k)
+                )
+                for k, option in enumerate(options[j])
+            ]
+            for j, item_id in enumerate(data.item_ids)
+        }
+    return ClassicalTestResult(
+        alpha=items.alpha,
+        num_students=data.shape[0],
+        item_statistics=item_statistics,
+        distractors=option_statistics,
+        flagged_items={item_id: reasons for item_id, reasons in zip(data.item_ids, flags) if reasons}
+    )
+
+def load_simulation_record(simulation_id: str) -> SimulationRecord:
+    record = storage.load_simulation(simulation_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Simulation {simulation_id} not found")
+    return record
+
+def load_response_data(simulation_id: str) -> ResponseMatrix:
+    """
+    Load the students x items response matrix of a simulation, memory-mapped
+    from storage.
+    """
+    data = storage.load_responses(simulation_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"Simulation {simulation_id} not found")
+    return data
+
+def check_fit_options(request: AnalysisJobRequest):
+    """Reject model, engine and incremental combinations no fitter supports."""
+    if request.incremental and request.model_type.value in POLYTOMOUS_MODELS:
+        raise HTTPException(
+            status_code=422, detail="Incremental calibration is only available for dichotomous models"
+        )
+    if request.engine == EstimationEngine.NATIVE:
+        return
+    if request.incremental:
+        raise HTTPException(
+            status_code=422, detail="Incremental calibration is only available with the native engine"
+        )
+    if request.model_type not in (ModelType.RASCH, ModelType.TWO_PL):
+        raise HTTPException(
+            status_code=422,
+            detail=f"{request.model_type.value} model is only available with the native engine"
+        )
+
+def submit_analysis(request: AnalysisJobRequest) -> Job:
+    """
+    Queue an analysis, reusing a pending, running or finished job for the
+    same response data, analysis and options. Results are looked up in and
+    written to the analysis cache, keyed by a fingerprint of the data.
+    """
+    if request.analysis == AnalysisKind.DIMENSIONALITY:
+        options = {"analysis_type": request.analysis_type.value}
+    elif request.analysis == AnalysisKind.IRT_FIT:
+        check_fit_options(request)
+        options = {
+            "model_type": request.model_type.value,
+            "engine": request.engine.value,
+            "incremental": request.incremental
+        }
+    elif request.analysis == AnalysisKind.CTT:
+        record = load_simulation_record(request.simulation_id)
+        choices = storage.load_choices(request.simulation_id)
+        options = {
+            "max_scores": record.max_scores,
+            "choices": choices.fingerprint() if choices is not None else None,
+            "options": record.options
+        }
+    else:
+        options = {
+            "model_type": request.model_type.value,
+            "num_replicates": request.num_replicates,
+            "method": request.bootstrap_method.value,
+            "confidence_level": request.confidence_level,
+            "seed": request.seed
+        }
+    data = load_response_data(request.simulation_id)
+    key = analysis_cache.make_key(data.fingerprint(), request.analysis.value, options)
+    existing = job_manager.find(key)
+    if existing is not None:
+        return existing
+    
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        return job_manager.completed(key, request.analysis.value, request.simulation_id, cached)
+    
+    def store(result):
+        analysis_cache.put(key, result, simulation_id=request.simulation_id)
+    
+    def submit(fn, *args, **kwargs) -> Job:
+        return job_manager.submit(
+            key, request.analysis.value, request.simulation_id, fn, *args, on_result=store, **kwargs
+        )
+    
+    if request.analysis == AnalysisKind.BOOTSTRAP:
+        # Point estimates (and warm starts) come from the regular, cached fit
+        fit_job = submit_analysis(request.model_copy(update={
+            "analysis": AnalysisKind.IRT_FIT,
+            "engine": EstimationEngine.NATIVE,
+            "incremental": False
+        }))
+        return job_manager.submit_task(
+            key, request.analysis.value, request.simulation_id,
+            lambda job: run_bootstrap(job, data, fit_job, request), on_result=store
+        )
+    
+    if request.analysis == AnalysisKind.CTT:
+        return submit(perform_ctt_analysis, data, record.max_scores, choices, record.options)
+    
+    if request.analysis == AnalysisKind.DIMENSIONALITY:
+        if request.analysis_type == AnalysisType.EFA:
+            if len(informative_items(category_counts(data), min_count=1)) < 2:
+                raise HTTPException(status_code=422, detail=TOO_FEW_VARYING_ITEMS)
+            return submit(perform_efa_analysis, data)
+        return submit(perform_noharm_analysis, data.to_dataframe(), engine="r")
+    
+    if request.engine == EstimationEngine.NATIVE:
+        calibration_id = request.simulation_id if request.incremental else None
+        return submit(fit_irt_native, data, request.model_type, calibration_id, reports_progress=True)
+    if request.model_type == ModelType.RASCH:
+        return submit(fit_rasch_model, data.to_dataframe(), engine="r")
+    return submit(fit_2pl_model, data.to_dataframe(), engine="r")
+
+def bootstrap_result(
+    fit: IRTModelFit, summary: BootstrapSummary, request: AnalysisJobRequest
+) -> BootstrapResult:
+    # A single replicate has no spread; NaN would also not survive JSON encoding
+    spread = summary.num_replicates >= 2
+    standard_errors, intervals = {}, {}
+    for j, (item_id, values) in enumerate(fit.item_parameters.items()):
+        n = len(values)
+        standard_errors[item_id] = [
+            float(se) if spread and np.isfinite(se) else None for se in summary.standard_error[j, :n]
+        ]
+        intervals[item_id] = [
+            [float(lower), float(upper)] if spread and np.isfinite(lower) and np.isfinite(upper) else None
+            for lower, upper in zip(summary.lower[j, :n], summary.upper[j, :n])
+        ]
+    return BootstrapResult(
+        model_type=fit.model_type,
+        method=request.bootstrap_method,
+        num_replicates=summary.num_replicates,
+        confidence_level=request.confidence_level,
+        item_parameters=fit.item_parameters,
+        standard_errors=standard_errors,
+        confidence_intervals=intervals
+    )
+
+async def run_bootstrap(job: Job, data: ResponseMatrix, fit_job: Job, request: AnalysisJobRequest) -> BootstrapResult:
+    """
+    Refit bootstrap replicates across the process pool, publishing the
+    intervals from the replicates finished so far after every batch.
+    """
+    fit = await fit_job.wait()
+    model_type = request.model_type.value
+    params = parameters_from_lists(fit.item_parameters, model_type)
+    seeds = replicate_seeds(request.num_replicates, request.seed)
+    # Several batches per worker, so partial results arrive while the rest run
+    args_list = [
+        (data, model_type, params, seed_batch, request.bootstrap_method.value)
+        for seed_batch in batches(seeds, 4 * job_manager.max_workers)
+    ]
+    tables = []
+    result = None
+    async for replicate_tables in job_manager.map(run_replicates, args_list):
+        tables.append(replicate_tables)
+        result = bootstrap_result(fit, summarize_replicates(np.concatenate(tables), request.confidence_level), request)
+        job.update({"completed": float(result.num_replicates), "replicates": float(request.num_replicates)}, result)
+    return result
+
+def job_to_response(job: Job) -> AnalysisJob:
+    return AnalysisJob(
+        job_id=job.id,
+        analysis=job.kind,
+        simulation_id=job.resource_id,
+        status=job.status,
+        progress=job.progress,
+        error=job.error,
+        result=job.result
+    )
+
 @router.post("/dimensionality", response_model=DimensionalityResult)
 async def check_dimensionality(
     simulation_id: str,
@@ -219,65 +600,257 @@ async def check_dimensionality(
     Check unidimensionality of test items using EFA or NOHARM.
     """
     try:
-        # Load response data for the simulation
-        # Note: You'll need to implement data loading from your database
-        data = pd.DataFrame()  # Replace with actual data loading
-        
-        if analysis_type == AnalysisType.EFA:
-            return perform_efa_analysis(data)
-        else:  # NOHARM
-            return perform_noharm_analysis(data)
+        job = submit_analysis(AnalysisJobRequest(
+            simulation_id=simulation_id,
+            analysis=AnalysisKind.DIMENSIONALITY,
+            analysis_type=analysis_type
+        ))
+        return await job.wait()
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/irt-fit", response_model=IRTModelFit)
 async def fit_irt_model(
     simulation_id: str,
-    model_type: ModelType
+    model_type: ModelType,
+    engine: EstimationEngine = EstimationEngine.NATIVE,
+    incremental: bool = False
 ):
     """
     Fit IRT model and analyze item characteristics.
+    
+    With `incremental=true`, responses appended to the simulation since its
+    last fit are folded into the previous calibration instead of refitting
+    every row from scratch.
     """
     try:
-        # Load response data for the simulation
-        # Note: You'll need to implement data loading from your database
-        data = pd.DataFrame()  # Replace with actual data loading
-        
-        if model_type == ModelType.RASCH:
-            return fit_rasch_model(data)
-        elif model_type == ModelType.TWO_PL:
-            return fit_2pl_model(data)
-        else:  # THREE_PL
-            # Implement 3PL model if needed
-            raise NotImplementedError("3PL model not implemented yet")
+        job = submit_analysis(AnalysisJobRequest(
+            simulation_id=simulation_id,
+            analysis=AnalysisKind.IRT_FIT,
+            model_type=model_type,
+            engine=engine,
+            incremental=incremental
+        ))
+        return await job.wait()
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/test-information/{simulation_id}", response_model=TestInformation)
-async def get_test_information(simulation_id: str):
+@router.post("/bootstrap", response_model=BootstrapResult)
+async def bootstrap_irt_fit(
+    simulation_id: str,
+    model_type: ModelType,
+    num_replicates: int = Query(200, ge=2, le=10000),
+    method: BootstrapMethod = BootstrapMethod.NONPARAMETRIC,
+    confidence_level: float = Query(0.95, gt=0, lt=1),
+    seed: Optional[int] = None
+):
     """
-    Get test information and item information curves.
+    Bootstrap standard errors and confidence intervals of the item parameters.
+    Submit it through `/jobs` instead to watch the intervals tighten while
+    replicates finish.
     """
     try:
-        # TODO: Implement test information calculation
-        # This will be implemented in the next step
-        raise NotImplementedError("Test information calculation not implemented yet")
+        job = submit_analysis(AnalysisJobRequest(
+            simulation_id=simulation_id,
+            analysis=AnalysisKind.BOOTSTRAP,
+            model_type=model_type,
+            num_replicates=num_replicates,
+            bootstrap_method=method,
+            confidence_level=confidence_level,
+            seed=seed
+        ))
+        return await job.wait()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/refine-items")
-async def refine_problematic_items(
+@router.post("/ctt", response_model=ClassicalTestResult)
+async def classical_test_analysis(simulation_id: str):
+    """
+    Screen items with classical test theory statistics before fitting IRT.
+    Results are cached per simulation.
+    """
+    try:
+        job = submit_analysis(AnalysisJobRequest(simulation_id=simulation_id, analysis=AnalysisKind.CTT))
+        return await job.wait()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jobs", response_model=AnalysisJob, status_code=202)
+async def create_analysis_job(request: AnalysisJobRequest):
+    """
+    Queue a dimensionality check, IRT fit, bootstrap or CTT screening and
+    return its job id right away.
+    Poll `GET /jobs/{job_id}` or stream `GET /jobs/{job_id}/events` for progress.
+    """
+    try:
+        return job_to_response(submit_analysis(request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJob)
+async def get_analysis_job(job_id: str):
+    """
+    Get the status, latest progress and (once completed) result of a job.
+    """
+    job = job_manager.get(job_id)
+    if job is None or job.kind not in ANALYSIS_KINDS:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_to_response(job)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    """
+    Stream job status and progress as server-sent events. The final
+    `completed` or `failed` event carries the result or error; progress events
+    of jobs with partial results (bootstrap) carry the result so far.
+    """
+    job = job_manager.get(job_id)
+    if job is None or job.kind not in ANALYSIS_KINDS:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    async def event_stream():
+        async for event in job.events():
+            if event["status"] == JobStatus.COMPLETED.value or job.result is not None:
+                event["result"] = jsonable_encoder(job.result)
+            elif event["status"] == JobStatus.FAILED.value:
+                event["error"] = job.error
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Hit/miss counters of the analysis result cache.
+    """
+    return analysis_cache.stats()
+
+@router.delete("/cache/{simulation_id}")
+async def invalidate_cache(simulation_id: str):
+    """
+    Drop cached analyses and finished jobs for a simulation, e.g. after its
+    responses were regenerated.
+    """
+    job_manager.invalidate(simulation_id)
+    irt_calibration.invalidate(simulation_id)
+    return {"simulation_id": simulation_id, "removed": analysis_cache.invalidate(simulation_id)}
+
+def compute_test_information(fit: IRTModelFit, theta: np.ndarray) -> TestInformation:
+    """
+    Evaluate item and test information, SEM and marginal reliability of a
+    fitted model on a theta grid. Polytomous items also get one curve per
+    response category.
+    """
+    params = parameters_from_lists(fit.item_parameters, fit.model_type.value)
+    curves = information_curves(theta, params)
+    grid = curves.theta.tolist()
+    item_curves = {
+        item_id: {"theta": grid, "information": curves.item_information[j].tolist()}
+        for j, item_id in enumerate(fit.item_parameters)
+    }
+    if isinstance(params, PolytomousParameters):
+        categories = category_information(theta, params)
+        for j, item_id in enumerate(fit.item_parameters):
+            for k in range(params.num_categories[j]):
+                item_curves[item_id][f"category_{k}"] = categories[j, k].tolist()
+    
+    return TestInformation(
+        test_information_curve={
+            "theta": grid,
+            "information": curves.test_information.tolist(),
+            "sem": curves.sem.tolist()
+        },
+        item_information_curves=item_curves,
+        reliability_coefficient=marginal_reliability(params),
+        measurement_precision=measurement_precision(curves, params)
+    )
+
+@router.get("/test-information/{simulation_id}", response_model=TestInformation)
+async def get_test_information(
     simulation_id: str,
-    problematic_items: List[str]
+    model_type: ModelType = ModelType.TWO_PL,
+    engine: EstimationEngine = EstimationEngine.NATIVE,
+    theta_min: float = -4.0,
+    theta_max: float = 4.0,
+    num_points: int = Query(81, ge=2, le=2001)
 ):
+    """
+    Get test information and item information curves.
+    
+    Uses the (cached) IRT fit for the simulation; the curves for a given fit
+    and grid are cached as well, so re-plotting is cheap.
+    """
+    try:
+        job = submit_analysis(AnalysisJobRequest(
+            simulation_id=simulation_id,
+            analysis=AnalysisKind.IRT_FIT,
+            model_type=model_type,
+            engine=engine
+        ))
+        key = analysis_cache.make_key(job.key, "test-information", {
+            "theta_min": theta_min, "theta_max": theta_max, "num_points": num_points
+        })
+        cached = analysis_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        fit = await job.wait()
+        information = compute_test_information(fit, theta_grid(theta_min, theta_max, num_points))
+        analysis_cache.put(key, information, simulation_id=simulation_id)
+        return information
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/refine-items", response_model=RefinementResult)
+async def refine_problematic_items(request: RefinementRequest):
     """
     Refine or suggest removal of problematic items.
+    
+    Suggests an action for each item from its (cached) CTT screening: remove
+    items that discriminate negatively or whose removal raises alpha by at
+    least ctt.MIN_ALPHA_GAIN, revise the other flagged items, keep the rest. Without `problematic_items`, every
+    flagged item is reviewed.
     """
     try:
-        # TODO: Implement item refinement logic
-        # This will be implemented in the next step
-        raise NotImplementedError("Item refinement not implemented yet")
+        ctt = await submit_analysis(AnalysisJobRequest(
+            simulation_id=request.simulation_id,
+            analysis=AnalysisKind.CTT
+        )).wait()
+        item_ids = request.problematic_items
+        if item_ids is None:
+            item_ids = list(ctt.flagged_items)
+        unknown = [item_id for item_id in item_ids if item_id not in ctt.item_statistics]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Unknown items: {', '.join(unknown)}")
+        
+        items = []
+        for item_id in item_ids:
+            reasons = ctt.flagged_items.get(item_id, [])
+            if REMOVAL_FLAGS.intersection(reasons):
+                action = "remove"
+            elif reasons:
+                action = "revise"
+            else:
+                action = "keep"
+            items.append(ItemRefinement(
+                item_id=item_id, action=action, reasons=reasons, statistics=ctt.item_statistics[item_id]
+            ))
+        return RefinementResult(simulation_id=request.simulation_id, alpha=ctt.alpha, items=items)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
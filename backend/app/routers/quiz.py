@@ -1,7 +1,14 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from enum import Enum
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+import json
+import uuid
+from services.jobs import Job, JobStatus, manager as job_manager
+from services.quiz_generation import FailedItem, generate_items
+from services.storage import storage
 
 class SchoolLevel(str, Enum):
     PRIMARY = "primary"
@@ -16,7 +23,7 @@ class QuizRequest(BaseModel):
     knowledge_point: str
     school_level: SchoolLevel
     item_type: ItemType
-    num_items: int
+    num_items: int = Field(gt=0, le=200)
 
 class QuizItem(BaseModel):
     id: int
@@ -25,33 +32,161 @@ class QuizItem(BaseModel):
     correct_answer: str
     explanation: Optional[str] = None
 
+class FailedQuizItem(BaseModel):
+    id: int
+    error: str
+
 class Quiz(BaseModel):
     id: str
     knowledge_point: str
     school_level: SchoolLevel
+    item_type: ItemType = ItemType.DICHOTOMOUS
     items: List[QuizItem]
+    # Items that could not be generated; the quiz keeps the rest
+    failed_items: List[FailedQuizItem] = []
+
+class QuizJob(BaseModel):
+    job_id: str
+    quiz_id: str
+    status: JobStatus
+    progress: Dict[str, float] = {}
+    error: Optional[str] = None
+    result: Optional[Quiz] = None  # items generated so far while running
 
 router = APIRouter()
 
+def parse_quiz_item(reply: Dict[str, Any], item_id: int, item_type: ItemType) -> QuizItem:
+    """
+    Validate one generated item. Raises ValueError (pydantic's
+    ValidationError is one) so that the item is regenerated.
+    """
+    item = QuizItem.model_validate({**reply, "id": item_id})
+    if not item.question.strip():
+        raise ValueError("Empty question")
+    if len(set(item.options)) != len(item.options):
+        raise ValueError("Duplicate options")
+    if item_type == ItemType.DICHOTOMOUS:
+        if len(item.options) < 2:
+            raise ValueError("A multiple-choice item needs at least two options")
+        if item.correct_answer not in item.options:
+            raise ValueError("The correct answer is not one of the options")
+    elif len(item.options) < 3:
+        raise ValueError("A partial-credit item needs at least three score levels")
+    return item
+
+async def run_generation(job: Job, quiz_id: str, request: QuizRequest) -> Quiz:
+    """
+    Collect items as they are generated, publishing the quiz so far after
+    each one. The finished quiz lists items in quiz order and is stored, along
+    with any items that failed; the job only fails if every item did.
+    """
+    partial = Quiz(
+        id=quiz_id,
+        knowledge_point=request.knowledge_point,
+        school_level=request.school_level,
+        item_type=request.item_type,
+        items=[]
+    )
+    items = generate_items(
+        request.knowledge_point,
+        request.school_level.value,
+        request.item_type.value,
+        request.num_items,
+        lambda reply, item_id: parse_quiz_item(reply, item_id, request.item_type)
+    )
+    async for item in items:
+        if isinstance(item, FailedItem):
+            partial.failed_items.append(FailedQuizItem(id=item.number, error=item.error))
+        else:
+            partial.items.append(item)
+        job.update({
+            "completed": float(len(partial.items)),
+            "failed": float(len(partial.failed_items)),
+            "items": float(request.num_items)
+        }, partial)
+    if not partial.items:
+        raise RuntimeError(f"No item could be generated: {partial.failed_items[0].error}")
+    quiz = partial.model_copy(update={
+        "items": sorted(partial.items, key=lambda item: item.id),
+        "failed_items": sorted(partial.failed_items, key=lambda item: item.id)
+    })
+    storage.save_quiz(jsonable_encoder(quiz))
+    return quiz
+
+def submit_generation(request: QuizRequest) -> Job:
+    quiz_id = uuid.uuid4().hex
+    return job_manager.submit_task(
+        ("quiz", quiz_id), "quiz", quiz_id, lambda job: run_generation(job, quiz_id, request)
+    )
+
+def job_to_response(job: Job) -> QuizJob:
+    return QuizJob(
+        job_id=job.id,
+        quiz_id=job.resource_id,
+        status=job.status,
+        progress=job.progress,
+        error=job.error,
+        result=job.result
+    )
+
 @router.post("/generate", response_model=Quiz)
 async def generate_quiz(request: QuizRequest):
     """
     Generate a math quiz based on the specified parameters.
     """
     try:
-        # TODO: Implement quiz generation logic using OpenAI
-        # This will be implemented in the next step
-        raise NotImplementedError("Quiz generation not implemented yet")
+        return await submit_generation(request).wait()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/jobs", response_model=QuizJob, status_code=202)
+async def submit_quiz_job(request: QuizRequest):
+    """
+    Start generating a quiz in the background and return its job at once.
+    Follow `/jobs/{job_id}/events` to receive items as they are written.
+    """
+    return job_to_response(submit_generation(request))
+
+@router.get("/jobs/{job_id}", response_model=QuizJob)
+async def get_quiz_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None or job.kind != "quiz":
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_to_response(job)
+
+@router.get("/jobs/{job_id}/events")
+async def quiz_job_events(job_id: str):
+    """
+    Stream a quiz job as server-sent events: one `item` event per generated
+    item, in the order they complete, and one `item_failed` event per item
+    that could not be generated, interleaved with the job's status and
+    progress events. Items finished before subscribing are sent first.
+    """
+    job = job_manager.get(job_id)
+    if job is None or job.kind != "quiz":
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    async def event_stream():
+        sent = set()
+        async for event in job.events():
+            quiz = job.result
+            for name, items in [("item", quiz.items), ("item_failed", quiz.failed_items)] if quiz is not None else []:
+                for item in items:
+                    if item.id not in sent:
+                        sent.add(item.id)
+                        yield f"event: {name}\ndata: {json.dumps(jsonable_encoder(item))}\n\n"
+            if event["status"] == JobStatus.FAILED.value:
+                event["error"] = job.error
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @router.get("/quiz/{quiz_id}", response_model=Quiz)
 async def get_quiz(quiz_id: str):
     """
     Retrieve a specific quiz by ID.
     """
-    try:
-        # TODO: Implement quiz retrieval logic
-        raise NotImplementedError("Quiz retrieval not implemented yet")
-    except Exception as e:
-        raise HTTPException(status_code=404, detail="Quiz not found") 
\ No newline at end of file
+    quiz = storage.load_quiz(quiz_id)
+    if quiz is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    return quiz
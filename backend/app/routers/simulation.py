@@ -1,13 +1,75 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from typing import Callable, List, Dict, Optional, Tuple
+from enum import Enum
+import asyncio
+import json
+import uuid
+import numpy as np
 import pandas as pd
-from pathlib import Path
+from services.analysis_cache import analysis_cache
+from services.jobs import Job, JobStatus, manager as job_manager
+from services.persona_simulation import Persona, SimulationItem, persona_ids, response_cache, simulate_quiz
+from services.persona_store import sample_personas
+from services.response_matrix import DenseResponseMatrix
+from services.storage import storage
+from services import wire_format
+from services.irt_models import POLYTOMOUS_MODELS, PolytomousParameters, check_parameter_lists, parameters_from_lists
+from services.irt_simulation import (
+    draw_item_parameters, draw_polytomous_parameters, simulate_responses as simulate_irt_responses
+)
+from routers.analysis import ModelType
+from routers.quiz import ItemType, Quiz, QuizItem
+
+class SimulationMethod(str, Enum):
+    IRT = "irt"
+    LLM = "llm"
 
 class SimulationRequest(BaseModel):
     quiz_id: str
-    num_students: int = 500
+    num_students: int = Field(500, ge=1)
     school_level: str
+    method: SimulationMethod = SimulationMethod.IRT
+    # IRT simulation settings. Item parameters use the IRTModelFit layout;
+    # when omitted, num_items parameter sets are drawn at random.
+    model_type: ModelType = ModelType.TWO_PL
+    item_parameters: Optional[Dict[str, List[float]]] = None
+    num_items: int = Field(20, ge=1)
+    num_categories: int = Field(4, ge=2)  # GRM/GPCM only
+    # Abilities come from the prior N(mean, sd) of each student's persona group
+    # (school level, see LEVEL_ABILITY_PRIORS). ability_mean/ability_sd
+    # override the prior of school_level and ability_priors those of any group;
+    # group_proportions mixes several groups (default: school_level only).
+    ability_mean: Optional[float] = None
+    ability_sd: Optional[float] = Field(None, gt=0)
+    ability_priors: Dict[str, Tuple[float, float]] = {}
+    group_proportions: Optional[Dict[str, float]] = None
+    seed: Optional[int] = None
+    # LLM simulation settings. Items default to those of the stored quiz
+    # (options of partial-credit items are score levels from no credit to
+    # full credit); item_type only applies to items given here.
+    items: Optional[List[QuizItem]] = None
+    item_type: ItemType = ItemType.DICHOTOMOUS
+    temperature: float = 0.7
+    # Leave out the per-student responses; page through them with
+    # GET /simulation/{simulation_id}/matrix instead
+    include_responses: bool = True
+
+    @model_validator(mode="after")
+    def check_irt_settings(self):
+        if self.item_parameters:
+            check_parameter_lists(self.item_parameters, self.model_type.value)
+        if any(sd <= 0 for _, sd in self.ability_priors.values()):
+            raise ValueError("ability_priors standard deviations must be positive")
+        if self.group_proportions is not None:
+            if any(share < 0 for share in self.group_proportions.values()) or sum(self.group_proportions.values()) <= 0:
+                raise ValueError("group_proportions must be non-negative and not all zero")
+            missing = set(self.group_proportions) - set(ability_priors(self))
+            if missing:
+                raise ValueError(f"No ability prior for group(s) {', '.join(sorted(missing))}; add them to ability_priors")
+        return self
 
 class StudentResponse(BaseModel):
     student_id: str
@@ -15,18 +77,262 @@ class StudentResponse(BaseModel):
     score: float
 
 class SimulationResult(BaseModel):
+    simulation_id: Optional[str] = None  # set once stored
     quiz_id: str
     responses: List[StudentResponse]
     summary_statistics: Dict[str, float]
 
+class SimulationJob(BaseModel):
+    job_id: str
+    status: JobStatus
+    progress: Dict[str, float] = {}
+    error: Optional[str] = None
+    result: Optional[SimulationResult] = None
+
 router = APIRouter()
 
-def load_student_personas(school_level: str) -> pd.DataFrame:
-    """Load student personas from CSV based on school level."""
-    file_path = Path(f"student_persona/{school_level}_students.csv")
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail=f"No persona file found for {school_level} level")
-    return pd.read_csv(file_path)
+def load_student_personas(
+    school_level: str,
+    num_students: Optional[int] = None,
+    seed: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Load (a sample of) student personas for a school level.
+
+    Persona files are cached per process and memory-mapped when an Arrow copy
+    exists, so only the sampled rows are materialised on each request.
+    """
+    try:
+        return sample_personas(school_level, num_students, seed=seed)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def summarize_responses(responses: np.ndarray, max_scores: Optional[np.ndarray] = None) -> Dict[str, float]:
+    """
+    Score and item summaries of a response matrix. Scores and item p-values
+    are proportions of `max_scores` (the top category code of each item, 1
+    for 0/1 items).
+    """
+    if max_scores is None:
+        max_scores = np.ones(responses.shape[1])
+    scores = responses.sum(axis=1) / max_scores.sum()
+    p_values = responses.mean(axis=0) / max_scores
+    return {
+        "num_students": float(responses.shape[0]),
+        "num_items": float(responses.shape[1]),
+        "mean_score": float(scores.mean()),
+        "std_score": float(scores.std()),
+        "min_score": float(scores.min()),
+        "max_score": float(scores.max()),
+        "mean_item_p_value": float(p_values.mean()),
+    }
+
+def to_student_responses(
+    responses: np.ndarray,
+    item_ids: List[str],
+    student_ids: List[str],
+    max_scores: Optional[np.ndarray] = None
+) -> List[StudentResponse]:
+    if max_scores is None:
+        max_scores = np.ones(responses.shape[1])
+    scores = responses.sum(axis=1) / max_scores.sum()
+    return [
+        StudentResponse(student_id=student_id, responses=dict(zip(item_ids, row)), score=float(score))
+        for student_id, row, score in zip(student_ids, responses.astype(str).tolist(), scores)
+    ]
+
+def store_simulation(
+    simulation_id: str,
+    request: SimulationRequest,
+    scores: np.ndarray,
+    item_ids: List[str],
+    max_scores: np.ndarray,
+    summary_statistics: Dict[str, float],
+    choices: Optional[np.ndarray] = None,
+    options: Optional[List[List[str]]] = None
+):
+    """
+    Persist the scored responses (and for LLM simulations the chosen options)
+    so analyses can load them by simulation_id. Safe to call from a worker
+    thread; finished jobs of a replaced simulation are dropped by
+    `run_simulation` on the event loop.
+    """
+    replaced = storage.load_simulation(simulation_id) is not None
+    storage.save_simulation(
+        simulation_id,
+        request.quiz_id,
+        request.method.value,
+        DenseResponseMatrix.from_array(scores, item_ids),
+        max_scores,
+        summary_statistics,
+        choices=DenseResponseMatrix.from_array(choices, item_ids) if choices is not None else None,
+        options=options
+    )
+    if replaced:
+        # Analyses of the old responses must not be served for the new ones
+        analysis_cache.invalidate(simulation_id)
+
+# Default ability priors (mean, sd) of the persona groups, on the scale of the
+# drawn item difficulties (b ~ N(0, 1)). Another school_level gets N(0, 1).
+LEVEL_ABILITY_PRIORS = {
+    "primary": (-1.0, 1.0),
+    "middle": (0.0, 1.0),
+    "undergraduate": (1.0, 1.0),
+}
+
+def ability_priors(request: SimulationRequest) -> Dict[str, Tuple[float, float]]:
+    priors = {**LEVEL_ABILITY_PRIORS, **request.ability_priors}
+    mean, sd = priors.get(request.school_level, (0.0, 1.0))
+    priors[request.school_level] = (
+        request.ability_mean if request.ability_mean is not None else mean,
+        request.ability_sd if request.ability_sd is not None else sd,
+    )
+    return priors
+
+def draw_groups(request: SimulationRequest, rng: np.random.Generator) -> np.ndarray:
+    """Persona group of every simulated student, in `group_proportions`."""
+    if not request.group_proportions:
+        return np.full(request.num_students, request.school_level)
+    labels = list(request.group_proportions)
+    shares = np.array([request.group_proportions[label] for label in labels], dtype=float)
+    return np.asarray(labels)[rng.choice(len(labels), size=request.num_students, p=shares / shares.sum())]
+
+def run_irt_simulation(request: SimulationRequest, simulation_id: str) -> SimulationResult:
+    """
+    Statistical simulation: draw abilities per persona group and generate the
+    whole students x items matrix in one vectorized operation.
+    """
+    rng = np.random.default_rng(request.seed)
+    if request.item_parameters:
+        item_ids = list(request.item_parameters)
+        params = parameters_from_lists(request.item_parameters, request.model_type.value)
+    elif request.model_type.value in POLYTOMOUS_MODELS:
+        item_ids = [f"item_{j+1}" for j in range(request.num_items)]
+        params = draw_polytomous_parameters(
+            request.num_items, request.model_type.value, request.num_categories, seed=rng
+        )
+    else:
+        item_ids = [f"item_{j+1}" for j in range(request.num_items)]
+        params = draw_item_parameters(request.num_items, request.model_type.value, seed=rng)
+    max_scores = params.num_categories - 1.0 if isinstance(params, PolytomousParameters) else None
+    
+    _, responses = simulate_irt_responses(
+        request.num_students,
+        params,
+        seed=rng,
+        groups=draw_groups(request, rng),
+        priors=ability_priors(request),
+    )
+    student_ids = [f"student_{i+1}" for i in range(request.num_students)]
+    summary = summarize_responses(responses, max_scores)
+    store_simulation(
+        simulation_id, request, responses, item_ids,
+        max_scores if max_scores is not None else np.ones(len(item_ids)), summary
+    )
+    return SimulationResult(
+        simulation_id=simulation_id,
+        quiz_id=request.quiz_id,
+        responses=to_student_responses(responses, item_ids, student_ids, max_scores) if request.include_responses else [],
+        summary_statistics=summary,
+    )
+
+def quiz_items(request: SimulationRequest) -> Tuple[List[QuizItem], ItemType]:
+    if request.items:
+        return request.items, request.item_type
+    quiz = storage.load_quiz(request.quiz_id)
+    if quiz is None:
+        raise HTTPException(status_code=404, detail=f"Quiz {request.quiz_id} not found")
+    quiz = Quiz.model_validate(quiz)
+    return quiz.items, quiz.item_type
+
+async def run_llm_simulation(
+    request: SimulationRequest,
+    simulation_id: str,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> SimulationResult:
+    """
+    LLM simulation: every sampled persona answers the whole quiz in one
+    request, reusing cached answers (see services/persona_simulation.py).
+    Dichotomous items score 1 for the correct option; partial-credit items
+    score the index of the chosen level.
+    """
+    quiz_item_list, item_type = quiz_items(request)
+    # Load student personas
+    personas = load_student_personas(request.school_level, request.num_students, request.seed)
+    descriptions = personas["persona"].astype(str).tolist()
+    items = [SimulationItem(str(item.id), item.question, item.options) for item in quiz_item_list]
+    results = await simulate_quiz(
+        [Persona(persona_id, text) for persona_id, text in zip(persona_ids(descriptions), descriptions)],
+        items,
+        temperature=request.temperature,
+        progress=progress
+    )
+    
+    item_ids = [item.id for item in items]
+    choices = np.array([
+        [item.options.index(result.answers[item.id]) for item in items] for result in results
+    ]).reshape(len(results), len(items))
+    if item_type == ItemType.DICHOTOMOUS:
+        max_scores = np.ones(len(items))
+        correct = np.array([
+            item.options.index(item.correct_answer) if item.correct_answer in item.options else -1
+            for item in quiz_item_list
+        ])
+        scores = (choices == correct).astype(int)
+    else:
+        max_scores = np.array([len(item.options) - 1.0 for item in quiz_item_list])
+        scores = choices
+    totals = scores.sum(axis=1) / max_scores.sum()
+    summary = summarize_responses(scores, max_scores)
+    await asyncio.to_thread(
+        store_simulation, simulation_id, request, scores, item_ids, max_scores, summary,
+        choices=choices, options=[item.options for item in items]
+    )
+    return SimulationResult(
+        simulation_id=simulation_id,
+        quiz_id=request.quiz_id,
+        responses=[
+            StudentResponse(student_id=f"student_{i+1}", responses=result.answers, score=float(total))
+            for i, (result, total) in enumerate(zip(results, totals))
+        ] if request.include_responses else [],
+        summary_statistics=summary,
+    )
+
+async def run_simulation(
+    request: SimulationRequest,
+    simulation_id: str,
+    job: Optional[Job] = None
+) -> SimulationResult:
+    """
+    Run an IRT or LLM simulation without blocking the event loop: the IRT
+    matrix, its response objects and the storage writes are built in a worker
+    thread.
+    """
+    if request.method == SimulationMethod.IRT:
+        result = await asyncio.to_thread(run_irt_simulation, request, simulation_id)
+    else:
+        def progress(completed: int, cached: int):
+            if job is not None:
+                job.update({
+                    "completed": float(completed),
+                    "students": float(request.num_students),
+                    "cached_answers": float(cached)
+                })
+        
+        result = await run_llm_simulation(request, simulation_id, progress)
+    # Jobs are only touched on the event loop; finished analyses of a replaced
+    # simulation must not be served for the new responses
+    job_manager.invalidate(simulation_id)
+    return result
+
+def job_to_response(job: Job) -> SimulationJob:
+    return SimulationJob(
+        job_id=job.id,
+        status=job.status,
+        progress=job.progress,
+        error=job.error,
+        result=job.result if job.status == JobStatus.COMPLETED else None
+    )
 
 @router.post("/simulate", response_model=SimulationResult)
 async def simulate_responses(request: SimulationRequest):
@@ -34,22 +340,131 @@ async def simulate_responses(request: SimulationRequest):
     Simulate student responses for a given quiz.
     """
     try:
-        # Load student personas
-        personas = load_student_personas(request.school_level)
-        
-        # TODO: Implement simulation logic using OpenAI
-        # This will be implemented in the next step
-        raise NotImplementedError("Simulation not implemented yet")
+        return await run_simulation(request, uuid.uuid4().hex)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/jobs", response_model=SimulationJob, status_code=202)
+async def submit_simulation_job(request: SimulationRequest):
+    """
+    Start a simulation in the background and return its job at once. LLM
+    simulations report the students finished so far as progress.
+    """
+    simulation_id = uuid.uuid4().hex
+    job = job_manager.submit_task(
+        ("simulation", simulation_id), "simulation", simulation_id, lambda job: run_simulation(request, simulation_id, job)
+    )
+    return job_to_response(job)
+
+@router.get("/jobs/{job_id}", response_model=SimulationJob)
+async def get_simulation_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None or job.kind != "simulation":
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_to_response(job)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_simulation_job(job_id: str):
+    """
+    Stream simulation status and progress as server-sent events. The final
+    `completed` event carries the result, a `failed` event the error.
+    """
+    job = job_manager.get(job_id)
+    if job is None or job.kind != "simulation":
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    async def event_stream():
+        async for event in job.events():
+            if event["status"] == JobStatus.COMPLETED.value:
+                event["result"] = jsonable_encoder(job.result)
+            elif event["status"] == JobStatus.FAILED.value:
+                event["error"] = job.error
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.get("/cache/stats")
+async def get_response_cache_stats():
+    """
+    Size and hit/miss counters of the simulated answer cache.
+    """
+    return response_cache.stats()
+
 @router.get("/simulation/{simulation_id}", response_model=SimulationResult)
 async def get_simulation_result(simulation_id: str):
     """
     Retrieve simulation results by ID.
     """
-    try:
-        # TODO: Implement result retrieval logic
-        raise NotImplementedError("Result retrieval not implemented yet")
-    except Exception as e:
-        raise HTTPException(status_code=404, detail="Simulation result not found") 
\ No newline at end of file
+    record = storage.load_simulation(simulation_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Simulation result not found")
+    scores = storage.load_responses(simulation_id).to_array().astype(int)
+    student_ids = [f"student_{i+1}" for i in range(record.num_students)]
+    max_scores = np.array(record.max_scores)
+    choices = storage.load_choices(simulation_id)
+    if choices is None:
+        responses = to_student_responses(scores, record.item_ids, student_ids, max_scores)
+    else:
+        totals = scores.sum(axis=1) / max_scores.sum()
+        responses = [
+            StudentResponse(
+                student_id=student_id,
+                responses={item_id: options[k] for item_id, options, k in zip(record.item_ids, record.options, row)},
+                score=float(total)
+            )
+            for student_id, row, total in zip(student_ids, choices.to_array().astype(int).tolist(), totals)
+        ]
+    return SimulationResult(
+        simulation_id=simulation_id,
+        quiz_id=record.quiz_id,
+        responses=responses,
+        summary_statistics=record.summary_statistics
+    )
+
+@router.get("/simulation/{simulation_id}/matrix")
+async def get_simulation_matrix(
+    simulation_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10000, gt=0, le=100000),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Page of a stored simulation in the columnar wire format (see
+    services/wire_format.py): item ids once, then one row of codes and a
+    score per student, -1 marking unanswered items. Students offset+1 to
+    offset+limit are returned; next_offset is null on the last page. Served
+    as JSON, MessagePack or an Arrow stream depending on the Accept header.
+    """
+    media_type = wire_format.negotiate(accept)
+    if media_type is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Supported media types: {', '.join(wire_format.available_media_types())}"
+        )
+    record = storage.load_simulation(simulation_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Simulation result not found")
+    
+    codes, answered = wire_format.read_rows(storage.load_responses(simulation_id), offset, limit)
+    scores = codes.sum(axis=1, dtype=np.int64) / np.sum(record.max_scores)
+    choices = storage.load_choices(simulation_id)
+    end = offset + len(codes)
+    header = {
+        "simulation_id": simulation_id,
+        "quiz_id": record.quiz_id,
+        "item_ids": record.item_ids,
+        "max_scores": record.max_scores,
+        "options": record.options,
+        "num_students": record.num_students,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": end if end < record.num_students else None,
+        "summary_statistics": record.summary_statistics,
+    }
+    content = wire_format.encode_page(
+        media_type, header, codes, answered, scores,
+        wire_format.read_rows(choices, offset, limit) if choices is not None else None
+    )
+    return Response(content=content, media_type=media_type, headers={"Vary": "Accept"})
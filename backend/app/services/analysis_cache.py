@@ -0,0 +1,150 @@
+"""
+Two-tier cache for analysis results, keyed by response-matrix content.
+
+Keys combine the SHA-256 fingerprint of the response matrix
+(`ResponseMatrix.fingerprint`) with the analysis method and its options, so a
+changed matrix can never be served a stale result. Entries live in an in-memory LRU and are written through to pickle
+files on disk, which survive restarts. `invalidate(simulation_id)` drops
+everything computed for a simulation's data explicitly. The fingerprints
+seen for each simulation are appended to a small index file on disk as well,
+so invalidation still finds the entries after a restart.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+CACHE_DIR = Path(os.getenv("ANALYSIS_CACHE_DIR", ".analysis_cache"))
+MEMORY_ENTRIES = 128
+DISK_ENTRIES = 4096
+
+
+class AnalysisCache:
+    def __init__(self, directory: Optional[Path] = CACHE_DIR, memory_entries: int = MEMORY_ENTRIES,
+                 disk_entries: int = DISK_ENTRIES):
+        """`directory=None` keeps the cache in memory only."""
+        self.directory = Path(directory) if directory is not None else None
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._fingerprints: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(data_fingerprint: str, method: str, options: Dict[str, Any]) -> str:
+        payload = json.dumps({"method": method, "options": options}, sort_keys=True, default=str)
+        return f"{data_fingerprint}-{hashlib.sha256(payload.encode()).hexdigest()[:32]}"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def _index_path(self, simulation_id: str) -> Path:
+        return self.directory / "simulations" / f"{hashlib.sha1(simulation_id.encode()).hexdigest()[:24]}.txt"
+
+    def _read_index(self, simulation_id: str) -> Set[str]:
+        if self.directory is None:
+            return set()
+        try:
+            with open(self._index_path(simulation_id), encoding="utf-8") as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def _record_fingerprint(self, simulation_id: str, data_fingerprint: str):
+        known = self._fingerprints.get(simulation_id)
+        if known is None:
+            known = self._fingerprints[simulation_id] = self._read_index(simulation_id)
+        if data_fingerprint in known:
+            return
+        known.add(data_fingerprint)
+        if self.directory is not None:
+            path = self._index_path(simulation_id)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(data_fingerprint + "\n")
+
+    def _remember(self, key: str, value: Any):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+            if self.directory is not None:
+                try:
+                    with open(self._path(key), "rb") as f:
+                        value = pickle.load(f)
+                except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                    pass
+                else:
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any, simulation_id: Optional[str] = None):
+        with self._lock:
+            self._remember(key, value)
+            if simulation_id is not None:
+                self._record_fingerprint(simulation_id, key.split("-", 1)[0])
+            if self.directory is None:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write then rename so readers never see a partial file
+            tmp_path = self._path(key).with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            self._prune_disk()
+
+    def _prune_disk(self):
+        files = list(self.directory.glob("*.pkl"))
+        if len(files) <= self.disk_entries:
+            return
+        files.sort(key=lambda path: path.stat().st_mtime)
+        for path in files[:len(files) - self.disk_entries]:
+            path.unlink(missing_ok=True)
+
+    def invalidate(self, simulation_id: str) -> int:
+        """Drop every entry computed from data seen for `simulation_id`; returns the count."""
+        removed = set()
+        with self._lock:
+            fingerprints = self._fingerprints.pop(simulation_id, set()) | self._read_index(simulation_id)
+            if self.directory is not None:
+                self._index_path(simulation_id).unlink(missing_ok=True)
+            for data_fingerprint in fingerprints:
+                prefix = f"{data_fingerprint}-"
+                for key in [key for key in self._memory if key.startswith(prefix)]:
+                    del self._memory[key]
+                    removed.add(key)
+                if self.directory is not None:
+                    for path in self.directory.glob(f"{prefix}*.pkl"):
+                        path.unlink(missing_ok=True)
+                        removed.add(path.stem)
+        return len(removed)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,183 @@
+"""
+Classical test theory statistics for screening items before an IRT fit.
+
+Everything is computed in one pass over blocks of students, with matrix
+products instead of per-item loops. Each block adds to the items x items
+moments (pairwise counts, sums, squares and cross-products, as in
+`ResponseMatrix.pairwise_correlation`). The pairwise-complete covariance
+matrix C then gives every item statistic in closed form, with S = sum(C)
+the variance of the total score:
+
+- item-total correlation: sum_k C_jk / sqrt(C_jj * S)
+- corrected item-total (item against the rest of the test):
+  (sum_k C_jk - C_jj) / sqrt(C_jj * (S - 2 sum_k C_jk + C_jj))
+- Cronbach's alpha: k / (k - 1) * (1 - trace(C) / S), and alpha without item
+  j from the same formula with row and column j removed.
+
+With complete data these match the usual formulas exactly; with missing
+responses each covariance uses the students who answered both items.
+
+Distractor analysis works on the index of the option each student chose.
+`np.bincount` over item * options + option counts every (item, option) cell
+and sums the students' total scores for it, so an option's point-biserial
+with the total score needs no loop either.
+"""
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from services.response_matrix import ResponseMatrix, rows_per_block
+
+# Screening thresholds
+MIN_P_VALUE = 0.2  # harder items are flagged
+MAX_P_VALUE = 0.9  # easier items are flagged
+MIN_DISCRIMINATION = 0.2  # corrected item-total correlation
+MIN_DISTRACTOR_PROPORTION = 0.05  # distractors chosen less often do not function
+MIN_ALPHA_GAIN = 0.01  # smaller rises of alpha without an item are flagged as slight
+
+
+class ItemStatistics(NamedTuple):
+    num_answered: np.ndarray  # per item
+    mean: np.ndarray  # mean item score
+    p_value: np.ndarray  # mean score as a proportion of the item's top score
+    item_total: np.ndarray  # point-biserial (polyserial-like for polytomous items) with the total score
+    corrected_item_total: np.ndarray  # with the total of the other items
+    alpha_if_deleted: np.ndarray
+    alpha: float
+
+
+class DistractorStatistics(NamedTuple):
+    proportion: np.ndarray  # items x options, share of the item's respondents choosing each option
+    point_biserial: np.ndarray  # items x options, choosing the option vs. total score
+    mean_item_score: np.ndarray  # items x options, NaN for options nobody chose
+    key: np.ndarray  # per item, index of the option with the highest mean item score
+
+
+def _alpha(num_items, item_variances, total_variance):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        alpha = num_items / (num_items - 1) * (1 - item_variances / total_variance)
+    return np.where((num_items > 1) & (total_variance > 0), alpha, np.nan)
+
+
+def classical_statistics(
+    data: ResponseMatrix,
+    max_scores: Optional[Sequence[float]] = None,
+    choices: Optional[ResponseMatrix] = None,
+    num_options: Optional[Sequence[int]] = None,
+    block_size: Optional[int] = None,
+):
+    """
+    Item statistics of `data` and, when `choices` (the option index behind
+    every response, with `num_options` per item) is given, distractor
+    statistics. `max_scores` is each item's top score, 1 for 0/1 items.
+    Returns (ItemStatistics, DistractorStatistics or None).
+    """
+    num_students, num_items = data.shape
+    max_scores = np.ones(num_items) if max_scores is None else np.asarray(max_scores, dtype=float)
+    block_size = block_size or rows_per_block(num_items)
+
+    n = np.zeros((num_items, num_items))
+    sums = np.zeros_like(n)  # sums[j, k]: sum of item j over students who answered k
+    squares = np.zeros_like(n)
+    cross = np.zeros_like(n)
+    if choices is not None:
+        width = int(max(num_options)) if num_options is not None else choices.num_categories
+        cells = num_items * width
+        option_counts = np.zeros(cells)
+        option_totals = np.zeros(cells)
+        option_scores = np.zeros(cells)
+        total_sums = np.zeros(num_items)
+        total_squares = np.zeros(num_items)
+        choice_blocks = choices.code_blocks(block_size)
+        offsets = np.arange(num_items) * width
+
+    for codes, answered in data.indicator_blocks(block_size):
+        n += answered.T @ answered
+        sums += codes.T @ answered
+        squares += (codes ** 2).T @ answered
+        cross += codes.T @ codes
+        if choices is not None:
+            chosen, chose = next(choice_blocks)
+            total = codes.sum(axis=1) / max_scores.sum()  # missing responses score 0
+            total_sums += total @ chose
+            total_squares += (total ** 2) @ chose
+            cell = (chosen.astype(np.int64) + offsets)[chose]
+            rows = np.broadcast_to(total[:, None], chose.shape)[chose]
+            option_counts += np.bincount(cell, minlength=cells)
+            option_totals += np.bincount(cell, weights=rows, minlength=cells)
+            option_scores += np.bincount(cell, weights=codes[chose], minlength=cells)
+
+    safe = np.maximum(n, 1)
+    covariance = np.where(n > 1, cross / safe - (sums / safe) * (sums.T / safe), 0.0)
+    variances = np.diag(covariance).copy()
+    row_sums = covariance.sum(axis=1)
+    total_variance = covariance.sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        item_total = row_sums / np.sqrt(variances * total_variance)
+        rest_variance = total_variance - 2 * row_sums + variances
+        corrected = (row_sums - variances) / np.sqrt(variances * rest_variance)
+    alpha_if_deleted = _alpha(num_items - 1, variances.sum() - variances, rest_variance)
+
+    num_answered = np.diag(n).copy()
+    mean = np.diag(sums) / np.maximum(num_answered, 1)
+    items = ItemStatistics(
+        num_answered=num_answered,
+        mean=mean,
+        p_value=mean / max_scores,
+        item_total=np.nan_to_num(item_total),
+        corrected_item_total=np.nan_to_num(corrected),
+        alpha_if_deleted=alpha_if_deleted,
+        alpha=float(_alpha(num_items, variances.sum(), total_variance)),
+    )
+    if choices is None:
+        return items, None
+
+    counts = option_counts.reshape(num_items, width)
+    respondents = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    proportion = counts / respondents
+    total_mean = total_sums[:, None] / respondents
+    total_sd = np.sqrt(np.maximum(total_squares[:, None] / respondents - total_mean ** 2, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chooser_mean = option_totals.reshape(num_items, width) / counts
+        point_biserial = (chooser_mean - total_mean) / total_sd * np.sqrt(proportion / (1 - proportion))
+        mean_item_score = option_scores.reshape(num_items, width) / counts
+    point_biserial = np.where((counts > 0) & (proportion < 1) & (total_sd > 0), point_biserial, 0.0)
+    key = np.argmax(np.nan_to_num(mean_item_score, nan=-np.inf), axis=1)
+    return items, DistractorStatistics(proportion, point_biserial, mean_item_score, key)
+
+
+def item_flags(
+    items: ItemStatistics,
+    distractors: Optional[DistractorStatistics] = None,
+    num_options: Optional[Sequence[int]] = None,
+) -> List[List[str]]:
+    """
+    Reasons each item should be reviewed, from the screening thresholds at
+    the top of this module. Pass `distractors` for dichotomous items only:
+    the options of partial-credit items are score levels, not distractors.
+    """
+    flags: List[List[str]] = [[] for _ in range(len(items.mean))]
+    for j in np.flatnonzero(items.p_value < MIN_P_VALUE):
+        flags[j].append("too_difficult")
+    for j in np.flatnonzero(items.p_value > MAX_P_VALUE):
+        flags[j].append("too_easy")
+    for j in np.flatnonzero(items.corrected_item_total < 0):
+        flags[j].append("negative_discrimination")
+    for j in np.flatnonzero((items.corrected_item_total >= 0) & (items.corrected_item_total < MIN_DISCRIMINATION)):
+        flags[j].append("low_discrimination")
+    alpha_gain = items.alpha_if_deleted - items.alpha
+    for j in np.flatnonzero(alpha_gain >= MIN_ALPHA_GAIN):
+        flags[j].append("alpha_increases_if_deleted")
+    for j in np.flatnonzero((alpha_gain > 0) & (alpha_gain < MIN_ALPHA_GAIN)):
+        flags[j].append("alpha_increases_slightly_if_deleted")
+    if distractors is None:
+        return flags
+
+    num_items, width = distractors.proportion.shape
+    present = np.arange(width) < np.asarray(num_options if num_options is not None else [width] * num_items)[:, None]
+    is_distractor = present & (np.arange(width) != distractors.key[:, None])
+    for j in np.flatnonzero((is_distractor & (distractors.point_biserial > 0)).any(axis=1)):
+        flags[j].append("distractor_attracts_high_scorers")
+    for j in np.flatnonzero((is_distractor & (distractors.proportion < MIN_DISTRACTOR_PROPORTION)).any(axis=1)):
+        flags[j].append("nonfunctioning_distractor")
+    return flags
@@ -0,0 +1,342 @@
+"""
+Dimensionality checks for dichotomous and ordered-category items.
+
+Item correlations are polychoric (tetrachoric for 0/1 items). These are the
+correlations of the latent normal variables behind the observed categories,
+and unlike Pearson correlations of the scores they do not produce spurious
+"difficulty factors". Thresholds come from each item's marginal proportions.
+The correlation of every item pair is then solved jointly by damped Fisher
+scoring, with the bivariate normal CDF integrated by Gauss-Legendre
+quadrature over all pairs at once. A step that lowers a pair's
+log-likelihood is halved until it does not, so pairs with lopsided
+marginals, whose likelihood is flat and far from quadratic, do not overshoot
+to +-1.
+
+The number of factors is chosen by Horn's parallel analysis: observed
+eigenvalues are kept while they exceed a percentile of the eigenvalues of
+random correlation matrices of the same size. Replicates are drawn as Wishart
+matrices (Bartlett decomposition), so one replicate costs O(items^2) instead
+of O(students x items^2), and they are decomposed in batches by `eigvalsh`.
+Polychoric estimates are noisier than Pearson correlations of normal data,
+more so for lopsided items and sparsely answered pairs, so the random
+off-diagonals are rescaled to the asymptotic standard errors of the
+polychoric estimates, and items with a nearly empty category are left out.
+"""
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+from services.irt_polytomous import code_blocks
+from services.response_matrix import BLOCK_CELLS, ResponseMatrix, rows_per_block
+
+# Thresholds are clipped to +-THRESHOLD_BOUND, beyond which Phi is 0 or 1
+THRESHOLD_BOUND = 8.0
+MAX_CORRELATION = 0.999
+EIGENVALUE_FLOOR = 1e-4
+SMOOTHING_FLOOR = 1e-2
+NUM_LEGENDRE = 24
+MIN_PROBABILITY = 1e-12
+MAX_STEP_HALVINGS = 30
+# Items with a category fewer students chose are left out of parallel analysis
+MIN_CATEGORY_COUNT = 10
+
+
+class PolychoricCorrelation(NamedTuple):
+    correlation: np.ndarray  # items x items
+    num_observations: np.ndarray  # items x items, students who answered both
+    standard_error: np.ndarray  # items x items, asymptotic, of each estimate at the estimate
+    category_counts: np.ndarray  # items x categories, students in each category
+
+
+class ParallelAnalysis(NamedTuple):
+    eigenvalues: np.ndarray  # observed, descending
+    simulated_mean: np.ndarray
+    simulated_percentile: np.ndarray
+    percentile: float
+    num_replicates: int
+    num_factors: int  # leading eigenvalues above the simulated percentile, at least 1
+
+
+def contingency_tables(responses) -> np.ndarray:
+    """
+    items x categories x items x categories counts: tables[i, a, j, b] is the
+    number of students answering item i in category a and item j in category
+    b. tables[j, :, j, :] holds item j's category counts on its diagonal.
+    """
+    if isinstance(responses, ResponseMatrix):
+        num_categories = responses.num_categories
+    else:
+        responses = np.asarray(responses, dtype=float)
+        num_categories = int(np.nanmax(responses, initial=0)) + 1
+    num_items = responses.shape[1]
+    tables = np.zeros((num_items * num_categories, num_items * num_categories))
+    for codes, answered in code_blocks(responses, rows_per_block(num_items * num_categories)):
+        one_hot = (codes[:, :, None] == np.arange(num_categories)) & answered[:, :, None]
+        one_hot = one_hot.reshape(len(codes), -1).astype(float)
+        tables += one_hot.T @ one_hot
+    return tables.reshape(num_items, num_categories, num_items, num_categories)
+
+
+def thresholds_from_counts(counts: np.ndarray) -> np.ndarray:
+    """items x (categories + 1) normal thresholds, -bound first and +bound last."""
+    cumulative = np.cumsum(counts, axis=1) / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    cumulative = np.hstack([np.zeros((len(counts), 1)), cumulative])
+    return np.clip(ndtri(np.clip(cumulative, 0.0, 1.0)), -THRESHOLD_BOUND, THRESHOLD_BOUND)
+
+
+def bivariate_normal_cdf(h: np.ndarray, k: np.ndarray, rho: np.ndarray, num_nodes: int = NUM_LEGENDRE) -> np.ndarray:
+    """
+    P(X <= h, Y <= k) for standard bivariate normals with correlation rho,
+    elementwise over broadcast arrays. Uses
+    Phi(h) Phi(k) + 1/(2 pi) int_0^asin(rho) exp(-(h^2 + k^2 - 2hk sin t) / (2 cos^2 t)) dt,
+    whose integrand stays bounded as |rho| -> 1.
+    """
+    nodes, weights = np.polynomial.legendre.leggauss(num_nodes)
+    h, k, rho = np.broadcast_arrays(h, k, rho)
+    half_angle = np.arcsin(rho)[..., None] / 2
+    t = half_angle * (nodes + 1)
+    sin_t, cos_t = np.sin(t), np.cos(t)
+    h, k = h[..., None], k[..., None]
+    integrand = np.exp(-(h * h + k * k - 2 * h * k * sin_t) / (2 * cos_t * cos_t))
+    return ndtr(h[..., 0]) * ndtr(k[..., 0]) + half_angle[..., 0] * (integrand @ weights) / (2 * np.pi)
+
+
+def bivariate_normal_pdf(h: np.ndarray, k: np.ndarray, rho: np.ndarray) -> np.ndarray:
+    """Density at (h, k), which is also the derivative of the CDF with respect to rho."""
+    one_minus = 1.0 - rho * rho
+    return np.exp(-(h * h - 2 * rho * h * k + k * k) / (2 * one_minus)) / (2 * np.pi * np.sqrt(one_minus))
+
+
+def _cell_probabilities(h: np.ndarray, k: np.ndarray, rho: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    pairs x categories x categories cell probabilities and their derivatives
+    with respect to rho, from pairs x (categories + 1) thresholds.
+    """
+    num_pairs, num_corners = h.shape
+    cdf = np.zeros((num_pairs, num_corners, num_corners))
+    pdf = np.zeros_like(cdf)
+    # Only interior corners need the integral: the CDF is 0 on the lower
+    # edges and a univariate normal CDF on the upper ones, where the density is 0
+    inner_h, inner_k, r = h[:, 1:-1, None], k[:, None, 1:-1], rho[:, None, None]
+    cdf[:, 1:-1, 1:-1] = bivariate_normal_cdf(inner_h, inner_k, r)
+    pdf[:, 1:-1, 1:-1] = bivariate_normal_pdf(inner_h, inner_k, r)
+    cdf[:, -1, 1:] = ndtr(k[:, 1:])
+    cdf[:, 1:, -1] = ndtr(h[:, 1:])
+
+    def cells(corners):
+        return corners[:, 1:, 1:] - corners[:, :-1, 1:] - corners[:, 1:, :-1] + corners[:, :-1, :-1]
+
+    return cells(cdf), cells(pdf)
+
+
+def polychoric_correlation(
+    responses, max_iter: int = 50, tol: float = 1e-6, correction: float = 0.5
+) -> PolychoricCorrelation:
+    """
+    Polychoric (tetrachoric for 0/1 items) correlations of all item pairs over
+    the students who answered both, from `responses` (a `ResponseMatrix` or an
+    array with NaN for missing). Pairs without variation in common get 0.
+
+    A pair whose table has an empty cell between categories both items use
+    gets `correction` times the number of such cells added, spread over the
+    cells in proportion to the product of the pair's marginals, so that a
+    single empty cell does not push the estimate to +-1. A constant per-cell
+    correction (as in psych::polychoric) adds most, relative to the
+    marginals, to the rare category of a lopsided item and pulls those pairs
+    towards 0, which shows up as a spurious difficulty factor.
+    """
+    tables = contingency_tables(responses)
+    num_items = tables.shape[0]
+    counts = tables[np.arange(num_items), :, np.arange(num_items), :].diagonal(axis1=1, axis2=2)
+    thresholds = thresholds_from_counts(counts)
+    first, second = np.triu_indices(num_items, 1)
+    pair_tables = tables[first, :, second, :]
+    rows, columns = pair_tables.sum(axis=2, keepdims=True), pair_tables.sum(axis=1, keepdims=True)
+    used = (rows > 0) & (columns > 0)
+    has_empty = (used & (pair_tables == 0)).any(axis=(1, 2), keepdims=True)
+    expected = rows * columns / np.maximum(pair_tables.sum(axis=(1, 2), keepdims=True), 1) ** 2
+    pair_tables = pair_tables + np.where(has_empty, correction * used.sum(axis=(1, 2), keepdims=True) * expected, 0.0)
+    num_observations = pair_tables.sum(axis=(1, 2))
+
+    h, k = thresholds[first], thresholds[second]
+
+    def evaluate(pairs, values):
+        p, dp = _cell_probabilities(h[pairs], k[pairs], values)
+        p = np.maximum(p, MIN_PROBABILITY)
+        return (pair_tables[pairs] * np.log(p)).sum(axis=(1, 2)), p, dp
+
+    rho = np.zeros(len(first))
+    # Damped Fisher scoring, restricted to the pairs that have not converged yet
+    active = np.flatnonzero(num_observations > 1)
+    log_like, p, dp = evaluate(active, rho[active])
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        score = (pair_tables[active] * dp / p).sum(axis=(1, 2))
+        information = num_observations[active] * (dp * dp / p).sum(axis=(1, 2))
+        step = np.divide(score, information, out=np.zeros_like(score), where=information > 0)
+        candidate = np.clip(rho[active] + step, -MAX_CORRELATION, MAX_CORRELATION)
+        new_log_like, new_p, new_dp = evaluate(active, candidate)
+        for _ in range(MAX_STEP_HALVINGS):
+            worse = np.flatnonzero(new_log_like < log_like)
+            if len(worse) == 0:
+                break
+            step[worse] /= 2
+            candidate[worse] = np.clip(rho[active[worse]] + step[worse], -MAX_CORRELATION, MAX_CORRELATION)
+            new_log_like[worse], new_p[worse], new_dp[worse] = evaluate(active[worse], candidate[worse])
+        # Pairs no step improves are at the maximum
+        stuck = new_log_like < log_like
+        candidate[stuck] = rho[active[stuck]]
+        moved = np.abs(candidate - rho[active])
+        rho[active] = candidate
+        keep = (moved >= tol) & ~stuck
+        active = active[keep]
+        log_like, p, dp = new_log_like[keep], new_p[keep], new_dp[keep]
+
+    correlation = np.eye(num_items)
+    correlation[first, second] = correlation[second, first] = rho
+    pairs = np.flatnonzero(num_observations > 1)
+    _, p, dp = evaluate(pairs, rho[pairs])
+    information = np.zeros(len(first))
+    information[pairs] = num_observations[pairs] * (dp * dp / p).sum(axis=(1, 2))
+    standard_error = np.zeros((num_items, num_items))
+    standard_error[first, second] = standard_error[second, first] = np.divide(
+        1.0, np.sqrt(information), out=np.zeros_like(information), where=information > 0
+    )
+    return PolychoricCorrelation(correlation, tables.sum(axis=(1, 3)), standard_error, counts)
+
+
+def category_counts(responses) -> np.ndarray:
+    """items x categories numbers of students in each category, in one pass over the responses."""
+    if isinstance(responses, ResponseMatrix):
+        num_categories = responses.num_categories
+    else:
+        responses = np.asarray(responses, dtype=float)
+        num_categories = int(np.nanmax(responses, initial=0)) + 1
+    num_items = responses.shape[1]
+    cells = np.arange(num_items) * num_categories
+    counts = np.zeros(num_items * num_categories)
+    for codes, answered in code_blocks(responses):
+        counts += np.bincount((codes + cells)[answered], minlength=len(counts))
+    return counts.reshape(num_items, num_categories)
+
+
+def informative_items(counts: np.ndarray, min_count: int = MIN_CATEGORY_COUNT) -> np.ndarray:
+    """
+    Indices of the items with at least two categories in use and at least
+    `min_count` students in each of them. The correlations of near-constant
+    items rest on a handful of students and are too noisy for parallel
+    analysis.
+    """
+    smallest = np.where(counts > 0, counts, np.inf).min(axis=1)
+    return np.flatnonzero(((counts > 0).sum(axis=1) > 1) & (smallest >= min_count))
+
+
+def smooth_correlation(correlation: np.ndarray, floor: float = SMOOTHING_FLOOR) -> np.ndarray:
+    """
+    Nearest positive definite correlation matrix by eigenvalue clipping.
+    Pairwise polychoric matrices are often slightly indefinite, which factor
+    extraction does not accept.
+    """
+    eigenvalues, vectors = np.linalg.eigh(correlation)
+    if eigenvalues[0] >= floor:
+        return correlation
+    smoothed = (vectors * np.maximum(eigenvalues, floor)) @ vectors.T
+    scale = np.sqrt(np.diag(smoothed))
+    smoothed = smoothed / np.outer(scale, scale)
+    np.fill_diagonal(smoothed, 1.0)
+    return smoothed
+
+
+def kaiser_meyer_olkin(correlation: np.ndarray) -> Tuple[float, np.ndarray]:
+    """
+    Overall and per-item Kaiser-Meyer-Olkin sampling adequacy: squared
+    correlations relative to squared correlations plus squared partial
+    correlations (from the inverse correlation matrix).
+    """
+    inverse = np.linalg.pinv(correlation)
+    scale = np.sqrt(np.abs(np.diag(inverse)))
+    partial = -inverse / np.outer(scale, scale)
+    off_diagonal = ~np.eye(len(correlation), dtype=bool)
+    r2 = np.where(off_diagonal, correlation ** 2, 0.0)
+    p2 = np.where(off_diagonal, partial ** 2, 0.0)
+    overall = r2.sum() / (r2.sum() + p2.sum())
+    with np.errstate(invalid="ignore"):  # constant items have no correlations at all
+        per_item = r2.sum(axis=0) / (r2.sum(axis=0) + p2.sum(axis=0))
+    return float(overall), per_item
+
+
+def random_correlation_eigenvalues(
+    num_items: int,
+    num_observations: int,
+    num_replicates: int,
+    rng: np.random.Generator,
+    noise_scale: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    replicates x items descending eigenvalues of correlation matrices of
+    `num_observations` independent standard normal observations, with the
+    off-diagonal entries multiplied by the items x items `noise_scale`.
+    """
+    df = num_observations - 1
+    batch_size = max(1, BLOCK_CELLS // max(num_items * num_items, 1))
+    eigenvalues = []
+    for start in range(0, num_replicates, batch_size):
+        size = min(batch_size, num_replicates - start)
+        if df >= num_items:
+            # Bartlett: the scatter matrix is L L^T with chi diagonal and normal below it
+            rows, columns = np.tril_indices(num_items, -1)
+            lower = np.zeros((size, num_items, num_items))
+            lower[:, rows, columns] = rng.standard_normal((size, len(rows)))
+            diagonal = np.sqrt(rng.chisquare(df - np.arange(num_items), size=(size, num_items)))
+            lower[:, np.arange(num_items), np.arange(num_items)] = diagonal
+            scatter = lower @ lower.transpose(0, 2, 1)
+        else:
+            sample = rng.standard_normal((size, num_observations, num_items))
+            sample -= sample.mean(axis=1, keepdims=True)
+            scatter = sample.transpose(0, 2, 1) @ sample
+        scale = np.sqrt(np.maximum(np.diagonal(scatter, axis1=1, axis2=2), EIGENVALUE_FLOOR))
+        correlation = scatter / (scale[:, :, None] * scale[:, None, :])
+        if noise_scale is not None:
+            identity = np.eye(num_items)
+            correlation = identity + (correlation - identity) * noise_scale
+        eigenvalues.append(np.linalg.eigvalsh(correlation)[:, ::-1])
+    return np.vstack(eigenvalues)
+
+
+def parallel_analysis(
+    correlation: np.ndarray,
+    num_observations: int,
+    num_replicates: int = 500,
+    percentile: float = 95.0,
+    seed: Optional[int] = None,
+    standard_error: Optional[np.ndarray] = None,
+) -> ParallelAnalysis:
+    """
+    Horn's parallel analysis of an items x items correlation matrix. Random
+    correlations have the sampling error of Pearson correlations of
+    `num_observations` normal observations, or `standard_error` when given
+    (see `PolychoricCorrelation`).
+    """
+    observed = np.linalg.eigvalsh(correlation)[::-1]
+    num_observations = max(int(num_observations), 2)
+    noise_scale = None
+    if standard_error is not None:
+        noise_scale = standard_error * np.sqrt(num_observations - 1)
+    rng = np.random.default_rng(seed)
+    simulated = random_correlation_eigenvalues(len(correlation), num_observations, num_replicates, rng, noise_scale)
+    threshold = np.percentile(simulated, percentile, axis=0)
+    above = observed > threshold
+    # A first eigenvalue within the random ones means the sample is too small to
+    # tell the common factor from noise, not that the items share none
+    num_factors = max(int(np.argmin(above)) if not above.all() else len(above), 1)
+    return ParallelAnalysis(observed, simulated.mean(axis=0), threshold, percentile, num_replicates, num_factors)
+
+
+def effective_observations(num_observations: np.ndarray) -> int:
+    """Typical number of students behind one correlation: the mean pairwise count."""
+    if len(num_observations) < 2:
+        return int(num_observations.sum())
+    first, second = np.triu_indices(len(num_observations), 1)
+    return int(round(num_observations[first, second].mean()))
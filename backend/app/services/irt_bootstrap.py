@@ -0,0 +1,114 @@
+"""
+Bootstrap standard errors and confidence intervals for IRT item parameters.
+
+Replicates either resample students with replacement (nonparametric) or
+simulate fresh responses from the fitted model under the observed
+missingness pattern (parametric). Each replicate is refitted warm-started from
+the full-sample estimates, so it needs only a few EM iterations. Replicate i
+always uses child i of `SeedSequence(seed)`. Results therefore do not depend
+on how replicates are batched or how many workers run them, and intervals
+can be recomputed from whatever replicates have finished so far.
+"""
+import warnings
+from typing import List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from services.irt_estimation import fit_irt
+from services.irt_models import POLYTOMOUS_MODELS, ItemParameters, PolytomousParameters, parameters_to_lists
+from services.irt_polytomous import fit_polytomous
+from services.irt_simulation import simulate_dichotomous, simulate_polytomous
+from services.response_matrix import DenseResponseMatrix, ResponseMatrix
+
+Parameters = Union[ItemParameters, PolytomousParameters]
+METHODS = ("nonparametric", "parametric")
+# EM iterations per warm-started replicate
+REPLICATE_MAX_ITER = 100
+
+
+class BootstrapSummary(NamedTuple):
+    num_replicates: int
+    standard_error: np.ndarray  # items x parameters, NaN-padded like `parameter_table`
+    lower: np.ndarray
+    upper: np.ndarray
+
+
+def parameter_table(params: Parameters, model_type: str) -> np.ndarray:
+    """Items x parameters array in the `IRTModelFit.item_parameters` layout, NaN-padded for polytomous items."""
+    lists = list(parameters_to_lists(params, model_type, range(params.num_items)).values())
+    table = np.full((len(lists), max(len(values) for values in lists)), np.nan)
+    for j, values in enumerate(lists):
+        table[j, :len(values)] = values
+    return table
+
+
+def replicate_seeds(num_replicates: int, seed: Optional[int] = None) -> List[np.random.SeedSequence]:
+    return np.random.SeedSequence(seed).spawn(num_replicates)
+
+
+def batches(items: Sequence, num_batches: int) -> List[Sequence]:
+    size = max(1, -(-len(items) // max(num_batches, 1)))
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _resample(responses, rng: np.random.Generator):
+    rows = rng.integers(0, len(responses), len(responses))
+    if isinstance(responses, ResponseMatrix):
+        return responses.take(rows)
+    return np.asarray(responses)[rows]
+
+
+def _simulate_like(responses, params: Parameters, rng: np.random.Generator):
+    """Fresh responses from the fitted model, keeping each student's pattern of answered items."""
+    theta = rng.standard_normal(len(responses))
+    if isinstance(params, PolytomousParameters):
+        codes = simulate_polytomous(theta, params, seed=rng)
+    else:
+        codes = simulate_dichotomous(theta, params, seed=rng)
+    if not isinstance(responses, ResponseMatrix):
+        return np.where(np.isnan(np.asarray(responses, dtype=float)), np.nan, codes)
+
+    masks = []
+    start = 0
+    for _, answered in responses.code_blocks():
+        codes[start:start + len(answered)][~answered] = 0
+        masks.append(np.packbits(answered, axis=1))
+        start += len(answered)
+    return DenseResponseMatrix(codes, np.vstack(masks), responses.item_ids)
+
+
+def run_replicates(
+    responses,
+    model_type: str,
+    params: Parameters,
+    seeds: Sequence[np.random.SeedSequence],
+    method: str = "nonparametric",
+    max_iter: int = REPLICATE_MAX_ITER,
+) -> np.ndarray:
+    """
+    Fit one bootstrap replicate per seed, warm-started from `params`.
+    Returns a replicates x items x parameters array (see `parameter_table`).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    tables = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        sample = _resample(responses, rng) if method == "nonparametric" else _simulate_like(responses, params, rng)
+        if model_type in POLYTOMOUS_MODELS:
+            estimate = fit_polytomous(sample, model_type, init=params, max_iter=max_iter)
+        else:
+            estimate = fit_irt(sample, model_type, init=params, max_iter=max_iter)
+        tables.append(parameter_table(estimate.params, model_type))
+    return np.stack(tables)
+
+
+def summarize_replicates(tables: np.ndarray, confidence_level: float = 0.95) -> BootstrapSummary:
+    """Bootstrap standard errors and percentile intervals from replicates x items x parameters."""
+    alpha = (1.0 - confidence_level) / 2
+    with warnings.catch_warnings():
+        # padding columns of polytomous items are all NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, upper = np.nanquantile(tables, [alpha, 1.0 - alpha], axis=0)
+        standard_error = np.nanstd(tables, axis=0, ddof=1) if len(tables) > 1 else np.full(tables.shape[1:], np.nan)
+    return BootstrapSummary(len(tables), standard_error, lower, upper)
@@ -0,0 +1,155 @@
+"""
+Incremental calibration for simulations that grow by appended batches of students.
+
+The EM state of the last fit (parameters plus expected counts) is kept per
+simulation and model type on disk, so it survives restarts and is shared by
+all worker processes. When the response matrix still begins with the rows the
+state was fitted on, only the appended rows go through the E-step
+(`update_irt`). Once the matrix has grown to `refresh_ratio` times its size at
+the last full fit, a warm-started full fit clears the lag in the frozen counts.
+Any other change to the data means a cold fit.
+
+The item-fit tables are kept the same way: appended rows are added to the
+tables of the old rows, which keep the ability groups and parameters they were
+computed with until the next full fit.
+"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from services.analysis_cache import CACHE_DIR
+from services.irt_estimation import (
+    IRTEstimate, ItemFitTables, add_item_fit_tables, fit_irt, item_fit_statistics, item_fit_tables, update_irt
+)
+from services.response_matrix import ResponseMatrix
+
+CALIBRATION_DIR = Path(os.getenv("CALIBRATION_DIR", str(CACHE_DIR / "calibration")))
+REFRESH_RATIO = 2.0
+
+
+class CalibrationState(NamedTuple):
+    estimate: IRTEstimate
+    num_rows: int
+    rows_fingerprint: str  # of the first num_rows rows
+    rows_at_refresh: int  # rows at the last full fit
+    item_fit: Optional[ItemFitTables] = None  # of the first num_rows rows, when asked for
+
+
+def rows_fingerprint(responses, num_rows: int) -> str:
+    if isinstance(responses, ResponseMatrix):
+        return responses[:num_rows].fingerprint()
+    rows = np.ascontiguousarray(responses[:num_rows])
+    digest = hashlib.sha256(np.asarray(rows.shape, dtype=np.int64).tobytes())
+    digest.update(rows.dtype.str.encode())
+    digest.update(rows.tobytes())
+    return digest.hexdigest()
+
+
+def _prefix(simulation_id: str) -> str:
+    return hashlib.sha1(simulation_id.encode()).hexdigest()[:16]
+
+
+def _path(simulation_id: str, model_type: str, directory: Optional[Path]) -> Path:
+    return (directory or CALIBRATION_DIR) / f"{_prefix(simulation_id)}-{model_type}.pkl"
+
+
+def load_state(simulation_id: str, model_type: str, directory: Optional[Path] = None) -> Optional[CalibrationState]:
+    try:
+        with open(_path(simulation_id, model_type, directory), "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def save_state(simulation_id: str, state: CalibrationState, directory: Optional[Path] = None):
+    path = _path(simulation_id, state.estimate.model_type, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def invalidate(simulation_id: str, directory: Optional[Path] = None) -> int:
+    paths = list((directory or CALIBRATION_DIR).glob(f"{_prefix(simulation_id)}-*.pkl"))
+    for path in paths:
+        path.unlink(missing_ok=True)
+    return len(paths)
+
+
+def _calibrate(
+    simulation_id: str,
+    responses,
+    model_type: str,
+    with_item_fit: bool,
+    refresh_ratio: float,
+    progress: Optional[Callable[[int, float], None]],
+    directory: Optional[Path],
+) -> CalibrationState:
+    num_rows = len(responses)
+    state = load_state(simulation_id, model_type, directory)
+    if state is not None and (
+        state.num_rows > num_rows or rows_fingerprint(responses, state.num_rows) != state.rows_fingerprint
+    ):
+        state = None
+
+    if state is not None and state.num_rows == num_rows:
+        if not with_item_fit or state.item_fit is not None:
+            return state
+        estimate, rows_at_refresh = state.estimate, state.rows_at_refresh
+        tables = item_fit_tables(responses, estimate.params)
+    elif state is None or num_rows > refresh_ratio * state.rows_at_refresh:
+        init = state.estimate.params if state is not None else None
+        estimate = fit_irt(responses, model_type, init=init, progress=progress)
+        rows_at_refresh = num_rows
+        tables = item_fit_tables(responses, estimate.params) if with_item_fit else None
+    else:
+        estimate = update_irt(state.estimate, responses[state.num_rows:], progress=progress)
+        rows_at_refresh = state.rows_at_refresh
+        if not with_item_fit:
+            tables = None
+        elif state.item_fit is None:
+            tables = item_fit_tables(responses, estimate.params)
+        else:
+            new_rows = item_fit_tables(responses[state.num_rows:], estimate.params, edges=state.item_fit.edges)
+            tables = add_item_fit_tables(state.item_fit, new_rows)
+
+    state = CalibrationState(estimate, num_rows, rows_fingerprint(responses, num_rows), rows_at_refresh, tables)
+    save_state(simulation_id, state, directory)
+    return state
+
+
+def calibrate(
+    simulation_id: str,
+    responses,
+    model_type: str,
+    refresh_ratio: float = REFRESH_RATIO,
+    progress: Optional[Callable[[int, float], None]] = None,
+    directory: Optional[Path] = None,
+) -> IRTEstimate:
+    """
+    Fit `model_type` to `responses` (a `ResponseMatrix` or array), reusing the
+    stored state of the simulation where the new matrix only appends rows to
+    the old one.
+    """
+    return _calibrate(simulation_id, responses, model_type, False, refresh_ratio, progress, directory).estimate
+
+
+def calibrate_with_item_fit(
+    simulation_id: str,
+    responses,
+    model_type: str,
+    refresh_ratio: float = REFRESH_RATIO,
+    progress: Optional[Callable[[int, float], None]] = None,
+    directory: Optional[Path] = None,
+) -> Tuple[IRTEstimate, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    `calibrate` plus the `irt_estimation.item_fit` statistics, whose tables
+    are updated with the appended rows only.
+    """
+    state = _calibrate(simulation_id, responses, model_type, True, refresh_ratio, progress, directory)
+    return state.estimate, item_fit_statistics(state.item_fit, model_type)
@@ -0,0 +1,427 @@
+"""
+Marginal maximum likelihood estimation of dichotomous IRT models (Rasch, 2PL,
+3PL) by EM over a Gauss-Hermite quadrature grid (Bock & Aitkin, 1981).
+
+The E-step is two matrix products per block of students, (students x items) @
+(items x nodes), so it is vectorized over items and quadrature nodes, and
+missing responses simply drop out of the indicator matrices. The M-step
+maximises all items' expected complete-data log-likelihoods jointly with
+L-BFGS-B using analytic gradients. The items are independent, so this is the
+same as fitting them one at a time, without a Python loop.
+"""
+from dataclasses import dataclass
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import optimize
+from scipy.stats import chi2
+
+from services.irt_models import EPS, ItemParameters, irt_probability
+from services.response_matrix import ResponseMatrix, rows_per_block
+
+# Bounds keep the M-step away from degenerate solutions (a -> 0, |b| -> inf)
+A_BOUNDS = (0.05, 8.0)
+B_BOUNDS = (-8.0, 8.0)
+C_BOUNDS = (0.0, 0.5)
+# Beta(5, 17) prior on the 3PL lower asymptote (mean ~0.23), as in BILOG-MG;
+# without it c is barely identified and tends to drift to the bounds
+C_PRIOR = (5.0, 17.0)
+
+NUM_PARAMS = {"rasch": 1, "2pl": 2, "3pl": 3}
+
+
+class Quadrature(NamedTuple):
+    nodes: np.ndarray
+    weights: np.ndarray  # sum to 1
+
+
+def gauss_hermite(num_points: int = 41) -> Quadrature:
+    """Quadrature for a standard normal ability distribution."""
+    nodes, weights = np.polynomial.hermite_e.hermegauss(num_points)
+    return Quadrature(nodes, weights / weights.sum())
+
+
+class SufficientStatistics(NamedTuple):
+    """Expected counts from one E-step, per item x quadrature node."""
+    correct: np.ndarray   # r_jq: expected number answering item j correctly at node q
+    answered: np.ndarray  # n_jq: expected number answering item j at node q
+    log_likelihood: float
+    num_students: int
+
+
+@dataclass
+class IRTEstimate:
+    model_type: str
+    params: ItemParameters
+    log_likelihood: float
+    num_students: int
+    n_iter: int
+    converged: bool
+    statistics: SufficientStatistics
+
+    @property
+    def num_params(self) -> int:
+        if self.model_type == "rasch":
+            return self.params.num_items + 1  # difficulties and the shared discrimination
+        return NUM_PARAMS[self.model_type] * self.params.num_items
+
+    @property
+    def aic(self) -> float:
+        return -2 * self.log_likelihood + 2 * self.num_params
+
+    @property
+    def bic(self) -> float:
+        return -2 * self.log_likelihood + self.num_params * np.log(self.num_students)
+
+
+def indicator_blocks(responses, block_size: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield (correct, answered) float blocks from a `ResponseMatrix` or from a
+    students x items array in which NaN marks a missing response. Only one
+    block is expanded to floats at a time; by default a block holds about
+    `BLOCK_CELLS` cells.
+    """
+    if isinstance(responses, ResponseMatrix):
+        yield from responses.indicator_blocks(block_size)
+        return
+    responses = np.asarray(responses)
+    block_size = block_size or rows_per_block(responses.shape[1])
+    for start in range(0, responses.shape[0], block_size):
+        block = responses[start:start + block_size].astype(float)
+        answered = ~np.isnan(block)
+        yield np.where(answered, block, 0.0), answered.astype(float)
+
+
+def _log_probabilities(params: ItemParameters, quad: Quadrature) -> Tuple[np.ndarray, np.ndarray]:
+    p = np.clip(irt_probability(quad.nodes, params), EPS, 1 - EPS)  # nodes x items
+    return np.log(p), np.log1p(-p)
+
+
+def normalize_posterior(log_like: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Turn students x nodes joint log-likelihoods (log prior weights included)
+    into normalised posteriors, and return the block's marginal log-likelihood.
+    """
+    peak = log_like.max(axis=1, keepdims=True)
+    posterior = np.exp(log_like - peak)
+    totals = posterior.sum(axis=1, keepdims=True)
+    posterior /= totals
+    return posterior, float((peak + np.log(totals)).sum())
+
+
+def _posterior(correct, answered, log_p, log_q, log_weights) -> Tuple[np.ndarray, float]:
+    """Normalised posterior over nodes for a block of students, and its log-likelihood."""
+    return normalize_posterior(correct @ (log_p - log_q).T + answered @ log_q.T + log_weights)
+
+
+def e_step(blocks: Callable[[], Iterator], params: ItemParameters, quad: Quadrature) -> SufficientStatistics:
+    log_p, log_q = _log_probabilities(params, quad)
+    log_weights = np.log(quad.weights)
+    r = np.zeros((params.num_items, len(quad.nodes)))
+    n = np.zeros_like(r)
+    log_likelihood = 0.0
+    num_students = 0
+    for correct, answered in blocks():
+        posterior, block_ll = _posterior(correct, answered, log_p, log_q, log_weights)
+        r += correct.T @ posterior
+        n += answered.T @ posterior
+        log_likelihood += block_ll
+        num_students += correct.shape[0]
+    return SufficientStatistics(r, n, log_likelihood, num_students)
+
+
+def _pack(params: ItemParameters, model_type: str) -> np.ndarray:
+    if model_type == "rasch":
+        return np.concatenate([params.a[:1], params.b])
+    if model_type == "2pl":
+        return np.concatenate([params.a, params.b])
+    return np.concatenate([params.a, params.b, params.c])
+
+
+def _unpack(x: np.ndarray, model_type: str, num_items: int) -> ItemParameters:
+    if model_type == "rasch":
+        return ItemParameters(np.full(num_items, x[0]), x[1:], np.zeros(num_items))
+    a, b = x[:num_items], x[num_items:2 * num_items]
+    c = x[2 * num_items:] if model_type == "3pl" else np.zeros(num_items)
+    return ItemParameters(a, b, c)
+
+
+def _bounds(model_type: str, num_items: int):
+    if model_type == "rasch":
+        return [A_BOUNDS] + [B_BOUNDS] * num_items
+    bounds = {"2pl": [A_BOUNDS, B_BOUNDS], "3pl": [A_BOUNDS, B_BOUNDS, C_BOUNDS]}
+    return [bound for bound in bounds[model_type] for _ in range(num_items)]
+
+
+def _objective(x, model_type, r, n, nodes):
+    """Negative expected complete-data log-likelihood (log-posterior for 3PL) and its gradient."""
+    num_items = r.shape[0]
+    a, b, c = _unpack(x, model_type, num_items)
+    theta = nodes[None, :]
+    s = 1.0 / (1.0 + np.exp(-a[:, None] * (theta - b[:, None])))  # items x nodes
+    p = np.clip(c[:, None] + (1 - c[:, None]) * s, EPS, 1 - EPS)
+    value = -(r * np.log(p) + (n - r) * np.log1p(-p)).sum()
+
+    # d(-ll)/dP, then chain rule through P(a, b, c)
+    dp = -(r - n * p) / (p * (1 - p))
+    ds = (1 - c[:, None]) * s * (1 - s)
+    grad_b = (dp * ds * -a[:, None]).sum(axis=1)
+    grad_a = (dp * ds * (theta - b[:, None])).sum(axis=1)
+    if model_type == "rasch":
+        return value, np.concatenate([[grad_a.sum()], grad_b])
+    if model_type == "2pl":
+        return value, np.concatenate([grad_a, grad_b])
+
+    alpha, beta = C_PRIOR
+    cc = np.clip(c, EPS, 1 - EPS)
+    value -= ((alpha - 1) * np.log(cc) + (beta - 1) * np.log1p(-cc)).sum()
+    grad_c = (dp * (1 - s)).sum(axis=1) - ((alpha - 1) / cc - (beta - 1) / (1 - cc))
+    return value, np.concatenate([grad_a, grad_b, grad_c])
+
+
+def m_step(suff: SufficientStatistics, params: ItemParameters, model_type: str, quad: Quadrature) -> ItemParameters:
+    result = optimize.minimize(
+        _objective,
+        _pack(params, model_type),
+        args=(model_type, suff.correct, suff.answered, quad.nodes),
+        jac=True,
+        method="L-BFGS-B",
+        bounds=_bounds(model_type, params.num_items),
+    )
+    return _unpack(result.x, model_type, params.num_items)
+
+
+def initial_parameters(blocks: Callable[[], Iterator], model_type: str) -> ItemParameters:
+    """Start values from the observed proportions correct."""
+    correct = answered = 0.0
+    for block_correct, block_answered in blocks():
+        correct = correct + block_correct.sum(axis=0)
+        answered = answered + block_answered.sum(axis=0)
+    num_items = len(correct)
+    c = np.full(num_items, 0.15 if model_type == "3pl" else 0.0)
+    p = correct / np.maximum(answered, 1)
+    p = np.clip((p - c) / (1 - c), 0.02, 0.98)
+    b = np.clip(-np.log(p / (1 - p)), *B_BOUNDS)
+    return ItemParameters(np.ones(num_items), b, c)
+
+
+def run_em(
+    blocks: Callable[[], Iterator],
+    model_type: str,
+    params: ItemParameters,
+    quad: Quadrature,
+    max_iter: int = 500,
+    tol: float = 1e-4,
+    progress: Optional[Callable[[int, float], None]] = None,
+) -> IRTEstimate:
+    """
+    Iterate EM from `params` until no parameter moves by more than `tol`.
+
+    `progress(iteration, log_likelihood)` is called after every E-step.
+    """
+    converged = False
+    iteration = 0
+    for iteration in range(1, max_iter + 1):
+        suff = e_step(blocks, params, quad)
+        if progress is not None:
+            progress(iteration, suff.log_likelihood)
+        new_params = m_step(suff, params, model_type, quad)
+        change = np.max(np.abs(_pack(new_params, model_type) - _pack(params, model_type)))
+        params = new_params
+        if change < tol:
+            converged = True
+            break
+
+    # Final E-step so the likelihood and counts match the returned parameters
+    suff = e_step(blocks, params, quad)
+    return IRTEstimate(model_type, params, suff.log_likelihood, suff.num_students, iteration, converged, suff)
+
+
+def fit_irt(
+    responses,
+    model_type: str,
+    num_quadrature: int = 41,
+    max_iter: int = 500,
+    tol: float = 1e-4,
+    init: Optional[ItemParameters] = None,
+    progress: Optional[Callable[[int, float], None]] = None,
+    block_size: Optional[int] = None,
+) -> IRTEstimate:
+    """
+    Fit a Rasch, 2PL or 3PL model by marginal maximum likelihood.
+
+    `responses` is a `ResponseMatrix` or a students x items array of 0/1 with
+    NaN for missing responses. Abilities are assumed N(0, 1), which fixes the scale. `init`
+    warm-starts EM, for example from a previous fit on fewer students.
+
+    The Rasch model has one discrimination shared by all items, as in
+    ltm::rasch. With the ability variance fixed at 1 it stands in for the
+    ability SD; fixing it at 1 as well would shrink the difficulties
+    whenever the abilities are more or less spread out than N(0, 1).
+    """
+    if model_type not in NUM_PARAMS:
+        raise ValueError(f"Unknown model type: {model_type}")
+
+    def blocks():
+        return indicator_blocks(responses, block_size)
+
+    quad = gauss_hermite(num_quadrature)
+    params = init if init is not None else initial_parameters(blocks, model_type)
+    return run_em(blocks, model_type, params, quad, max_iter=max_iter, tol=tol, progress=progress)
+
+
+def add_statistics(x: SufficientStatistics, y: SufficientStatistics) -> SufficientStatistics:
+    return SufficientStatistics(
+        x.correct + y.correct,
+        x.answered + y.answered,
+        x.log_likelihood + y.log_likelihood,
+        x.num_students + y.num_students,
+    )
+
+
+def update_irt(
+    estimate: IRTEstimate,
+    new_responses,
+    max_iter: int = 50,
+    tol: float = 1e-4,
+    progress: Optional[Callable[[int, float], None]] = None,
+    block_size: Optional[int] = None,
+) -> IRTEstimate:
+    """
+    Fold newly appended response rows into a previous fit by incremental EM
+    (Neal & Hinton, 1998).
+
+    The expected counts of the rows behind `estimate` are kept as they were
+    after its last E-step. Each iteration re-runs the E-step on the new rows
+    only, adds the frozen counts and takes a full M-step, warm-started from the
+    previous parameters. The old rows' counts therefore lag slightly behind the
+    parameters, so the returned log-likelihood is approximate. Refitting on all
+    rows from time to time (`fit_irt(..., init=...)`) removes that lag.
+    """
+    model_type = estimate.model_type
+    quad = gauss_hermite(estimate.statistics.correct.shape[1])
+
+    def blocks():
+        return indicator_blocks(new_responses, block_size)
+
+    old = estimate.statistics
+    params = estimate.params
+    converged = False
+    iteration = 0
+    for iteration in range(1, max_iter + 1):
+        suff = add_statistics(old, e_step(blocks, params, quad))
+        if progress is not None:
+            progress(iteration, suff.log_likelihood)
+        new_params = m_step(suff, params, model_type, quad)
+        change = np.max(np.abs(_pack(new_params, model_type) - _pack(params, model_type)))
+        params = new_params
+        if change < tol:
+            converged = True
+            break
+
+    suff = add_statistics(old, e_step(blocks, params, quad))
+    return IRTEstimate(model_type, params, suff.log_likelihood, suff.num_students, iteration, converged, suff)
+
+
+def eap_abilities(
+    responses, params: ItemParameters, num_quadrature: int = 41, block_size: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Expected a posteriori ability estimates and posterior standard deviations."""
+    quad = gauss_hermite(num_quadrature)
+    log_p, log_q = _log_probabilities(params, quad)
+    log_weights = np.log(quad.weights)
+    means, sds = [], []
+    for correct, answered in indicator_blocks(responses, block_size):
+        posterior, _ = _posterior(correct, answered, log_p, log_q, log_weights)
+        mean = posterior @ quad.nodes
+        means.append(mean)
+        sds.append(np.sqrt(np.maximum(posterior @ quad.nodes ** 2 - mean ** 2, 0.0)))
+    return np.concatenate(means), np.concatenate(sds)
+
+
+class ItemFitTables(NamedTuple):
+    """Per ability group x item sums behind `item_fit`; tables of disjoint rows add up."""
+    edges: np.ndarray  # ability group boundaries
+    observed: np.ndarray  # number correct
+    expected: np.ndarray  # expected number correct
+    counts: np.ndarray  # number answered
+
+
+def item_fit_tables(
+    responses,
+    params: ItemParameters,
+    edges: Optional[np.ndarray] = None,
+    num_groups: int = 10,
+    num_quadrature: int = 41,
+) -> ItemFitTables:
+    """
+    The observed and expected tables of `item_fit`. Without `edges` the
+    ability groups are the `num_groups` quantiles of the EAP abilities of
+    `responses`; pass the edges of earlier tables to extend them with new rows.
+    """
+    quad = gauss_hermite(num_quadrature)
+    log_p, log_q = _log_probabilities(params, quad)
+    log_weights = np.log(quad.weights)
+    p_nodes = np.exp(log_p).T  # items x nodes
+    num_items = params.num_items
+
+    if edges is None:
+        theta, _ = eap_abilities(responses, params, num_quadrature)
+        edges = np.quantile(theta, np.linspace(0, 1, num_groups + 1)[1:-1])
+    size = (len(edges) + 1) * num_items
+
+    observed = np.zeros(size)
+    expected = np.zeros_like(observed)
+    counts = np.zeros_like(observed)
+    # The leave-one-out posteriors are students x items x nodes; bound the block
+    block_size = max(1, 4_000_000 // (num_items * len(quad.nodes)))
+    for correct, answered in indicator_blocks(responses, block_size):
+        posterior, _ = _posterior(correct, answered, log_p, log_q, log_weights)
+        # Divide each item's own likelihood back out of the posterior
+        item_like = np.where(
+            answered[:, :, None] > 0,
+            np.where(correct[:, :, None] > 0, p_nodes[None], 1 - p_nodes[None]),
+            1.0,
+        )
+        loo = posterior[:, None, :] / np.maximum(item_like, EPS)
+        loo /= loo.sum(axis=2, keepdims=True)
+        loo_theta = loo @ quad.nodes
+        loo_expected = (loo * p_nodes[None]).sum(axis=2)
+
+        cells = (np.searchsorted(edges, loo_theta) * num_items + np.arange(num_items)).ravel()
+        observed += np.bincount(cells, weights=correct.ravel(), minlength=size)
+        expected += np.bincount(cells, weights=(answered * loo_expected).ravel(), minlength=size)
+        counts += np.bincount(cells, weights=answered.ravel(), minlength=size)
+
+    return ItemFitTables(edges, *(x.reshape(-1, num_items) for x in (observed, expected, counts)))
+
+
+def add_item_fit_tables(x: ItemFitTables, y: ItemFitTables) -> ItemFitTables:
+    return ItemFitTables(x.edges, x.observed + y.observed, x.expected + y.expected, x.counts + y.counts)
+
+
+def item_fit_statistics(tables: ItemFitTables, model_type: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(chi_square, degrees_of_freedom, p_value) arrays from `item_fit_tables`."""
+    counts = tables.counts
+    safe = np.maximum(counts, 1)
+    obs, exp = tables.observed / safe, np.clip(tables.expected / safe, EPS, 1 - EPS)
+    chi_square = (counts * (obs - exp) ** 2 / (exp * (1 - exp))).sum(axis=0)
+    df = np.maximum((counts > 0).sum(axis=0) - NUM_PARAMS[model_type], 1)
+    return chi_square, df, chi2.sf(chi_square, df)
+
+
+def item_fit(
+    responses, estimate: IRTEstimate, num_groups: int = 10, num_quadrature: int = 41
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Q1-type item-fit statistic for every item (Yen, 1981).
+
+    For each item, students are grouped by their EAP ability given the other
+    items. Each group's observed proportion correct is compared with the
+    expected one, which averages P(correct) over the same leave-one-out
+    posterior. Conditioning on the other items only keeps the statistic free of
+    the bias that comes from grouping on the item being tested. Returns
+    (chi_square, degrees_of_freedom, p_value) arrays.
+    """
+    tables = item_fit_tables(responses, estimate.params, num_groups=num_groups, num_quadrature=num_quadrature)
+    return item_fit_statistics(tables, estimate.model_type)
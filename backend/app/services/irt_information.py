@@ -0,0 +1,76 @@
+from typing import Dict, NamedTuple, Union
+
+import numpy as np
+
+from services.irt_estimation import gauss_hermite
+from services.irt_models import (
+    EPS, ItemParameters, PolytomousParameters, category_derivatives, category_probabilities, irt_probability
+)
+
+Parameters = Union[ItemParameters, PolytomousParameters]
+
+
+class InformationCurves(NamedTuple):
+    theta: np.ndarray  # grid
+    item_information: np.ndarray  # items x grid
+    test_information: np.ndarray  # grid
+    sem: np.ndarray  # grid, conditional standard error of measurement
+
+
+def theta_grid(theta_min: float = -4.0, theta_max: float = 4.0, num_points: int = 81) -> np.ndarray:
+    return np.linspace(theta_min, theta_max, num_points)
+
+
+def category_information(theta: np.ndarray, params: PolytomousParameters) -> np.ndarray:
+    """
+    Information contributed by each response category, P'_jk(theta)^2 /
+    P_jk(theta), as an items x categories x grid array. Summed over
+    categories it is the item's Fisher information (for GPCM, a^2 Var(X | theta)).
+    """
+    p = category_probabilities(theta, params)
+    derivative = category_derivatives(theta, params)
+    return np.where(p > EPS, derivative ** 2 / np.maximum(p, EPS), 0.0)
+
+
+def item_information(theta: np.ndarray, params: Parameters) -> np.ndarray:
+    """
+    Fisher information of every item at every theta as one items x grid array:
+    I_j(theta) = a_j^2 * (Q/P) * ((P - c_j) / (1 - c_j))^2, which reduces to
+    a_j^2 * P * Q for 2PL and Rasch. Polytomous items sum their
+    category information.
+    """
+    if isinstance(params, PolytomousParameters):
+        return category_information(theta, params).sum(axis=1)
+    p = np.clip(irt_probability(theta, params).T, EPS, 1.0 - EPS)
+    a, c = params.a[:, None], params.c[:, None]
+    return a ** 2 * ((1.0 - p) / p) * ((p - c) / (1.0 - c)) ** 2
+
+
+def information_curves(theta: np.ndarray, params: Parameters) -> InformationCurves:
+    items = item_information(theta, params)
+    test = items.sum(axis=0)
+    return InformationCurves(theta, items, test, 1.0 / np.sqrt(np.maximum(test, EPS)))
+
+
+def marginal_reliability(params: Parameters, num_quadrature: int = 61) -> float:
+    """
+    Reliability averaged over the N(0, 1) ability distribution of the
+    calibration, 1 / (1 + E[SEM(theta)^2]), integrated by Gauss-Hermite
+    quadrature rather than over the display grid.
+    """
+    quad = gauss_hermite(num_quadrature)
+    test = item_information(quad.nodes, params).sum(axis=0)
+    error_variance = float(quad.weights @ (1.0 / np.maximum(test, EPS)))
+    return 1.0 / (1.0 + error_variance)
+
+
+def measurement_precision(curves: InformationCurves, params: Parameters) -> Dict[str, float]:
+    peak = int(np.argmax(curves.test_information))
+    quad = gauss_hermite()
+    sem_at_nodes = information_curves(quad.nodes, params).sem
+    return {
+        "max_information": float(curves.test_information[peak]),
+        "theta_at_max_information": float(curves.theta[peak]),
+        "min_sem": float(curves.sem[peak]),
+        "mean_sem": float(quad.weights @ sem_at_nodes),
+    }
@@ -0,0 +1,175 @@
+from typing import Dict, List, NamedTuple, Sequence, Union
+
+import numpy as np
+
+# Lower/upper bounds used wherever probabilities go into a log
+EPS = 1e-9
+
+
+class ItemParameters(NamedTuple):
+    """Dichotomous item parameters, one entry per item."""
+    a: np.ndarray  # discrimination
+    b: np.ndarray  # difficulty
+    c: np.ndarray  # lower asymptote (guessing)
+
+    @property
+    def num_items(self) -> int:
+        return len(self.b)
+
+
+def irt_probability(theta: np.ndarray, params: ItemParameters) -> np.ndarray:
+    """
+    P(correct) for every (ability, item) pair under the 3PL model (2PL is the
+    special case c=0, and Rasch also shares one a across items). Returns a
+    len(theta) x items array.
+    """
+    z = np.multiply.outer(theta, params.a) - params.a * params.b
+    return params.c + (1.0 - params.c) / (1.0 + np.exp(-z))
+
+
+class PolytomousParameters(NamedTuple):
+    """
+    Graded response (GRM) or generalized partial credit (GPCM) parameters.
+    Items may use fewer categories than the widest item; the thresholds of
+    their unused categories are ignored.
+    """
+    model_type: str  # "grm" or "gpcm"
+    a: np.ndarray  # discrimination, per item
+    thresholds: np.ndarray  # items x (max categories - 1): GRM boundaries (increasing) or GPCM step difficulties
+    num_categories: np.ndarray  # per item
+
+    @property
+    def num_items(self) -> int:
+        return len(self.a)
+
+    @property
+    def max_categories(self) -> int:
+        return self.thresholds.shape[1] + 1
+
+    @property
+    def valid(self) -> np.ndarray:
+        """items x categories mask of the categories each item uses."""
+        return np.arange(self.max_categories)[None, :] < self.num_categories[:, None]
+
+
+POLYTOMOUS_MODELS = ("grm", "gpcm")
+
+
+def category_probabilities(theta: np.ndarray, params: PolytomousParameters) -> np.ndarray:
+    """
+    P(X = k | theta) for every item, category and ability as one
+    items x categories x len(theta) array; unused categories get 0.
+
+    GRM: P(X >= k) = logistic(a (theta - b_k)) and P(X = k) is the difference
+    of adjacent cumulative probabilities. GPCM: P(X = k) is proportional to
+    exp(sum_{v <= k} a (theta - b_v)).
+    """
+    theta = np.atleast_1d(np.asarray(theta, dtype=float))
+    valid = params.valid[:, :, None]
+    z = params.a[:, None, None] * (theta[None, None, :] - params.thresholds[:, :, None])
+    zeros = np.zeros((params.num_items, 1, len(theta)))
+    if params.model_type == "grm":
+        at_least = valid[:, 1:] / (1.0 + np.exp(-z))
+        cumulative = np.concatenate([zeros + 1.0, at_least, zeros], axis=1)
+        return np.clip(cumulative[:, :-1] - cumulative[:, 1:], 0.0, 1.0)
+    logits = np.where(valid, np.concatenate([zeros, np.cumsum(z, axis=1)], axis=1), -np.inf)
+    logits -= logits.max(axis=1, keepdims=True)
+    weights = np.exp(logits)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def category_derivatives(theta: np.ndarray, params: PolytomousParameters) -> np.ndarray:
+    """d P(X = k | theta) / d theta, in the layout of `category_probabilities`."""
+    theta = np.atleast_1d(np.asarray(theta, dtype=float))
+    a = params.a[:, None, None]
+    if params.model_type == "grm":
+        z = a * (theta[None, None, :] - params.thresholds[:, :, None])
+        at_least = params.valid[:, 1:, None] / (1.0 + np.exp(-z))
+        slope = a * at_least * (1.0 - at_least)
+        zeros = np.zeros((params.num_items, 1, len(theta)))
+        cumulative = np.concatenate([zeros, slope, zeros], axis=1)
+        return cumulative[:, :-1] - cumulative[:, 1:]
+    p = category_probabilities(theta, params)
+    k = np.arange(params.max_categories)[None, :, None]
+    expected = (p * k).sum(axis=1, keepdims=True)
+    return a * p * (k - expected)
+
+
+PARAMETER_COUNTS = {"rasch": (1, 2), "2pl": (2,), "3pl": (3,)}
+
+
+def check_parameter_lists(item_parameters: Dict[str, Sequence[float]], model_type: str):
+    """
+    Raise ValueError unless `item_parameters` is a valid `parameters_from_lists`
+    input: the right number of finite values per item, one discrimination
+    shared by all Rasch items, guessing in [0, 1) and non-decreasing GRM
+    thresholds.
+    """
+    if not item_parameters:
+        raise ValueError("item_parameters is empty")
+    for item_id, values in item_parameters.items():
+        values = list(values)
+        if model_type in POLYTOMOUS_MODELS:
+            if len(values) < 2:
+                raise ValueError(f"Item {item_id}: {model_type} needs a discrimination and at least one threshold")
+        elif len(values) not in PARAMETER_COUNTS[model_type]:
+            counts = " or ".join(str(count) for count in PARAMETER_COUNTS[model_type])
+            raise ValueError(f"Item {item_id}: {model_type} needs {counts} parameters, got {len(values)}")
+        if not np.all(np.isfinite(values)):
+            raise ValueError(f"Item {item_id}: parameters must be finite")
+        if model_type == "3pl" and not 0 <= values[2] < 1:
+            raise ValueError(f"Item {item_id}: guessing must be in [0, 1), got {values[2]}")
+        if model_type == "grm" and np.any(np.diff(values[1:]) < 0):
+            raise ValueError(f"Item {item_id}: GRM thresholds must be non-decreasing")
+    if model_type == "rasch":
+        discriminations = {float(v[0]) if len(v) > 1 else 1.0 for v in item_parameters.values()}
+        if len(discriminations) > 1:
+            raise ValueError("Rasch items share one discrimination")
+
+
+def parameters_from_lists(
+    item_parameters: Dict[str, Sequence[float]], model_type: str
+) -> Union[ItemParameters, PolytomousParameters]:
+    """
+    Convert `IRTModelFit.item_parameters` ([discrimination, difficulty] for
+    Rasch and 2PL, [discrimination, difficulty, guessing] for 3PL,
+    [discrimination, threshold_1, ..., threshold_K-1] for GRM/GPCM) into
+    arrays. Rasch items share one discrimination and may give just
+    [difficulty], meaning a discrimination of 1. Raises ValueError for
+    invalid lists (see `check_parameter_lists`).
+    """
+    check_parameter_lists(item_parameters, model_type)
+    values = [list(v) for v in item_parameters.values()]
+    num_items = len(values)
+    if model_type in POLYTOMOUS_MODELS:
+        num_categories = np.array([len(v) for v in values])
+        thresholds = np.zeros((num_items, max(num_categories.max(initial=2) - 1, 1)))
+        for j, v in enumerate(values):
+            thresholds[j, :len(v) - 1] = v[1:]
+        a = np.array([v[0] for v in values], dtype=float)
+        return PolytomousParameters(model_type, a, thresholds, num_categories)
+    if model_type == "rasch":
+        a = np.array([v[0] if len(v) > 1 else 1.0 for v in values], dtype=float)
+        b = np.array([v[-1] for v in values], dtype=float)
+        return ItemParameters(a, b, np.zeros(num_items))
+    a = np.array([v[0] for v in values], dtype=float)
+    b = np.array([v[1] for v in values], dtype=float)
+    c = np.array([v[2] if model_type == "3pl" else 0.0 for v in values], dtype=float)
+    return ItemParameters(a, b, c)
+
+
+def parameters_to_lists(
+    params: Union[ItemParameters, PolytomousParameters], model_type: str, item_ids: Sequence[str]
+) -> Dict[str, List[float]]:
+    """Inverse of `parameters_from_lists`."""
+    if model_type in POLYTOMOUS_MODELS:
+        return {
+            item_id: [float(params.a[j])] + [float(b) for b in params.thresholds[j, :params.num_categories[j] - 1]]
+            for j, item_id in enumerate(item_ids)
+        }
+    columns = {
+        "rasch": (params.a, params.b),
+        "2pl": (params.a, params.b),
+        "3pl": (params.a, params.b, params.c),
+    }[model_type]
+    return {item_id: [float(col[j]) for col in columns] for j, item_id in enumerate(item_ids)}
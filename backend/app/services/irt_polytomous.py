@@ -0,0 +1,282 @@
+"""
+Marginal maximum likelihood estimation of polytomous IRT models: the Graded
+Response Model (Samejima, 1969) and the Generalized Partial Credit Model
+(Muraki, 1992).
+
+Uses the same EM over a Gauss-Hermite grid as the dichotomous models in
+services/irt_estimation.py. Responses are one-hot coded per item and category,
+so the E-step is again a matrix product per block of students, (students x
+items*categories) @ (items*categories x nodes). Category probabilities are one
+items x categories x nodes array. The M-step fits all items jointly with
+L-BFGS-B. Its gradient uses central differences: the items' objectives are
+independent, so each parameter slot is perturbed for every item at once, which
+costs 2 x categories evaluations per gradient, not 2 x parameters.
+"""
+from dataclasses import dataclass
+from typing import Callable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import optimize
+from scipy.stats import chi2
+
+from services.irt_estimation import A_BOUNDS, B_BOUNDS, Quadrature, gauss_hermite, normalize_posterior
+from services.irt_models import EPS, POLYTOMOUS_MODELS, PolytomousParameters, category_probabilities
+from services.response_matrix import ResponseMatrix, rows_per_block
+
+# Bounds on log(b_k - b_k-1), which keeps GRM boundaries ordered
+LOG_GAP_BOUNDS = (-6.0, 2.0)
+FD_STEP = 1e-5
+
+
+class PolytomousStatistics(NamedTuple):
+    """Expected counts from one E-step."""
+    counts: np.ndarray  # items x categories x nodes
+    log_likelihood: float
+    num_students: int
+
+
+@dataclass
+class PolytomousEstimate:
+    model_type: str
+    params: PolytomousParameters
+    log_likelihood: float
+    num_students: int
+    n_iter: int
+    converged: bool
+    statistics: PolytomousStatistics
+
+    @property
+    def num_params(self) -> int:
+        # one discrimination plus K - 1 thresholds per item
+        return int(self.params.num_categories.sum())
+
+    @property
+    def aic(self) -> float:
+        return -2 * self.log_likelihood + 2 * self.num_params
+
+    @property
+    def bic(self) -> float:
+        return -2 * self.log_likelihood + self.num_params * np.log(self.num_students)
+
+
+def code_blocks(responses, block_size: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield (integer codes, boolean answered) per block of students; NaN marks missing in arrays."""
+    if isinstance(responses, ResponseMatrix):
+        yield from responses.code_blocks(block_size)
+        return
+    responses = np.asarray(responses, dtype=float)
+    block_size = block_size or rows_per_block(responses.shape[1])
+    for start in range(0, responses.shape[0], block_size):
+        block = responses[start:start + block_size]
+        answered = ~np.isnan(block)
+        yield np.where(answered, block, 0).astype(np.int64), answered
+
+
+def _one_hot(codes: np.ndarray, answered: np.ndarray, num_categories: int) -> np.ndarray:
+    """students x (items * categories) indicators of the observed category."""
+    one_hot = (codes[:, :, None] == np.arange(num_categories)) & answered[:, :, None]
+    return one_hot.reshape(len(codes), -1).astype(float)
+
+
+def _log_category_probabilities(params: PolytomousParameters, quad: Quadrature) -> np.ndarray:
+    p = category_probabilities(quad.nodes, params)
+    return np.log(np.clip(p, EPS, 1.0)).reshape(-1, len(quad.nodes))
+
+
+def e_step(blocks: Callable[[], Iterator], params: PolytomousParameters, quad: Quadrature) -> PolytomousStatistics:
+    log_p = _log_category_probabilities(params, quad)
+    log_weights = np.log(quad.weights)
+    counts = np.zeros_like(log_p)
+    log_likelihood = 0.0
+    num_students = 0
+    for codes, answered in blocks():
+        one_hot = _one_hot(codes, answered, params.max_categories)
+        posterior, block_ll = normalize_posterior(one_hot @ log_p + log_weights)
+        counts += one_hot.T @ posterior
+        log_likelihood += block_ll
+        num_students += len(codes)
+    shape = (params.num_items, params.max_categories, len(quad.nodes))
+    return PolytomousStatistics(counts.reshape(shape), log_likelihood, num_students)
+
+
+def _pack(params: PolytomousParameters) -> np.ndarray:
+    """Parameter slots x items, flattened: slot 0 is a, slots 1.. the thresholds (GRM: b_1 and log gaps)."""
+    thresholds = params.thresholds
+    if params.model_type == "grm":
+        gaps = np.diff(thresholds, axis=1)
+        thresholds = np.concatenate([thresholds[:, :1], np.log(np.maximum(gaps, np.exp(LOG_GAP_BOUNDS[0])))], axis=1)
+    return np.vstack([params.a[None, :], thresholds.T]).ravel()
+
+
+def _unpack(x: np.ndarray, template: PolytomousParameters) -> PolytomousParameters:
+    slots = x.reshape(template.max_categories, template.num_items)
+    thresholds = slots[1:].T
+    if template.model_type == "grm":
+        thresholds = thresholds[:, :1] + np.concatenate(
+            [np.zeros((template.num_items, 1)), np.cumsum(np.exp(thresholds[:, 1:]), axis=1)], axis=1
+        )
+    return template._replace(a=slots[0], thresholds=thresholds)
+
+
+def _bounds(params: PolytomousParameters):
+    slot_bounds = [A_BOUNDS, B_BOUNDS]
+    slot_bounds += [LOG_GAP_BOUNDS if params.model_type == "grm" else B_BOUNDS] * (params.max_categories - 2)
+    return [bound for bound in slot_bounds for _ in range(params.num_items)]
+
+
+def _item_objectives(x: np.ndarray, template: PolytomousParameters, counts: np.ndarray, quad: Quadrature) -> np.ndarray:
+    """Negative expected complete-data log-likelihood of each item."""
+    p = category_probabilities(quad.nodes, _unpack(x, template))
+    return -(counts * np.log(np.clip(p, EPS, 1.0))).sum(axis=(1, 2))
+
+
+def _objective(x, template, counts, quad):
+    value = _item_objectives(x, template, counts, quad).sum()
+    num_items = template.num_items
+    grad = np.empty_like(x)
+    for slot in range(template.max_categories):
+        step = np.zeros_like(x)
+        step[slot * num_items:(slot + 1) * num_items] = FD_STEP
+        forward = _item_objectives(x + step, template, counts, quad)
+        backward = _item_objectives(x - step, template, counts, quad)
+        grad[slot * num_items:(slot + 1) * num_items] = (forward - backward) / (2 * FD_STEP)
+    return value, grad
+
+
+def m_step(suff: PolytomousStatistics, params: PolytomousParameters, quad: Quadrature) -> PolytomousParameters:
+    x0 = np.clip(_pack(params), *np.array(_bounds(params)).T)
+    result = optimize.minimize(
+        _objective,
+        x0,
+        args=(params, suff.counts, quad),
+        jac=True,
+        method="L-BFGS-B",
+        bounds=_bounds(params),
+    )
+    return _unpack(result.x, params)
+
+
+def initial_parameters(blocks: Callable[[], Iterator], model_type: str) -> PolytomousParameters:
+    """Start values from the observed category frequencies; an item's categories run up to its largest code."""
+    frequencies = None
+    for codes, answered in blocks():
+        num_categories = int(codes.max(initial=0)) + 1
+        block = (_one_hot(codes, answered, num_categories).reshape(len(codes), -1, num_categories)).sum(axis=0)
+        if frequencies is None:
+            frequencies = block
+        else:
+            width = max(frequencies.shape[1], block.shape[1])
+            frequencies = np.pad(frequencies, ((0, 0), (0, width - frequencies.shape[1]))) + np.pad(
+                block, ((0, 0), (0, width - block.shape[1]))
+            )
+    max_categories = max(frequencies.shape[1], 2)
+    frequencies = np.pad(frequencies, ((0, 0), (0, max_categories - frequencies.shape[1])))
+    observed = frequencies > 0
+    num_categories = np.maximum(max_categories - np.argmax(observed[:, ::-1], axis=1), 2)
+    valid = np.arange(max_categories)[None, :] < num_categories[:, None]
+    smoothed = np.where(valid, frequencies + 0.5, 0.0)
+
+    if model_type == "grm":
+        at_least = smoothed[:, ::-1].cumsum(axis=1)[:, ::-1] / smoothed.sum(axis=1, keepdims=True)
+        at_least = np.clip(at_least[:, 1:], 0.02, 0.98)
+        thresholds = np.clip(-np.log(at_least / (1 - at_least)), *B_BOUNDS)
+        # keep boundaries ordered, also across unused categories
+        thresholds = np.maximum.accumulate(thresholds + 0.05 * np.arange(max_categories - 1), axis=1)
+    else:
+        ratios = smoothed[:, :-1] / np.maximum(smoothed[:, 1:], 0.5)
+        thresholds = np.clip(np.log(ratios), *B_BOUNDS)
+    return PolytomousParameters(model_type, np.ones(len(frequencies)), thresholds, num_categories)
+
+
+def fit_polytomous(
+    responses,
+    model_type: str,
+    num_quadrature: int = 41,
+    max_iter: int = 500,
+    tol: float = 1e-4,
+    init: Optional[PolytomousParameters] = None,
+    progress: Optional[Callable[[int, float], None]] = None,
+    block_size: Optional[int] = None,
+) -> PolytomousEstimate:
+    """
+    Fit a GRM or GPCM by marginal maximum likelihood.
+
+    `responses` is a `ResponseMatrix` or a students x items array of category
+    codes 0..K-1 with NaN for missing responses. Abilities are N(0, 1).
+    """
+    if model_type not in POLYTOMOUS_MODELS:
+        raise ValueError(f"Unknown polytomous model type: {model_type}")
+
+    def blocks():
+        return code_blocks(responses, block_size)
+
+    quad = gauss_hermite(num_quadrature)
+    params = init if init is not None else initial_parameters(blocks, model_type)
+    if block_size is None:
+        # the one-hot expansion multiplies the cells per row by the number of categories
+        block_size = rows_per_block(params.num_items * params.max_categories)
+
+    converged = False
+    iteration = 0
+    for iteration in range(1, max_iter + 1):
+        suff = e_step(blocks, params, quad)
+        if progress is not None:
+            progress(iteration, suff.log_likelihood)
+        new_params = m_step(suff, params, quad)
+        change = np.max(np.abs(_pack(new_params) - _pack(params)))
+        params = new_params
+        if change < tol:
+            converged = True
+            break
+
+    suff = e_step(blocks, params, quad)
+    return PolytomousEstimate(model_type, params, suff.log_likelihood, suff.num_students, iteration, converged, suff)
+
+
+def polytomous_item_fit(
+    responses, estimate: PolytomousEstimate, num_groups: int = 10, num_quadrature: int = 41
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Polytomous counterpart of `irt_estimation.item_fit`. For each item,
+    students are grouped by their EAP ability given the other items. Observed
+    and expected category counts are then compared with a Pearson statistic
+    over groups x categories. Returns (chi_square, degrees_of_freedom, p_value).
+    """
+    params = estimate.params
+    quad = gauss_hermite(num_quadrature)
+    p = category_probabilities(quad.nodes, params)  # items x categories x nodes
+    log_p = np.log(np.clip(p, EPS, 1.0)).reshape(-1, len(quad.nodes))
+    log_weights = np.log(quad.weights)
+    num_items, num_categories = params.num_items, params.max_categories
+    item_index = np.arange(num_items)[None, :]
+
+    theta = []
+    for codes, answered in code_blocks(responses):
+        posterior, _ = normalize_posterior(_one_hot(codes, answered, num_categories) @ log_p + log_weights)
+        theta.append(posterior @ quad.nodes)
+    edges = np.quantile(np.concatenate(theta), np.linspace(0, 1, num_groups + 1)[1:-1])
+
+    size = num_groups * num_items * num_categories
+    observed = np.zeros(size)
+    expected = np.zeros(size)
+    # students x items x nodes leave-one-out posteriors; bound the block
+    block_size = max(1, 4_000_000 // (num_items * max(num_categories, len(quad.nodes))))
+    for codes, answered in code_blocks(responses, block_size):
+        posterior, _ = normalize_posterior(_one_hot(codes, answered, num_categories) @ log_p + log_weights)
+        item_like = np.where(answered[:, :, None], p[item_index, np.minimum(codes, num_categories - 1)], 1.0)
+        loo = posterior[:, None, :] / np.maximum(item_like, EPS)
+        loo /= loo.sum(axis=2, keepdims=True)
+        groups = np.searchsorted(edges, loo @ quad.nodes)  # students x items
+        loo_expected = np.einsum("njq,jkq->njk", loo, p) * answered[:, :, None]
+        one_hot = _one_hot(codes, answered, num_categories).reshape(len(codes), num_items, num_categories)
+        cells = ((groups * num_items + item_index)[:, :, None] * num_categories + np.arange(num_categories)).ravel()
+        observed += np.bincount(cells, weights=one_hot.ravel(), minlength=size)
+        expected += np.bincount(cells, weights=loo_expected.ravel(), minlength=size)
+
+    observed = observed.reshape(num_groups, num_items, num_categories)
+    expected = expected.reshape(num_groups, num_items, num_categories)
+    used = params.valid[None] & (expected.sum(axis=2, keepdims=True) > 0)
+    chi_square = np.where(used, (observed - expected) ** 2 / np.maximum(expected, EPS), 0.0).sum(axis=(0, 2))
+    nonempty_groups = (expected.sum(axis=2) > 0).sum(axis=0)
+    df = np.maximum(nonempty_groups * (params.num_categories - 1) - params.num_categories, 1)
+    return chi_square, df, chi2.sf(chi_square, df)
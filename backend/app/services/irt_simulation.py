@@ -0,0 +1,115 @@
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from services.irt_models import ItemParameters, PolytomousParameters, category_probabilities, irt_probability
+
+SeedLike = Union[None, int, np.random.Generator]
+
+
+def draw_item_parameters(num_items: int, model_type: str, seed: SeedLike = None) -> ItemParameters:
+    """
+    Draw plausible item parameters: b ~ N(0, 1), a ~ LogNormal(0, 0.25) for
+    2PL/3PL (1 for Rasch), c ~ Beta(5, 17) for 3PL (0 otherwise).
+    """
+    rng = np.random.default_rng(seed)
+    b = rng.normal(0.0, 1.0, num_items)
+    a = rng.lognormal(0.0, 0.25, num_items) if model_type in ("2pl", "3pl") else np.ones(num_items)
+    c = rng.beta(5, 17, num_items) if model_type == "3pl" else np.zeros(num_items)
+    return ItemParameters(a, b, c)
+
+
+def draw_polytomous_parameters(
+    num_items: int, model_type: str, num_categories: int = 4, seed: SeedLike = None
+) -> PolytomousParameters:
+    """
+    Draw GRM/GPCM parameters: a ~ LogNormal(0, 0.25) and K - 1 sorted
+    N(0, 1) thresholds per item.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.lognormal(0.0, 0.25, num_items)
+    thresholds = np.sort(rng.normal(0.0, 1.0, (num_items, num_categories - 1)), axis=1)
+    return PolytomousParameters(model_type, a, thresholds, np.full(num_items, num_categories))
+
+
+def draw_abilities(
+    groups: Sequence[str],
+    priors: Dict[str, Tuple[float, float]],
+    seed: SeedLike = None,
+) -> np.ndarray:
+    """
+    Draw one ability per student from the normal prior (mean, sd) of the
+    student's group. Groups are vectorised, not looped per student.
+    """
+    rng = np.random.default_rng(seed)
+    labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+    means = np.array([priors[label][0] for label in labels])
+    sds = np.array([priors[label][1] for label in labels])
+    return means[codes] + sds[codes] * rng.standard_normal(len(codes))
+
+
+def simulate_dichotomous(
+    theta: np.ndarray,
+    params: ItemParameters,
+    seed: SeedLike = None,
+    chunk_size: int = 65536,
+) -> np.ndarray:
+    """
+    Simulate a students x items 0/1 response matrix (int8) in one pass per
+    chunk of students: a uniform draw per cell compared with P(correct).
+    """
+    rng = np.random.default_rng(seed)
+    responses = np.empty((len(theta), params.num_items), dtype=np.int8)
+    for start in range(0, len(theta), chunk_size):
+        block = theta[start:start + chunk_size]
+        p = irt_probability(block, params)
+        responses[start:start + len(block)] = rng.random(p.shape) < p
+    return responses
+
+
+def simulate_polytomous(
+    theta: np.ndarray,
+    params: PolytomousParameters,
+    seed: SeedLike = None,
+    chunk_size: int = 65536,
+) -> np.ndarray:
+    """
+    Simulate a students x items matrix of category codes (int8) by inverting
+    each cell's cumulative category distribution at a uniform draw.
+    """
+    rng = np.random.default_rng(seed)
+    responses = np.empty((len(theta), params.num_items), dtype=np.int8)
+    for start in range(0, len(theta), chunk_size):
+        block = theta[start:start + chunk_size]
+        cumulative = np.cumsum(category_probabilities(block, params), axis=1)  # items x categories x students
+        u = rng.random((params.num_items, len(block)))
+        codes = (u[:, None, :] > cumulative[:, :-1]).sum(axis=1)
+        responses[start:start + len(block)] = codes.T
+    return responses
+
+
+def simulate_responses(
+    num_students: int,
+    params: Union[ItemParameters, PolytomousParameters],
+    ability_mean: float = 0.0,
+    ability_sd: float = 1.0,
+    seed: SeedLike = None,
+    groups: Optional[Sequence[str]] = None,
+    priors: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draw abilities and simulate responses with a single seeded generator.
+    Polytomous parameters give category codes, dichotomous ones 0/1.
+
+    Returns (theta, responses). When `groups` is given, each student's ability
+    comes from `priors[group]`; otherwise everyone shares N(ability_mean,
+    ability_sd).
+    """
+    rng = np.random.default_rng(seed)
+    if groups is None:
+        theta = ability_mean + ability_sd * rng.standard_normal(num_students)
+    else:
+        theta = draw_abilities(groups, priors, seed=rng)
+    if isinstance(params, PolytomousParameters):
+        return theta, simulate_polytomous(theta, params, seed=rng)
+    return theta, simulate_dichotomous(theta, params, seed=rng)
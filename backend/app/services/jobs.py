@@ -0,0 +1,294 @@
+"""
+In-process job queue for long-running analyses.
+
+Submitting work returns a `Job` at once; the work itself runs in a process
+pool (or in the R worker pool), so neither the request nor the event loop
+waits on it. Jobs are deduplicated by key: submitting a key that is already
+pending, running or completed returns the existing job, and completed results
+are kept for reuse. Progress reported by a worker (e.g. EM iteration and
+log-likelihood) is forwarded to subscribers of `Job.events()`. Jobs that fan
+out over the pool (e.g. bootstrap replicates) are coroutines submitted with
+`submit_task`; they use `map` and publish partial results with `Job.update`.
+I/O-bound coroutines such as quiz generation use `submit_task` without the pool.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence
+
+from services.r_pool import run_r_job
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Finished jobs kept for reuse before the oldest are dropped
+FINISHED_JOB_LIMIT = 256
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class Job:
+    def __init__(self, key: Hashable, kind: str, resource_id: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.kind = kind
+        # What the job works on: the simulation of an analysis or simulation
+        # job, the quiz of a quiz job
+        self.resource_id = resource_id
+        self.status = JobStatus.PENDING
+        self.progress: Dict[str, float] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    def update(self, progress: Dict[str, float], result: Any = None):
+        """Publish progress, and optionally a partial result, of a running job."""
+        self.progress = progress
+        if result is not None:
+            self.result = result
+        self._publish("progress")
+
+    def _publish(self, event: str):
+        for queue in self._subscribers:
+            queue.put_nowait({"event": event, "status": self.status.value, "progress": dict(self.progress)})
+
+    async def wait(self) -> Any:
+        """Wait for the job and return its result, raising if it failed."""
+        await self._done.wait()
+        if self.status == JobStatus.FAILED:
+            raise RuntimeError(self.error)
+        return self.result
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the current state, then every status/progress change until the job finishes."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            yield {"event": "status", "status": self.status.value, "progress": dict(self.progress)}
+            while not self.finished or not queue.empty():
+                event = await queue.get()
+                yield event
+                if event["status"] in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                    return
+        finally:
+            self._subscribers.remove(queue)
+
+
+# Set in each pool worker by `_init_worker`
+_progress_queue = None
+
+
+def _init_worker(queue, blas_threads: int):
+    global _progress_queue
+    _progress_queue = queue
+    # Split the cores between workers rather than letting every worker's BLAS
+    # use all of them
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(blas_threads)
+
+
+def _run_in_worker(job_id: str, fn: Callable, args: tuple, reports_progress: bool) -> Any:
+    if not reports_progress:
+        return fn(*args)
+
+    def progress(iteration: int, log_likelihood: float):
+        _progress_queue.put((job_id, {"iteration": iteration, "log_likelihood": float(log_likelihood)}))
+
+    return fn(*args, progress=progress)
+
+
+class JobManager:
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[Hashable, Job] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            self._queue = context.Queue()
+            self._loop = asyncio.get_running_loop()
+            self._executor = ProcessPoolExecutor(
+                self.max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._queue, max(1, (os.cpu_count() or 1) // self.max_workers)),
+            )
+            threading.Thread(target=self._listen, args=(self._queue,), daemon=True).start()
+        return self._executor
+
+    def _listen(self, queue):
+        """Forward progress from pool workers to the event loop."""
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_progress, *item)
+
+    def _on_progress(self, job_id: str, progress: Dict[str, float]):
+        job = self._jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.progress = progress
+            job._publish("progress")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def find(self, key: Hashable) -> Optional[Job]:
+        """Return the reusable job for `key`, i.e. one that has not failed."""
+        job = self._by_key.get(key)
+        if job is None or job.status == JobStatus.FAILED:
+            return None
+        return job
+
+    def submit(
+        self,
+        key: Hashable,
+        kind: str,
+        resource_id: str,
+        fn: Callable,
+        *args,
+        engine: str = "process",
+        reports_progress: bool = False,
+        on_result: Optional[Callable[[Any], None]] = None,
+    ) -> Job:
+        """
+        Schedule `fn(*args)` unless a reusable job with the same key exists.
+
+        `engine="process"` runs in the process pool and, with
+        `reports_progress`, passes `progress=callback(iteration, log_likelihood)`
+        to `fn`; `engine="r"` runs in the R worker pool. `on_result` is
+        called with the result when the job completes.
+        """
+        return self.submit_task(
+            key, kind, resource_id, lambda job: self._execute(job, fn, args, engine, reports_progress), on_result
+        )
+
+    def submit_task(
+        self,
+        key: Hashable,
+        kind: str,
+        resource_id: str,
+        run: Callable[[Job], Awaitable[Any]],
+        on_result: Optional[Callable[[Any], None]] = None,
+    ) -> Job:
+        """
+        Schedule the coroutine `run(job)` on the event loop unless a reusable
+        job with the same key exists. Use it for jobs that orchestrate several
+        pool tasks through `map`.
+        """
+        existing = self.find(key)
+        if existing is not None:
+            return existing
+        job = Job(key, kind, resource_id)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        asyncio.create_task(self._run(job, run, on_result))
+        self._prune()
+        return job
+
+    async def map(self, fn: Callable, args_list: Sequence[tuple]) -> AsyncIterator[Any]:
+        """Run `fn(*args)` for every args in the process pool, yielding results as they complete."""
+        executor = self._ensure_executor()
+        futures = [self._loop.run_in_executor(executor, fn, *args) for args in args_list]
+        try:
+            for future in asyncio.as_completed(futures):
+                yield await future
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def completed(self, key: Hashable, kind: str, resource_id: str, result: Any) -> Job:
+        """Register an already-known result (e.g. from a cache) as a finished job."""
+        job = Job(key, kind, resource_id)
+        job.status = JobStatus.COMPLETED
+        job.result = result
+        job.finished_at = time.time()
+        job._done.set()
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        self._prune()
+        return job
+
+    async def _execute(self, job: Job, fn: Callable, args: tuple, engine: str, reports_progress: bool) -> Any:
+        if engine == "r":
+            return await run_r_job(fn, *args)
+        executor = self._ensure_executor()
+        return await self._loop.run_in_executor(executor, _run_in_worker, job.id, fn, args, reports_progress)
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[Any]], on_result: Optional[Callable[[Any], None]]):
+        job.status = JobStatus.RUNNING
+        job._publish("status")
+        try:
+            result = await run(job)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # A worker died; start a fresh pool for the next job
+                self._executor = None
+                self._queue.put(None)
+            job.status = JobStatus.FAILED
+            job.error = str(e) or type(e).__name__
+        else:
+            job.status = JobStatus.COMPLETED
+            job.result = result
+            if on_result is not None:
+                try:
+                    on_result(result)
+                except Exception:
+                    # The result is still served from the job; only storing it failed
+                    logger.exception("on_result failed for %s job %s", job.kind, job.id)
+        finally:
+            if not job.finished:  # cancelled
+                job.status = JobStatus.FAILED
+                job.error = "Job was cancelled"
+            job.finished_at = time.time()
+            job._done.set()
+            job._publish(job.status.value)
+
+    def invalidate(self, resource_id: str):
+        """Forget finished jobs for a simulation (or quiz) so the next submit recomputes."""
+        for key, job in list(self._by_key.items()):
+            if job.resource_id == resource_id and job.finished:
+                del self._by_key[key]
+                del self._jobs[job.id]
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - FINISHED_JOB_LIMIT)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._queue.put(None)
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+manager = JobManager()
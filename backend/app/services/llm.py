@@ -0,0 +1,107 @@
+"""
+Shared async access to the chat completion API.
+
+All LLM work of the backend (quiz generation, persona simulation) goes
+through one `LLMClient`, whose semaphore bounds the number of requests in
+flight across every job, so concurrent jobs queue for slots instead of
+tripping the provider's rate limit. Replies are requested as JSON objects and
+handed to a `parse` callable; a reply that fails to parse or validate is
+retried like a transient API error.
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+import openai
+from openai import AsyncOpenAI
+
+# The retry helpers are shared with the persona pipeline, which is not an
+# installed package either; import them from the tree
+PIPELINE_DIR = Path(__file__).resolve().parents[3] / "student_persona"
+if str(PIPELINE_DIR) not in sys.path:
+    sys.path.append(str(PIPELINE_DIR))
+
+from adaptive_concurrency import RetriesExhausted, backoff_delay  # noqa: E402
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo-1106")
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+T = TypeVar("T")
+
+
+class LLMClient:
+    def __init__(
+        self,
+        model: str = LLM_MODEL,
+        concurrency: int = LLM_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Created lazily, so importing the app does not require an API key
+        if self._client is None:
+            self._client = AsyncOpenAI()
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _record_usage(self, response):
+        usage = getattr(response, "usage", None)
+        for field in ("prompt_tokens", "completion_tokens"):
+            tokens = getattr(usage, field, None)
+            if isinstance(tokens, int):
+                self.usage[field] += tokens
+        self.usage["requests"] += 1
+
+    async def complete_json(
+        self,
+        messages: List[Dict[str, str]],
+        parse: Callable[[Dict[str, Any]], T],
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+    ) -> T:
+        """
+        Send one chat completion in JSON mode and return `parse(reply)`.
+        Rate limits, connection and server errors, and replies that are not
+        JSON or make `parse` raise ValueError (including pydantic validation
+        errors) are retried with jittered backoff. Raises RetriesExhausted once
+        every attempt failed; errors retrying cannot fix are raised as is.
+        """
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(backoff_delay(attempt - 1))
+            try:
+                async with self.semaphore:
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        response_format={"type": "json_object"},
+                    )
+                self._record_usage(response)
+                return parse(json.loads(response.choices[0].message.content or ""))
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError, ValueError) as e:
+                last_error = e
+
+        raise RetriesExhausted(f"{self.max_retries + 1} attempts failed: {last_error}") from last_error
+
+
+llm = LLMClient()
@@ -0,0 +1,233 @@
+"""
+LLM simulation of students answering a quiz.
+
+Each persona answers the whole quiz in a single chat completion that returns
+one JSON object, {"answers": {item_id: chosen option}}. That is one request
+per student rather than one per (student, item). Replies are validated
+against the requested item ids and each item's options. Personas run
+concurrently through the shared LLM client, which bounds the number of
+requests in flight.
+
+Answers are cached persistently per (persona, item, model, temperature). An
+item is identified by a hash of its question and options, so editing one item
+only re-asks that item, and a persona whose answers are all cached costs no
+request at all.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Union
+
+from services.analysis_cache import CACHE_DIR
+from services.llm import LLMClient, llm
+
+RESPONSE_CACHE_PATH = Path(os.getenv("PERSONA_RESPONSE_CACHE", str(CACHE_DIR / "persona_responses.sqlite")))
+# Completion budget per item in the answers object
+TOKENS_PER_ITEM = 48
+
+SYSTEM_PROMPT = (
+    "You role-play students taking a math quiz. Answer as the described student would, "
+    "including the mistakes such a student would typically make. Reply with a single JSON object and nothing else."
+)
+
+QUIZ_PROMPT_TEMPLATE = """Student: {persona}
+
+Answer every question below as this student. For each question choose exactly one of its options and copy it exactly.
+
+{items}
+
+Reply with a JSON object of the form {{"answers": {{"<question id>": "<chosen option>"}}}} with an entry for every question id."""
+
+
+class SimulationItem(NamedTuple):
+    id: str
+    question: str
+    options: List[str]
+
+
+class Persona(NamedTuple):
+    id: str  # stable across simulations; see `persona_ids`
+    description: str
+
+
+def item_hash(item: SimulationItem) -> str:
+    """Content hash of what a student sees: the question and its options."""
+    payload = json.dumps([item.question, item.options], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def persona_ids(descriptions: Iterable[str]) -> List[str]:
+    """
+    Ids from a hash of each description plus its occurrence number, so the
+    same persona keeps its cached answers across simulations while repeated
+    draws of one persona within a simulation stay independent students.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for description in descriptions:
+        digest = hashlib.sha256(" ".join(description.split()).lower().encode("utf-8")).hexdigest()[:32]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{digest}-{occurrence}")
+    return ids
+
+
+class ResponseCache:
+    """
+    SQLite store of simulated answers, keyed on (persona id, item hash,
+    model, temperature). It is safe to share between threads.
+    """
+
+    def __init__(self, path: Union[str, Path] = RESPONSE_CACHE_PATH):
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened lazily, so importing the app does not create the cache directory
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "persona_id TEXT NOT NULL, item_hash TEXT NOT NULL, model TEXT NOT NULL, "
+                "temperature REAL NOT NULL, answer TEXT NOT NULL, "
+                "PRIMARY KEY (persona_id, item_hash, model, temperature))"
+            )
+        return self._conn
+
+    def get(self, persona_id: str, item_hashes: Sequence[str], model: str, temperature: float) -> Dict[str, str]:
+        """Cached answers of a persona as {item hash: answer}, for the hashes that are cached."""
+        wanted = set(item_hashes)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT item_hash, answer FROM responses WHERE persona_id = ? AND model = ? AND temperature = ?",
+                (persona_id, model, float(temperature)),
+            ).fetchall()
+        answers = {item: answer for item, answer in rows if item in wanted}
+        self.hits += len(answers)
+        self.misses += len(wanted) - len(answers)
+        return answers
+
+    def put(self, persona_id: str, answers: Dict[str, str], model: str, temperature: float):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO responses (persona_id, item_hash, model, temperature, answer) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(persona_id, item, model, float(temperature), answer) for item, answer in answers.items()],
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": size, "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
+
+
+def quiz_messages(persona: Persona, items: Sequence[SimulationItem]) -> List[Dict[str, str]]:
+    listing = "\n\n".join(
+        f"Question {item.id}: {item.question}\nOptions:\n" + "\n".join(f"- {option}" for option in item.options)
+        for item in items
+    )
+    prompt = QUIZ_PROMPT_TEMPLATE.format(persona=" ".join(persona.description.split()), items=listing)
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(str(text).split()).casefold()
+
+
+def parse_answers(reply: dict, items: Sequence[SimulationItem]) -> Dict[str, str]:
+    """
+    {item id: option} from a reply, mapping each answer onto the exact option
+    text (ignoring case and whitespace). Raises ValueError if an item is
+    missing or an answer is not one of its options, so the call is retried.
+    """
+    answers = reply.get("answers") if isinstance(reply, dict) else None
+    if not isinstance(answers, dict):
+        raise ValueError("Reply has no answers object")
+    answers = {str(item_id).strip(): answer for item_id, answer in answers.items()}
+    parsed = {}
+    for item in items:
+        if item.id not in answers:
+            raise ValueError(f"No answer for item {item.id}")
+        options = {_normalize(option): option for option in item.options}
+        option = options.get(_normalize(answers[item.id]))
+        if option is None:
+            raise ValueError(f"Answer to item {item.id} is not one of its options")
+        parsed[item.id] = option
+    return parsed
+
+
+class PersonaAnswers(NamedTuple):
+    persona: Persona
+    answers: Dict[str, str]  # item id -> chosen option
+    cached: int  # answers taken from the cache
+
+
+async def answer_quiz(
+    persona: Persona,
+    items: Sequence[SimulationItem],
+    hashes: Sequence[str],
+    client: LLMClient = llm,
+    temperature: float = 0.7,
+    cache: Optional[ResponseCache] = response_cache,
+) -> PersonaAnswers:
+    """Answers of one persona, asking the LLM only for the items not cached."""
+    cached = cache.get(persona.id, hashes, client.model, temperature) if cache is not None else {}
+    missing = [(item, digest) for item, digest in zip(items, hashes) if digest not in cached]
+    fresh: Dict[str, str] = {}
+    if missing:
+        missing_items = [item for item, _ in missing]
+        fresh = await client.complete_json(
+            quiz_messages(persona, missing_items),
+            lambda reply: parse_answers(reply, missing_items),
+            temperature,
+            max_tokens=TOKENS_PER_ITEM * len(missing) + 64,
+        )
+        if cache is not None:
+            cache.put(persona.id, {digest: fresh[item.id] for item, digest in missing}, client.model, temperature)
+    answers = {item.id: cached[digest] if digest in cached else fresh[item.id] for item, digest in zip(items, hashes)}
+    return PersonaAnswers(persona, answers, len(items) - len(missing))
+
+
+async def simulate_quiz(
+    personas: Sequence[Persona],
+    items: Sequence[SimulationItem],
+    client: LLMClient = llm,
+    temperature: float = 0.7,
+    cache: Optional[ResponseCache] = response_cache,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> List[PersonaAnswers]:
+    """
+    Answers of every persona, in persona order. All personas are submitted at
+    once; `progress(completed, cached)` is called after each one finishes,
+    with the number of personas done and of answers served from the cache.
+    """
+    hashes = [item_hash(item) for item in items]
+    tasks = [asyncio.create_task(answer_quiz(p, items, hashes, client, temperature, cache)) for p in personas]
+    completed = cached = 0
+    try:
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            completed += 1
+            cached += result.cached
+            if progress is not None:
+                progress(completed, cached)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return [task.result() for task in tasks]
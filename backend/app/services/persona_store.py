@@ -0,0 +1,113 @@
+"""
+Process-wide cache of student persona datasets.
+
+Persona files are read once per process and kept until the file on disk
+changes (checked by mtime on every lookup). When an Arrow IPC copy
+(`{level}_students.arrow`, written by student_persona/columnar.py) is present
+and at least as new as the CSV it is memory-mapped, so loading is zero-copy and
+sampling only materialises the selected rows. Otherwise the CSV is parsed once
+and held in memory. Every column is read as a string, as in the Arrow copy, so
+the path taken does not change the dtypes.
+"""
+import csv
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pyarrow is optional; fall back to pandas
+    pa = None
+
+PERSONA_DIR = Path(os.getenv("PERSONA_DIR", "student_persona"))
+
+_cache: Dict[Path, Tuple[Tuple[int, int], object]] = {}
+_lock = threading.Lock()
+
+
+def _mtime(path: Path) -> int:
+    return path.stat().st_mtime_ns if path.exists() else -1
+
+
+def _read(csv_path: Path, arrow_path: Path):
+    if pa is not None and arrow_path.exists() and _mtime(arrow_path) >= _mtime(csv_path):
+        return pa.ipc.open_file(pa.memory_map(str(arrow_path), "r")).read_all()
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        return pd.DataFrame()
+    if pa is None:
+        return pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    return pacsv.read_csv(
+        csv_path,
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            strings_can_be_null=False,
+        ),
+    )
+
+
+def load_persona_dataset(school_level: str, directory: Optional[Path] = None):
+    """
+    Return the cached persona table for a school level.
+
+    The result is a `pyarrow.Table` when pyarrow is installed and a
+    `pd.DataFrame` otherwise, with string columns either way. Raises
+    FileNotFoundError if neither a CSV nor an Arrow file exists for the level.
+    """
+    directory = directory or PERSONA_DIR
+    csv_path = directory / f"{school_level}_students.csv"
+    arrow_path = directory / f"{school_level}_students.arrow"
+    version = (_mtime(csv_path), _mtime(arrow_path))
+    if version == (-1, -1):
+        raise FileNotFoundError(f"No persona file found for {school_level} level")
+
+    with _lock:
+        cached = _cache.get(csv_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        dataset = _read(csv_path, arrow_path)
+        _cache[csv_path] = (version, dataset)
+        return dataset
+
+
+def sample_personas(
+    school_level: str,
+    num_students: Optional[int] = None,
+    seed: Optional[Union[int, np.random.Generator]] = None,
+    directory: Optional[Path] = None,
+) -> pd.DataFrame:
+    """
+    Sample `num_students` personas for a school level as a DataFrame.
+
+    Rows are drawn without replacement when the file has enough of them and
+    with replacement otherwise. `num_students=None` returns every persona.
+    The DataFrame index holds each persona's row number in the file. Raises
+    FileNotFoundError if the file has no personas.
+    """
+    dataset = load_persona_dataset(school_level, directory)
+    num_rows = len(dataset)
+    if num_rows == 0:
+        raise FileNotFoundError(f"The persona file for {school_level} level is empty")
+    if num_students is None:
+        indices = np.arange(num_rows)
+    else:
+        rng = np.random.default_rng(seed)
+        indices = rng.choice(num_rows, size=num_students, replace=num_students > num_rows)
+
+    if pa is not None and isinstance(dataset, pa.Table):
+        sampled = dataset.take(pa.array(indices)).to_pandas()
+        sampled.index = pd.Index(indices)
+        return sampled
+    return dataset.iloc[indices]
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,105 @@
+"""
+Concurrent generation of quiz items.
+
+Every item is its own chat completion and all of them are sent at once, so
+the first items arrive after a single round trip, not after the whole quiz.
+The shared LLM client bounds the number of requests in flight. Each reply is
+validated as soon as it arrives, and a reply that fails validation is
+regenerated on its own; the rest of the quiz is not redone. An item that
+still fails after every retry is reported as failed while the others
+complete. Items are
+spread over a range of difficulties and each is told its position in the
+quiz, so independent calls do not all write the same question.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, TypeVar, Union
+
+from services.llm import LLMClient, RetriesExhausted, llm
+
+T = TypeVar("T")
+
+DIFFICULTIES = ("very easy", "easy", "medium", "hard", "very hard")
+
+SYSTEM_PROMPT = "You write math quiz items. Reply with a single JSON object and nothing else."
+
+ITEM_PROMPTS = {
+    "dichotomous": (
+        "Write item {number} of a {num_items}-item quiz on \"{knowledge_point}\" for {school_level} students. "
+        "Make it a {difficulty} multiple-choice question with exactly one correct option, scored right or wrong.\n"
+        "Reply with a JSON object with the keys \"question\" (string), \"options\" (list of 4 distinct strings), "
+        "\"correct_answer\" (string, copied exactly from \"options\") and \"explanation\" (string)."
+    ),
+    "polynomous": (
+        "Write item {number} of a {num_items}-item quiz on \"{knowledge_point}\" for {school_level} students. "
+        "Make it a {difficulty} multi-step constructed-response question scored with partial credit.\n"
+        "Reply with a JSON object with the keys \"question\" (string), \"options\" (list of 3 to 5 strings "
+        "describing what a response shows at each score level, from no credit up to full credit), "
+        "\"correct_answer\" (string, a full-credit answer) and \"explanation\" (string)."
+    ),
+}
+
+
+class ItemSpec(NamedTuple):
+    number: int  # 1-based position in the quiz, used as the item id
+    difficulty: str
+
+
+class FailedItem(NamedTuple):
+    number: int
+    error: str
+
+
+def item_specs(num_items: int) -> List[ItemSpec]:
+    """Positions with difficulties rising evenly from the first item to the last."""
+    return [
+        ItemSpec(number, DIFFICULTIES[(number - 1) * len(DIFFICULTIES) // num_items])
+        for number in range(1, num_items + 1)
+    ]
+
+
+def item_messages(
+    spec: ItemSpec, knowledge_point: str, school_level: str, item_type: str, num_items: int
+) -> List[Dict[str, str]]:
+    prompt = ITEM_PROMPTS[item_type].format(
+        number=spec.number,
+        num_items=num_items,
+        knowledge_point=knowledge_point,
+        school_level=school_level,
+        difficulty=spec.difficulty,
+    )
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+async def generate_items(
+    knowledge_point: str,
+    school_level: str,
+    item_type: str,
+    num_items: int,
+    parse_item: Callable[[Dict[str, Any], int], T],
+    client: LLMClient = llm,
+    temperature: float = 0.8,
+) -> AsyncIterator[Union[T, FailedItem]]:
+    """
+    Generate `num_items` items concurrently and yield them in the order they
+    complete. `parse_item(reply, number)` turns a JSON reply into an item and
+    raises ValueError to have that item regenerated. An item whose retries
+    are exhausted is yielded as a `FailedItem` and the others carry on; errors
+    that retrying cannot fix are raised and cancel the other requests.
+    """
+    if item_type not in ITEM_PROMPTS:
+        raise ValueError(f"Unknown item type: {item_type}")
+
+    async def generate(spec: ItemSpec) -> Union[T, FailedItem]:
+        messages = item_messages(spec, knowledge_point, school_level, item_type, num_items)
+        try:
+            return await client.complete_json(messages, lambda reply: parse_item(reply, spec.number), temperature)
+        except RetriesExhausted as e:
+            return FailedItem(spec.number, str(e))
+
+    tasks = [asyncio.create_task(generate(spec)) for spec in item_specs(num_items)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,251 @@
+"""
+Pool of long-lived R worker processes for the rpy2-backed analyses.
+
+Each worker is a spawned process that embeds R, loads the libraries and
+defines the helper functions below exactly once, then serves jobs over a pipe.
+Jobs are dispatched from the event loop without blocking it. A job that
+exceeds its timeout has its worker killed and replaced. Workers are also
+recycled after a fixed number of jobs, so memory leaked inside R does not
+accumulate.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+R_LIBRARIES = ("ltm", "NOHARM")
+
+R_FUNCTIONS = '''
+perform_noharm <- function(data) {
+    model <- NOHARM(data, factors=1)
+    list(
+        loadings=model$loadings,
+        fit=model$fit,
+        rmsr=model$rmsr
+    )
+}
+fit_rasch <- function(data) {
+    model <- rasch(data)
+    list(
+        coef=coef(model),
+        aic=AIC(model),
+        bic=BIC(model),
+        item_fit=itemfit(model)
+    )
+}
+fit_2pl <- function(data) {
+    model <- ltm(data ~ z1)
+    list(
+        coef=coef(model),
+        aic=AIC(model),
+        bic=BIC(model),
+        item_fit=itemfit(model)
+    )
+}
+'''
+
+POOL_SIZE = int(os.getenv("R_POOL_SIZE", "2"))
+JOB_TIMEOUT = float(os.getenv("R_JOB_TIMEOUT", "300"))
+RECYCLE_AFTER = int(os.getenv("R_RECYCLE_AFTER", "100"))
+STARTUP_TIMEOUT = 120.0
+
+
+class RWorkerError(RuntimeError):
+    pass
+
+
+def _worker_main(conn):
+    """Entry point of a worker process: initialise R once, then serve jobs."""
+    try:
+        import rpy2.robjects as robjects
+        from rpy2.robjects import pandas2ri
+
+        pandas2ri.activate()
+        missing = []
+        for library in R_LIBRARIES:
+            try:
+                robjects.r(f"suppressPackageStartupMessages(library({library}))")
+            except Exception:
+                missing.append(library)
+        robjects.r(R_FUNCTIONS)
+    except Exception as e:
+        conn.send(("error", f"R initialisation failed: {e!r}"))
+        return
+    conn.send(("ready", missing))
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            conn.send(("ok", fn(*args)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class RWorker:
+    def __init__(self, context, target: Callable = _worker_main):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=target, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+        if not self.conn.poll(STARTUP_TIMEOUT):
+            self.stop()
+            raise RWorkerError("R worker did not start in time")
+        try:
+            status, payload = self.conn.recv()
+        except EOFError:
+            status, payload = "error", "R worker exited during start-up"
+        if status != "ready":
+            self.stop()
+            raise RWorkerError(payload)
+        self.missing_libraries: List[str] = payload
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def run(self, fn: Callable, args: tuple, timeout: float) -> Any:
+        """Run one job; kills the worker if it does not answer within `timeout`."""
+        self.conn.send((fn, args))
+        if not self.conn.poll(timeout):
+            self.stop()
+            raise TimeoutError(f"R job {getattr(fn, '__name__', fn)} timed out after {timeout:.0f}s")
+        try:
+            status, payload = self.conn.recv()
+        except EOFError:
+            self.stop()
+            raise RWorkerError("R worker died while running a job")
+        self.jobs_done += 1
+        if status == "error":
+            raise RWorkerError(payload)
+        return payload
+
+    def stop(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RWorkerPool:
+    def __init__(self, size: int = POOL_SIZE, job_timeout: float = JOB_TIMEOUT, recycle_after: int = RECYCLE_AFTER):
+        self.size = size
+        self.job_timeout = job_timeout
+        self.recycle_after = recycle_after
+        # Spawn rather than fork: embedded R is not fork-safe
+        self._context = multiprocessing.get_context("spawn")
+        # Idle workers; None once the last worker is gone, so waiters do not hang
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[RWorker] = []
+        self._replacing = 0
+        self.missing_libraries: List[str] = []
+
+    async def start(self):
+        self._idle = asyncio.Queue()
+        results = await asyncio.gather(
+            *(asyncio.to_thread(RWorker, self._context) for _ in range(self.size)), return_exceptions=True
+        )
+        workers = [result for result in results if not isinstance(result, BaseException)]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # Do not leak the workers that did start
+            await asyncio.gather(*(asyncio.to_thread(worker.stop) for worker in workers))
+            raise errors[0]
+        for worker in workers:
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+        self.missing_libraries = workers[0].missing_libraries if workers else []
+
+    async def _replace(self, worker: RWorker):
+        self._replacing += 1
+        worker.stop()
+        self._workers.remove(worker)
+        try:
+            fresh = await asyncio.to_thread(RWorker, self._context)
+        except RWorkerError:
+            logger.exception("Could not replace R worker")
+            fresh = None
+        finally:
+            self._replacing -= 1
+        if fresh is not None:
+            self._workers.append(fresh)
+            self._idle.put_nowait(fresh)
+        elif not self._workers and not self._replacing:
+            self._idle.put_nowait(None)
+
+    def _release(self, worker: RWorker, job: asyncio.Future):
+        """Return `worker` to the pool once its job has finished, whether or not anyone still awaits it."""
+        if not job.cancelled():
+            job.exception()  # retrieved by the caller, unless it was cancelled
+        if not worker.alive or worker.jobs_done >= self.recycle_after:
+            asyncio.create_task(self._replace(worker))
+        else:
+            self._idle.put_nowait(worker)
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run `fn(*args)` in an R worker and return its (picklable) result.
+
+        `fn` must be importable by reference (a module-level function) and
+        may assume the libraries and R helper functions are loaded.
+        """
+        if not self._workers and not self._replacing:
+            raise RWorkerError("No R workers are left")
+        worker = await self._idle.get()
+        if worker is None:
+            self._idle.put_nowait(None)  # wake the next waiter as well
+            raise RWorkerError("No R workers are left")
+        job = asyncio.ensure_future(asyncio.to_thread(worker.run, fn, args, timeout or self.job_timeout))
+        job.add_done_callback(lambda job: self._release(worker, job))
+        # Cancelling the caller cannot stop the thread, so the worker stays busy until the job ends
+        return await asyncio.shield(job)
+
+    async def shutdown(self):
+        await asyncio.gather(*(asyncio.to_thread(worker.stop) for worker in self._workers))
+        self._workers = []
+
+
+_pool: Optional[RWorkerPool] = None
+
+
+async def start_pool(size: int = POOL_SIZE):
+    """Warm the process-wide pool. Without a working R install the pool stays disabled."""
+    global _pool
+    pool = RWorkerPool(size)
+    try:
+        await pool.start()
+    except RWorkerError as e:
+        logger.warning("R worker pool disabled: %s", e)
+        await pool.shutdown()
+        return
+    if pool.missing_libraries:
+        logger.warning("R libraries not available: %s", ", ".join(pool.missing_libraries))
+    _pool = pool
+
+
+async def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.shutdown()
+        _pool = None
+
+
+async def run_r_job(fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+    if _pool is None:
+        raise RWorkerError("R worker pool is not available")
+    return await _pool.run(fn, *args, timeout=timeout)
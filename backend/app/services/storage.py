@@ -0,0 +1,221 @@
+"""
+Persistent store for quizzes, simulations and their response matrices.
+
+Quizzes and simulation metadata live in SQLite, indexed by quiz_id and
+simulation_id. Response matrices are kept out of the database as the raw
+arrays of a `DenseResponseMatrix`: an int8 code array and the packed
+answered bitmask, each in its own .npy file. Loading memory-maps both files,
+so a 100k x 100 matrix opens in milliseconds without copying or parsing, and
+only the blocks an analysis touches are read from disk. The matrix
+fingerprint is stored with the metadata, so cache lookups do not need to hash
+the arrays again.
+
+Arrays are written to temporary files and renamed into place before the
+metadata row is committed, so readers never see a row whose arrays are
+missing or half written.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from services.response_matrix import DenseResponseMatrix, ResponseMatrix
+
+STORAGE_DIR = Path(os.getenv("STORAGE_DIR", ".storage"))
+
+
+class SimulationRecord(NamedTuple):
+    simulation_id: str
+    quiz_id: str
+    method: str
+    created_at: float
+    num_students: int
+    item_ids: List[str]
+    max_scores: List[float]  # top score of each item
+    summary_statistics: Dict[str, float]
+    options: Optional[List[List[str]]]  # per item, when the chosen options are stored too
+    fingerprint: str  # of the scored response matrix
+
+
+def _dense(responses: ResponseMatrix) -> DenseResponseMatrix:
+    if isinstance(responses, DenseResponseMatrix):
+        return responses
+    return DenseResponseMatrix.from_array(responses.to_array(), responses.item_ids)
+
+
+def _write_array(path: Path, array: np.ndarray):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+class Storage:
+    _COLUMNS = "simulation_id, quiz_id, method, created_at, num_students, fingerprint, metadata"
+
+    def __init__(self, directory: Path = STORAGE_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened lazily, so importing the app does not create the directory
+        if self._conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                str(self.directory / "genmeasure.sqlite3"), check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quizzes ("
+                "quiz_id TEXT PRIMARY KEY, knowledge_point TEXT NOT NULL, school_level TEXT NOT NULL, "
+                "created_at REAL NOT NULL, quiz TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS simulations ("
+                "simulation_id TEXT PRIMARY KEY, quiz_id TEXT NOT NULL, method TEXT NOT NULL, "
+                "created_at REAL NOT NULL, num_students INTEGER NOT NULL, fingerprint TEXT NOT NULL, "
+                "metadata TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_simulations_quiz ON simulations (quiz_id, created_at)"
+            )
+        return self._conn
+
+    def _matrix_paths(self, simulation_id: str, kind: str):
+        stem = hashlib.sha1(simulation_id.encode()).hexdigest()[:24]
+        directory = self.directory / "matrices"
+        return directory / f"{stem}-{kind}-codes.npy", directory / f"{stem}-{kind}-mask.npy"
+
+    def save_quiz(self, quiz: Dict[str, Any]):
+        """Insert or replace a quiz, given as its JSON-compatible dict."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO quizzes (quiz_id, knowledge_point, school_level, created_at, quiz) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (quiz["id"], quiz["knowledge_point"], quiz["school_level"], time.time(), json.dumps(quiz)),
+            )
+
+    def load_quiz(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT quiz FROM quizzes WHERE quiz_id = ?", (quiz_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save_simulation(
+        self,
+        simulation_id: str,
+        quiz_id: str,
+        method: str,
+        responses: ResponseMatrix,
+        max_scores: Sequence[float],
+        summary_statistics: Dict[str, float],
+        choices: Optional[ResponseMatrix] = None,
+        options: Optional[List[List[str]]] = None,
+    ) -> SimulationRecord:
+        """
+        Store the scored responses of a simulation, and optionally the index of
+        the option each student chose (`choices`, with the `options` of every
+        item). Replaces an existing simulation with the same id.
+        """
+        responses = _dense(responses)
+        matrices = {"responses": responses}
+        if choices is not None:
+            matrices["choices"] = _dense(choices)
+        for kind, matrix in matrices.items():
+            codes_path, mask_path = self._matrix_paths(simulation_id, kind)
+            codes_path.parent.mkdir(parents=True, exist_ok=True)
+            _write_array(codes_path, matrix.codes)
+            _write_array(mask_path, matrix.mask)
+
+        record = SimulationRecord(
+            simulation_id=simulation_id,
+            quiz_id=quiz_id,
+            method=method,
+            created_at=time.time(),
+            num_students=responses.shape[0],
+            item_ids=list(responses.item_ids),
+            max_scores=[float(score) for score in max_scores],
+            summary_statistics=summary_statistics,
+            options=options if choices is not None else None,
+            fingerprint=responses.fingerprint(),
+        )
+        metadata = {
+            "item_ids": record.item_ids,
+            "max_scores": record.max_scores,
+            "summary_statistics": record.summary_statistics,
+            "options": record.options,
+        }
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO simulations "
+                "(simulation_id, quiz_id, method, created_at, num_students, fingerprint, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (simulation_id, quiz_id, method, record.created_at, record.num_students, record.fingerprint,
+                 json.dumps(metadata)),
+            )
+        return record
+
+    @staticmethod
+    def _record(row) -> SimulationRecord:
+        simulation_id, quiz_id, method, created_at, num_students, fingerprint, metadata = row
+        metadata = json.loads(metadata)
+        return SimulationRecord(
+            simulation_id, quiz_id, method, created_at, num_students, metadata["item_ids"],
+            metadata["max_scores"], metadata["summary_statistics"], metadata["options"], fingerprint,
+        )
+
+    def load_simulation(self, simulation_id: str) -> Optional[SimulationRecord]:
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM simulations WHERE simulation_id = ?", (simulation_id,)
+            ).fetchone()
+        return self._record(row) if row is not None else None
+
+    def list_simulations(self, quiz_id: str) -> List[SimulationRecord]:
+        """Simulations of a quiz, oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM simulations WHERE quiz_id = ? ORDER BY created_at", (quiz_id,)
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def _load_matrix(self, record: SimulationRecord, kind: str, fingerprint: Optional[str]) -> DenseResponseMatrix:
+        codes_path, mask_path = self._matrix_paths(record.simulation_id, kind)
+        return DenseResponseMatrix(
+            np.load(codes_path, mmap_mode="r"), np.load(mask_path, mmap_mode="r"), record.item_ids, fingerprint
+        )
+
+    def load_responses(self, simulation_id: str) -> Optional[DenseResponseMatrix]:
+        """The scored responses of a simulation, memory-mapped, or None if it does not exist."""
+        record = self.load_simulation(simulation_id)
+        if record is None:
+            return None
+        return self._load_matrix(record, "responses", record.fingerprint)
+
+    def load_choices(self, simulation_id: str) -> Optional[DenseResponseMatrix]:
+        """Index of the option each student chose, for simulations that stored it."""
+        record = self.load_simulation(simulation_id)
+        if record is None or record.options is None:
+            return None
+        return self._load_matrix(record, "choices", None)
+
+    def delete_simulation(self, simulation_id: str) -> bool:
+        with self._lock:
+            deleted = self.conn.execute(
+                "DELETE FROM simulations WHERE simulation_id = ?", (simulation_id,)
+            ).rowcount
+        for kind in ("responses", "choices"):
+            for path in self._matrix_paths(simulation_id, kind):
+                path.unlink(missing_ok=True)
+        return bool(deleted)
+
+
+storage = Storage()
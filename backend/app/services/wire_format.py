@@ -0,0 +1,157 @@
+"""
+Columnar wire format for response matrices.
+
+A page of a simulation is sent as the item ids once plus one row of integer
+codes per student (-1 for an unanswered item), instead of one
+`StudentResponse` object with a dict of strings per student. The same page
+can be encoded as:
+
+- JSON (`application/json`): arrays of arrays, serialized straight from the
+  numpy arrays by orjson (or `ndarray.tolist()` and `json.dumps` without it),
+  without going through pydantic models;
+- MessagePack (`application/msgpack`): the same structure in binary, with
+  small codes taking one byte each;
+- Arrow IPC stream (`application/vnd.apache.arrow.stream`): one int8 column
+  per item with nulls for unanswered items, plus a `score` column. The rest
+  of the page travels as JSON in the schema metadata.
+
+orjson, MessagePack and Arrow are optional; MessagePack and Arrow are only
+offered when msgpack or pyarrow is installed. Gzip is left to the HTTP layer (GZipMiddleware in main.py).
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.response_matrix import ResponseMatrix
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional; Arrow is not offered without it
+    pa = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; MessagePack is not offered without it
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+MISSING_CODE = -1
+
+
+def available_media_types() -> List[str]:
+    media_types = [JSON]
+    if msgpack is not None:
+        media_types.append(MSGPACK)
+    if pa is not None:
+        media_types.append(ARROW)
+    return media_types
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the media type to send for an Accept header: the supported type
+    with the highest quality, JSON for a missing header or wildcard, and None
+    when nothing acceptable is supported.
+    """
+    if not accept:
+        return JSON
+    supported = available_media_types()
+    ranked: List[Tuple[float, int, str]] = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type in ("*/*", "application/*"):
+            media_type = JSON
+        elif media_type == "application/x-msgpack":
+            media_type = MSGPACK
+        if quality > 0 and media_type in supported:
+            ranked.append((-quality, position, media_type))
+    return min(ranked)[2] if ranked else None
+
+
+def read_rows(matrix: ResponseMatrix, offset: int, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(int8 codes, boolean answered) of students [offset, offset + limit)."""
+    page = matrix[offset:offset + limit]
+    blocks = list(page.code_blocks())
+    if not blocks:
+        num_items = matrix.shape[1]
+        return np.empty((0, num_items), dtype=np.int8), np.empty((0, num_items), dtype=bool)
+    return np.vstack([codes for codes, _ in blocks]), np.vstack([answered for _, answered in blocks])
+
+
+def _with_missing(codes: np.ndarray, answered: np.ndarray) -> np.ndarray:
+    return np.where(answered, codes, MISSING_CODE).astype(np.int8)
+
+
+def page_payload(
+    header: Dict[str, Any],
+    codes: np.ndarray,
+    answered: np.ndarray,
+    scores: np.ndarray,
+    choices: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Dict[str, Any]:
+    """The JSON/MessagePack structure of a page: `header` plus the row arrays, as numpy arrays."""
+    payload = dict(header)
+    payload["codes"] = _with_missing(codes, answered)
+    payload["scores"] = scores.astype(np.float64)
+    if choices is not None:
+        payload["choices"] = _with_missing(*choices)
+    return payload
+
+
+def _to_lists(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in payload.items()}
+
+
+def encode_page(
+    media_type: str,
+    header: Dict[str, Any],
+    codes: np.ndarray,
+    answered: np.ndarray,
+    scores: np.ndarray,
+    choices: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> bytes:
+    if media_type == ARROW:
+        return _encode_arrow(header, codes, answered, scores, choices)
+    payload = page_payload(header, codes, answered, scores, choices)
+    if media_type == MSGPACK:
+        return msgpack.packb(_to_lists(payload), use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_to_lists(payload), separators=(",", ":")).encode()
+
+
+def _encode_arrow(
+    header: Dict[str, Any],
+    codes: np.ndarray,
+    answered: np.ndarray,
+    scores: np.ndarray,
+    choices: Optional[Tuple[np.ndarray, np.ndarray]],
+) -> bytes:
+    columns = {"score": pa.array(scores.astype(np.float32))}
+    for j, item_id in enumerate(header["item_ids"]):
+        columns[item_id] = pa.array(codes[:, j], mask=~answered[:, j], type=pa.int8())
+    if choices is not None:
+        choice_codes, choice_answered = choices
+        for j, item_id in enumerate(header["item_ids"]):
+            columns[f"choice:{item_id}"] = pa.array(choice_codes[:, j], mask=~choice_answered[:, j], type=pa.int8())
+    table = pa.table(columns).replace_schema_metadata({"header": json.dumps(header)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The backend is not an installed package; import it the way main.py runs it
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+
+# Keep the stores and the analysis cache out of the working tree
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp(prefix="genmeasure-test-storage-"))
+os.environ.setdefault("ANALYSIS_CACHE_DIR", tempfile.mkdtemp(prefix="genmeasure-test-cache-"))
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from services import ctt
+from services.ctt import classical_statistics
+from services.response_matrix import DenseResponseMatrix
+
+
+@pytest.fixture
+def client():
+    import main
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("settings", [
+    {"num_replicates": 1},
+    {"num_replicates": 10001},
+    {"confidence_level": 0},
+    {"confidence_level": 1},
+    {"confidence_level": 1.5},
+])
+def test_bootstrap_settings_are_bounded(client, settings):
+    request = {"simulation_id": "missing", "analysis": "bootstrap", **settings}
+    response = client.post("/api/analysis/jobs", json=request)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][-1] in settings
+
+
+def test_refinement_revises_items_that_raise_alpha_only_slightly(client):
+    from services.storage import storage
+    rng = np.random.default_rng(0)
+    theta = rng.standard_normal(3000)
+    responses = (theta[:, None] + rng.standard_normal((3000, 8)) > 0).astype(int)
+    responses[:, 6] = rng.integers(0, 2, 3000)  # unrelated to the rest
+    responses[:, 7] = 0.35 * theta + rng.standard_normal(3000) > 0  # weakly related
+    data = DenseResponseMatrix.from_array(responses)
+    items, _ = classical_statistics(data)
+    gain = items.alpha_if_deleted - items.alpha
+    assert gain[6] >= ctt.MIN_ALPHA_GAIN and 0 < gain[7] < ctt.MIN_ALPHA_GAIN
+
+    storage.save_simulation("refine-sim", "quiz", "irt", data, [1] * 8, {})
+    response = client.post("/api/analysis/refine-items", json={"simulation_id": "refine-sim"})
+    assert response.status_code == 200
+    items = {item["item_id"]: item for item in response.json()["items"]}
+    assert items["item_7"]["action"] == "remove"
+    assert "alpha_increases_if_deleted" in items["item_7"]["reasons"]
+    assert items["item_8"]["action"] == "revise"
+    assert items["item_8"]["reasons"] == ["alpha_increases_slightly_if_deleted"]
+
+
+@pytest.mark.parametrize("path", ["/api/analysis/dimensionality?simulation_id=flat-sim&analysis_type=efa", None])
+def test_efa_of_a_single_varying_item_is_a_422(client, path):
+    from services.storage import storage
+    responses = np.ones((50, 4), dtype=int)
+    responses[:25, 0] = 0
+    storage.save_simulation("flat-sim", "quiz", "irt", DenseResponseMatrix.from_array(responses), [1] * 4, {})
+    if path is None:
+        response = client.post("/api/analysis/jobs", json={"simulation_id": "flat-sim", "analysis": "dimensionality"})
+    else:
+        response = client.post(path)
+    assert response.status_code == 422
+    assert "at least two items" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("settings, message", [
+    ({"model_type": "grm", "incremental": True}, "dichotomous models"),
+    ({"model_type": "2pl", "engine": "ltm", "incremental": True}, "native engine"),
+    ({"model_type": "3pl", "engine": "ltm"}, "native engine"),
+    ({"model_type": "gpcm", "engine": "ltm"}, "native engine"),
+])
+def test_unsupported_fit_options_are_a_422(client, settings, message):
+    response = client.post("/api/analysis/irt-fit", params={"simulation_id": "missing", **settings})
+    assert response.status_code == 422
+    assert message in response.json()["detail"]
+    request = {"simulation_id": "missing", "analysis": "irt-fit", **settings}
+    response = client.post("/api/analysis/jobs", json=request)
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("num_replicates", [1, 2])
+def test_partial_bootstrap_results_are_valid_json(num_replicates):
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from routers.analysis import AnalysisJobRequest, IRTModelFit, bootstrap_result
+    from services.irt_bootstrap import summarize_replicates
+
+    fit = IRTModelFit(
+        model_type="2pl",
+        item_parameters={"item_1": [1.0, 0.0], "item_2": [1.2, 0.5]},
+        model_fit_statistics={},
+        item_fit_statistics={}
+    )
+    tables = np.array([[[1.0, 0.0], [1.2, 0.5]], [[1.1, 0.1], [1.3, 0.4]]])[:num_replicates]
+    request = AnalysisJobRequest(simulation_id="sim", analysis="bootstrap")
+    result = bootstrap_result(fit, summarize_replicates(tables), request)
+    encoded = json.loads(json.dumps(jsonable_encoder(result), allow_nan=False))
+    if num_replicates == 1:
+        assert encoded["standard_errors"] == {"item_1": [None, None], "item_2": [None, None]}
+        assert encoded["confidence_intervals"]["item_1"] == [None, None]
+    else:
+        assert encoded["standard_errors"]["item_1"] == pytest.approx([0.0707, 0.0707], abs=1e-4)
+        assert all(lower <= upper for lower, upper in encoded["confidence_intervals"]["item_2"])
@@ -0,0 +1,75 @@
+import os
+
+from services.analysis_cache import AnalysisCache
+
+
+def test_key_depends_on_data_method_and_options():
+    key = AnalysisCache.make_key("abc", "irt", {"model_type": "2pl"})
+    assert key.startswith("abc-")
+    assert key == AnalysisCache.make_key("abc", "irt", {"model_type": "2pl"})
+    assert key != AnalysisCache.make_key("abd", "irt", {"model_type": "2pl"})
+    assert key != AnalysisCache.make_key("abc", "efa", {"model_type": "2pl"})
+    assert key != AnalysisCache.make_key("abc", "irt", {"model_type": "3pl"})
+
+
+def test_memory_lru_and_hit_counters():
+    cache = AnalysisCache(directory=None, memory_entries=2)
+    cache.put("a-1", 1)
+    cache.put("b-1", 2)
+    assert cache.get("a-1") == 1  # a is now the most recently used
+    cache.put("c-1", 3)
+    assert cache.get("b-1") is None
+    assert cache.get("a-1") == 1 and cache.get("c-1") == 3
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["memory_entries"]) == (3, 1, 2)
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    AnalysisCache(tmp_path).put("a-1", {"value": 1})
+    cache = AnalysisCache(tmp_path)
+    assert cache.get("a-1") == {"value": 1}
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("a-1") == {"value": 1}
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = AnalysisCache(tmp_path, disk_entries=3)
+    for i in range(5):
+        cache.put(f"f{i}-1", i)
+        os.utime(tmp_path / f"f{i}-1.pkl", (i, i))
+    assert sorted(path.stem for path in tmp_path.glob("*.pkl")) == ["f2-1", "f3-1", "f4-1"]
+
+
+def test_corrupt_file_is_a_miss(tmp_path):
+    (tmp_path / "a-1.pkl").write_bytes(b"not a pickle")
+    assert AnalysisCache(tmp_path).get("a-1") is None
+
+
+def test_invalidate_drops_every_entry_of_the_simulation(tmp_path):
+    cache = AnalysisCache(tmp_path)
+    cache.put(AnalysisCache.make_key("f1", "irt", {}), 1, simulation_id="sim")
+    cache.put(AnalysisCache.make_key("f1", "efa", {}), 2, simulation_id="sim")
+    kept = AnalysisCache.make_key("f2", "irt", {})
+    cache.put(kept, 3, simulation_id="other")
+    assert cache.invalidate("sim") == 2
+    assert cache.get(AnalysisCache.make_key("f1", "irt", {})) is None
+    assert cache.get(kept) == 3
+    assert cache.invalidate("sim") == 0
+
+
+def test_invalidate_after_a_restart(tmp_path):
+    key = AnalysisCache.make_key("f1", "irt", {})
+    AnalysisCache(tmp_path).put(key, 1, simulation_id="sim")
+    restarted = AnalysisCache(tmp_path)
+    assert restarted.invalidate("sim") == 1
+    assert AnalysisCache(tmp_path).get(key) is None
+
+
+def test_index_records_every_fingerprint_of_a_simulation(tmp_path):
+    AnalysisCache(tmp_path).put(AnalysisCache.make_key("f1", "irt", {}), 1, simulation_id="sim")
+    restarted = AnalysisCache(tmp_path)
+    restarted.put(AnalysisCache.make_key("f2", "irt", {}), 2, simulation_id="sim")
+    restarted.put(AnalysisCache.make_key("f2", "efa", {}), 3, simulation_id="sim")
+    assert AnalysisCache(tmp_path).invalidate("sim") == 3
+    assert not list(tmp_path.glob("*.pkl"))
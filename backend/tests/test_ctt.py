@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from services.ctt import MIN_ALPHA_GAIN, classical_statistics, item_flags
+from services.response_matrix import DenseResponseMatrix
+
+
+def cronbach_alpha(scores):
+    k = scores.shape[1]
+    return k / (k - 1) * (1 - scores.var(axis=0).sum() / scores.sum(axis=1).var())
+
+
+@pytest.fixture(scope="module")
+def scores():
+    rng = np.random.default_rng(0)
+    theta = rng.standard_normal(2000)
+    responses = (theta[:, None] + rng.standard_normal((2000, 8)) > rng.normal(0, 0.8, 8)).astype(float)
+    responses[:, 7] = rng.integers(0, 3, 2000)  # a partial-credit item scored 0-2
+    return responses
+
+
+@pytest.mark.parametrize("block_size", [None, 97])
+def test_item_statistics_match_direct_formulas(scores, block_size):
+    max_scores = [1] * 7 + [2]
+    items, distractors = classical_statistics(DenseResponseMatrix.from_array(scores), max_scores, block_size=block_size)
+    assert distractors is None
+    total = scores.sum(axis=1)
+    assert np.allclose(items.mean, scores.mean(axis=0))
+    assert np.allclose(items.p_value, scores.mean(axis=0) / max_scores)
+    for j in range(8):
+        rest = total - scores[:, j]
+        assert items.item_total[j] == pytest.approx(np.corrcoef(scores[:, j], total)[0, 1])
+        assert items.corrected_item_total[j] == pytest.approx(np.corrcoef(scores[:, j], rest)[0, 1])
+        assert items.alpha_if_deleted[j] == pytest.approx(cronbach_alpha(np.delete(scores, j, axis=1)))
+    assert items.alpha == pytest.approx(cronbach_alpha(scores))
+
+
+def test_missing_responses_use_pairwise_complete_students(scores):
+    values = scores[:, :4].copy()
+    values[np.random.default_rng(1).random(values.shape) < 0.2] = np.nan
+    items, _ = classical_statistics(DenseResponseMatrix.from_array(values))
+    answered = ~np.isnan(values)
+    assert np.array_equal(items.num_answered, answered.sum(axis=0))
+    assert np.allclose(items.mean, np.nanmean(values, axis=0))
+    assert np.isfinite(items.alpha) and 0 < items.alpha < 1
+
+
+def test_distractor_statistics():
+    # Option 0 is the key; high scorers pick it, option 3 is never chosen
+    rng = np.random.default_rng(2)
+    ability = rng.standard_normal(1000)
+    chosen = np.where(ability[:, None] + rng.standard_normal((1000, 3)) > 0, 0, rng.integers(1, 3, (1000, 3)))
+    scores = (chosen == 0).astype(float)
+    items, distractors = classical_statistics(
+        DenseResponseMatrix.from_array(scores), choices=DenseResponseMatrix.from_array(chosen), num_options=[4] * 3
+    )
+    assert distractors.key.tolist() == [0, 0, 0]
+    assert np.allclose(distractors.proportion.sum(axis=1), 1)
+    assert np.allclose(distractors.proportion[:, 0], scores.mean(axis=0))
+    assert np.all(distractors.point_biserial[:, 0] > 0.3) and np.all(distractors.point_biserial[:, 1:3] < 0)
+    assert np.all(distractors.point_biserial[:, 3] == 0) and np.all(np.isnan(distractors.mean_item_score[:, 3]))
+
+    flags = item_flags(items, distractors, [4] * 3)
+    assert all("nonfunctioning_distractor" in reasons for reasons in flags)
+    assert not any("distractor_attracts_high_scorers" in reasons for reasons in flags)
+
+
+def test_item_flags(scores):
+    values = scores[:, :6].copy()
+    rng = np.random.default_rng(3)
+    values[:, 0] = (values[:, 3] == 1) & (rng.random(2000) < 0.06)  # too difficult, barely related to the rest
+    values[:, 1] = 1 - values[:, 2]  # negatively discriminating
+    items, _ = classical_statistics(DenseResponseMatrix.from_array(values))
+    flags = item_flags(items)
+    assert 0 < items.corrected_item_total[0] < 0.2
+    assert "too_difficult" in flags[0] and "low_discrimination" in flags[0]
+    assert "negative_discrimination" in flags[1]
+    assert flags[3] == [] and flags[4] == []
+
+
+@pytest.mark.parametrize("gain,flag", [
+    (0.05, "alpha_increases_if_deleted"),
+    (MIN_ALPHA_GAIN, "alpha_increases_if_deleted"),
+    (0.004, "alpha_increases_slightly_if_deleted"),
+    (-0.02, None),
+])
+def test_alpha_gain_must_reach_the_minimum(scores, gain, flag):
+    items, _ = classical_statistics(DenseResponseMatrix.from_array(scores[:, :6]))
+    alpha_if_deleted = np.full(6, items.alpha - 0.05)
+    alpha_if_deleted[2] = items.alpha + gain
+    flags = item_flags(items._replace(alpha_if_deleted=alpha_if_deleted))
+    alpha_flags = [reason for reason in flags[2] if reason.startswith("alpha")]
+    assert alpha_flags == ([flag] if flag else [])
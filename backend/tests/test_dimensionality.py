@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from scipy.optimize import minimize_scalar
+from scipy.stats import multivariate_normal, norm
+
+from routers.analysis import perform_efa_analysis
+from services.dimensionality import (
+    MAX_CORRELATION, category_counts, informative_items, parallel_analysis, polychoric_correlation,
+)
+from services.response_matrix import DenseResponseMatrix
+
+
+def one_factor(num_students, num_items, loading=0.7, seed=0):
+    rng = np.random.default_rng(seed)
+    theta = rng.standard_normal(num_students)
+    noise = np.sqrt(1 - loading ** 2) * rng.standard_normal((num_students, num_items))
+    return (loading * theta[:, None] + noise > rng.standard_normal(num_items)).astype(float)
+
+
+def reference_tetrachoric(x, y):
+    """Maximum likelihood by bounded 1-D search, with scipy's bivariate normal CDF."""
+    n = np.array([[np.sum((x == a) & (y == b)) for b in (0, 1)] for a in (0, 1)])
+    h, k = norm.ppf((x == 0).mean()), norm.ppf((y == 0).mean())
+
+    def negative_log_likelihood(rho):
+        p00 = multivariate_normal([0, 0], [[1, rho], [rho, 1]]).cdf([h, k])
+        p = np.array([[p00, norm.cdf(h) - p00], [norm.cdf(k) - p00, 1 - norm.cdf(h) - norm.cdf(k) + p00]])
+        return -(n * np.log(np.maximum(p, 1e-300))).sum()
+
+    return minimize_scalar(negative_log_likelihood, bounds=(-0.99, 0.99), method="bounded",
+                           options={"xatol": 1e-8}).x
+
+
+@pytest.mark.parametrize("rho,thresholds", [(0.6, (0.3, -1.2)), (-0.4, (0.0, 0.5)), (0.75, (0.8, -0.6))])
+def test_tetrachoric_matches_reference(rho, thresholds):
+    rng = np.random.default_rng(1)
+    latent = rng.multivariate_normal([0, 0], [[1, rho], [rho, 1]], size=20000)
+    x, y = (latent > thresholds).astype(float).T
+    estimate = polychoric_correlation(np.column_stack([x, y])).correlation[0, 1]
+    assert estimate == pytest.approx(reference_tetrachoric(x, y), abs=1e-4)
+    assert estimate == pytest.approx(rho, abs=0.05)
+
+
+def test_empty_cell_does_not_push_the_estimate_to_the_bound():
+    rng = np.random.default_rng(1)
+    latent = rng.multivariate_normal([0, 0], [[1, 0.8], [0.8, 1]], size=20000)
+    responses = (latent > (1.2, -1.0)).astype(float)
+    assert np.sum((responses[:, 0] == 1) & (responses[:, 1] == 0)) == 0
+    estimate = polychoric_correlation(responses).correlation[0, 1]
+    assert estimate == pytest.approx(0.8, abs=0.1)
+
+
+def test_lopsided_pairs_stay_inside_the_bounds():
+    # Items answered correctly by 99% of the students have a flat, skewed likelihood
+    responses = one_factor(5000, 20, seed=2)
+    responses[:, :5] = one_factor(5000, 5, seed=3) + (np.random.default_rng(4).random((5000, 5)) < 0.98)
+    responses = np.minimum(responses, 1)
+    correlation = polychoric_correlation(responses).correlation
+    off_diagonal = correlation[~np.eye(20, dtype=bool)]
+    assert np.abs(off_diagonal).max() < MAX_CORRELATION - 0.05
+
+
+def test_missing_responses_use_pairwise_complete_students():
+    responses = one_factor(3000, 6, seed=5)
+    responses[np.random.default_rng(6).random(responses.shape) < 0.3] = np.nan
+    polychoric = polychoric_correlation(responses)
+    answered = ~np.isnan(responses)
+    assert polychoric.num_observations[0, 1] == np.sum(answered[:, 0] & answered[:, 1])
+    assert np.allclose(polychoric.correlation, polychoric.correlation.T)
+    # True tetrachoric correlation is 0.7^2
+    off_diagonal = polychoric.correlation[~np.eye(6, dtype=bool)]
+    assert np.abs(off_diagonal - 0.49).max() < 0.1
+
+
+def test_informative_items_drop_near_constant_items():
+    counts = np.array([[500, 500], [995, 5], [1000, 0], [300, 700]])
+    assert informative_items(counts).tolist() == [0, 3]
+
+
+def test_one_factor_with_extreme_items_is_unidimensional():
+    # Thresholds from N(0, 1) put some items near p = 0 or 1
+    result = perform_efa_analysis(DenseResponseMatrix.from_array(one_factor(5000, 100, seed=1)))
+    assert result.is_unidimensional
+    assert result.fit_statistics["num_factors"] == 1
+    assert len(result.factor_loadings) == 100
+
+
+def test_two_factors_are_detected():
+    rng = np.random.default_rng(7)
+    traits = rng.standard_normal((4000, 2))
+    factor = np.repeat([0, 1], 20)
+    responses = 0.7 * traits[:, factor] + np.sqrt(0.51) * rng.standard_normal((4000, 40)) > rng.standard_normal(40)
+    polychoric = polychoric_correlation(responses.astype(float))
+    result = parallel_analysis(polychoric.correlation, 4000, num_replicates=100, seed=0,
+                               standard_error=polychoric.standard_error)
+    assert result.num_factors == 2
+
+
+def test_category_counts_match_the_polychoric_ones():
+    responses = one_factor(500, 6, seed=8)
+    responses[np.random.default_rng(9).random(responses.shape) < 0.2] = np.nan
+    assert np.array_equal(category_counts(responses), polychoric_correlation(responses).category_counts)
+    data = DenseResponseMatrix.from_array(responses)
+    assert np.array_equal(category_counts(data), category_counts(responses))
+
+
+def test_small_sample_of_easy_items_falls_back_to_all_varying_items():
+    # 40 students and p ~ 0.97: no item has 10 students in both categories
+    responses = (np.random.default_rng(0).random((40, 5)) < 0.97).astype(float)
+    assert len(informative_items(category_counts(responses))) == 0
+    result = perform_efa_analysis(DenseResponseMatrix.from_array(responses))
+    assert len(result.factor_loadings) == 5
+    assert result.fit_statistics["num_factors"] >= 1
+    assert np.isfinite(result.fit_statistics["eigenvalue_ratio"])
+
+
+def test_fewer_than_two_varying_items_is_rejected():
+    responses = np.ones((50, 4))
+    responses[:25, 0] = 0
+    with pytest.raises(ValueError, match="at least two items"):
+        perform_efa_analysis(DenseResponseMatrix.from_array(responses))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_small_one_factor_sample_keeps_one_factor(seed):
+    result = perform_efa_analysis(DenseResponseMatrix.from_array(one_factor(30, 10, seed=seed)))
+    assert result.fit_statistics["num_factors"] == 1
+    assert result.is_unidimensional
+
+
+def test_parallel_analysis_keeps_at_least_one_factor():
+    noise = np.random.default_rng(10).standard_normal((30, 10))
+    result = parallel_analysis(np.corrcoef(noise, rowvar=False), 30, num_replicates=100, seed=0)
+    assert result.eigenvalues[0] <= result.simulated_percentile[0]
+    assert result.num_factors == 1
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from services.irt_bootstrap import _simulate_like, batches, replicate_seeds, run_replicates, summarize_replicates
+from services.irt_estimation import fit_irt
+from services.irt_simulation import draw_item_parameters, simulate_responses
+from services.response_matrix import DenseResponseMatrix
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    params = draw_item_parameters(6, "2pl", seed=1)
+    _, responses = simulate_responses(1500, params, seed=2)
+    return params, responses, fit_irt(responses, "2pl")
+
+
+@pytest.fixture(scope="module")
+def sampling_sd(fitted):
+    """Spread of the difficulty estimates over fresh samples from the same model."""
+    params = fitted[0]
+    difficulties = [fit_irt(simulate_responses(1500, params, seed=100 + i)[1], "2pl").params.b for i in range(20)]
+    return np.std(difficulties, axis=0, ddof=1)
+
+
+def test_replicates_are_reproducible(fitted):
+    _, responses, estimate = fitted
+    seeds = replicate_seeds(3, seed=7)
+    first = run_replicates(responses, "2pl", estimate.params, seeds)
+    assert first.shape == (3, 6, 2)
+    assert np.array_equal(first, run_replicates(responses, "2pl", estimate.params, replicate_seeds(3, seed=7)))
+
+
+@pytest.mark.parametrize("method", ["nonparametric", "parametric"])
+def test_standard_errors_match_sampling_variability(fitted, sampling_sd, method):
+    _, responses, estimate = fitted
+    summary = summarize_replicates(run_replicates(responses, "2pl", estimate.params, replicate_seeds(40, 0), method))
+    ratio = summary.standard_error[:, 1] / sampling_sd
+    assert 0.7 < np.median(ratio) < 1.4
+    assert np.all((summary.lower <= summary.upper))
+
+
+def test_parametric_replicates_keep_the_missing_pattern(fitted):
+    _, responses, estimate = fitted
+    values = responses.astype(float)
+    values[np.random.default_rng(3).random(values.shape) < 0.3] = np.nan
+    data = DenseResponseMatrix.from_array(values)
+    replicate = _simulate_like(data, estimate.params, np.random.default_rng(4))
+    assert np.array_equal(np.isnan(replicate.to_array()), np.isnan(values))
+
+
+def test_summary_of_a_single_replicate_has_no_standard_error():
+    summary = summarize_replicates(np.ones((1, 3, 2)))
+    assert summary.num_replicates == 1
+    assert np.all(np.isnan(summary.standard_error))
+
+
+def test_batches_cover_every_seed():
+    parts = batches(list(range(10)), 4)
+    assert sum(parts, []) == list(range(10))
+    assert len(parts) == 4
+
+
+def test_unknown_method_is_rejected(fitted):
+    _, responses, estimate = fitted
+    with pytest.raises(ValueError):
+        run_replicates(responses, "2pl", estimate.params, replicate_seeds(1), method="jackknife")
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from services import irt_calibration
+from services.irt_calibration import calibrate, calibrate_with_item_fit, invalidate, load_state
+from services.irt_estimation import add_item_fit_tables, fit_irt, item_fit, item_fit_tables
+from services.irt_simulation import draw_item_parameters, simulate_responses
+from services.response_matrix import DenseResponseMatrix
+
+
+@pytest.fixture
+def responses():
+    params = draw_item_parameters(8, "2pl", seed=1)
+    return DenseResponseMatrix.from_array(simulate_responses(6000, params, seed=2)[1])
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    """Record which estimation path each calibrate() call takes."""
+    calls = []
+    for name in ("fit_irt", "update_irt"):
+        original = getattr(irt_calibration, name)
+
+        def traced(*args, _name=name, _original=original, **kwargs):
+            calls.append((_name, "init" in kwargs and kwargs["init"] is not None))
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(irt_calibration, name, traced)
+    return calls
+
+
+def test_appended_rows_update_the_previous_fit(tmp_path, responses, fits):
+    first = calibrate("sim", responses[:3000], "2pl", directory=tmp_path)
+    updated = calibrate("sim", responses[:4000], "2pl", directory=tmp_path)
+    assert fits == [("fit_irt", False), ("update_irt", False)]
+    assert first.num_students == 3000 and updated.num_students == 4000
+    assert load_state("sim", "2pl", tmp_path).num_rows == 4000
+
+
+def test_unchanged_matrix_returns_the_stored_fit(tmp_path, responses, fits):
+    first = calibrate("sim", responses[:3000], "2pl", directory=tmp_path)
+    again = calibrate("sim", responses[:3000], "2pl", directory=tmp_path)
+    assert len(fits) == 1
+    assert np.array_equal(again.params.b, first.params.b)
+
+
+def test_growth_past_the_refresh_ratio_refits_warm(tmp_path, responses, fits):
+    calibrate("sim", responses[:2000], "2pl", directory=tmp_path)
+    calibrate("sim", responses[:5000], "2pl", directory=tmp_path)
+    assert fits == [("fit_irt", False), ("fit_irt", True)]
+    assert load_state("sim", "2pl", tmp_path).rows_at_refresh == 5000
+
+
+def test_changed_rows_force_a_cold_fit(tmp_path, responses, fits):
+    calibrate("sim", responses[:3000], "2pl", directory=tmp_path)
+    calibrate("sim", responses[1000:4000], "2pl", directory=tmp_path)  # same size, different rows
+    calibrate("sim", responses[:2000], "2pl", directory=tmp_path)  # fewer rows
+    assert fits == [("fit_irt", False)] * 3
+
+
+def test_states_are_kept_per_model_and_invalidated_per_simulation(tmp_path, responses):
+    calibrate("sim", responses[:1000], "2pl", directory=tmp_path)
+    calibrate("sim", responses[:1000], "rasch", directory=tmp_path)
+    calibrate("other", responses[:1000], "2pl", directory=tmp_path)
+    assert invalidate("sim", directory=tmp_path) == 2
+    assert load_state("sim", "2pl", tmp_path) is None
+    assert load_state("other", "2pl", tmp_path) is not None
+
+
+def test_corrupt_state_is_ignored(tmp_path, responses):
+    calibrate("sim", responses[:1000], "2pl", directory=tmp_path)
+    path = next(tmp_path.glob("*-2pl.pkl"))
+    path.write_bytes(b"")
+    assert load_state("sim", "2pl", tmp_path) is None
+    assert calibrate("sim", responses[:1000], "2pl", directory=tmp_path).num_students == 1000
+
+
+def test_item_fit_tables_of_disjoint_rows_add_up(responses):
+    estimate = fit_irt(responses, "2pl")
+    full = item_fit_tables(responses, estimate.params)
+    head = item_fit_tables(responses[:2500], estimate.params, edges=full.edges)
+    tail = item_fit_tables(responses[2500:], estimate.params, edges=full.edges)
+    combined = add_item_fit_tables(head, tail)
+    for name in ("observed", "expected", "counts"):
+        assert np.allclose(getattr(combined, name), getattr(full, name))
+
+
+def test_item_fit_is_updated_with_the_appended_rows_only(tmp_path, responses, monkeypatch):
+    rows = []
+    original = irt_calibration.item_fit_tables
+
+    def traced(data, *args, **kwargs):
+        rows.append(len(data))
+        return original(data, *args, **kwargs)
+
+    monkeypatch.setattr(irt_calibration, "item_fit_tables", traced)
+    estimate, (chi_square, df, _) = calibrate_with_item_fit("sim", responses[:3000], "2pl", directory=tmp_path)
+    assert np.allclose(chi_square, item_fit(responses[:3000], estimate)[0])
+
+    estimate, (chi_square, df, _) = calibrate_with_item_fit("sim", responses[:4000], "2pl", directory=tmp_path)
+    assert rows == [3000, 1000]
+    full_chi_square, full_df, _ = item_fit(responses[:4000], estimate)
+    # The old rows keep the groups and parameters of the first fit; the statistic barely moves
+    assert np.all(np.abs(df - full_df) <= 1)
+    assert np.all(np.abs(chi_square - full_chi_square) < 0.25 * full_chi_square + 3)
+
+    again = calibrate_with_item_fit("sim", responses[:4000], "2pl", directory=tmp_path)
+    assert rows == [3000, 1000]
+    assert np.array_equal(again[1][0], chi_square)
+
+
+def test_item_fit_is_added_to_a_state_without_it(tmp_path, responses):
+    calibrate("sim", responses[:3000], "2pl", directory=tmp_path)
+    assert load_state("sim", "2pl", tmp_path).item_fit is None
+    estimate, (chi_square, _, _) = calibrate_with_item_fit("sim", responses[:3000], "2pl", directory=tmp_path)
+    assert np.allclose(chi_square, item_fit(responses[:3000], estimate)[0])
+    assert load_state("sim", "2pl", tmp_path).item_fit is not None
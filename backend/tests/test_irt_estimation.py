@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from services.irt_estimation import fit_irt, item_fit, update_irt
+from services.irt_models import parameters_from_lists, parameters_to_lists
+from services.irt_simulation import draw_item_parameters, simulate_responses
+from services.response_matrix import DenseResponseMatrix, SparseResponseMatrix
+
+
+def rasch_responses(num_students, difficulties, ability_sd, seed=0):
+    rng = np.random.default_rng(seed)
+    theta = rng.normal(0, ability_sd, num_students)
+    p = 1 / (1 + np.exp(-(theta[:, None] - difficulties)))
+    return (rng.random(p.shape) < p).astype(float)
+
+
+@pytest.mark.parametrize("ability_sd", [0.6, 1.0, 1.6])
+def test_rasch_estimates_shared_discrimination(ability_sd):
+    difficulties = np.linspace(-1.5, 1.5, 15)
+    estimate = fit_irt(rasch_responses(5000, difficulties, ability_sd), "rasch")
+    a = estimate.params.a
+    assert np.all(a == a[0])
+    # On the N(0, 1) ability scale the discrimination is the ability SD
+    assert a[0] == pytest.approx(ability_sd, rel=0.1)
+    assert np.abs(a[0] * estimate.params.b - difficulties).max() < 0.15
+    assert estimate.num_params == 16
+
+
+def test_rasch_parameter_lists_round_trip():
+    estimate = fit_irt(rasch_responses(1000, np.zeros(4), 1.3), "rasch")
+    lists = parameters_to_lists(estimate.params, "rasch", ["q1", "q2", "q3", "q4"])
+    assert [len(values) for values in lists.values()] == [2] * 4
+    # [discrimination, difficulty], the same order as 2PL
+    assert lists["q2"] == [estimate.params.a[1], estimate.params.b[1]]
+    params = parameters_from_lists(lists, "rasch")
+    assert np.allclose(params.a, estimate.params.a) and np.allclose(params.b, estimate.params.b)
+    # Difficulties alone mean a discrimination of 1
+    assert np.all(parameters_from_lists({"q1": [0.5]}, "rasch").a == 1)
+
+
+def test_2pl_recovers_parameters():
+    params = draw_item_parameters(15, "2pl", seed=1)
+    _, responses = simulate_responses(8000, params, seed=2)
+    estimate = fit_irt(responses, "2pl")
+    assert estimate.converged
+    assert np.abs(estimate.params.a - params.a).max() < 0.2
+    assert np.abs(estimate.params.b - params.b).max() < 0.2
+
+
+def test_3pl_keeps_guessing_inside_bounds():
+    params = draw_item_parameters(15, "3pl", seed=3)
+    _, responses = simulate_responses(5000, params, seed=4)
+    estimate = fit_irt(responses, "3pl")
+    assert np.all((estimate.params.c >= 0) & (estimate.params.c <= 0.5))
+    assert np.corrcoef(estimate.params.b, params.b)[0, 1] > 0.95
+
+
+def test_missing_responses_are_skipped_not_imputed():
+    params = draw_item_parameters(12, "2pl", seed=5)
+    _, responses = simulate_responses(8000, params, seed=6)
+    complete = fit_irt(responses, "2pl")
+    sparse = responses.astype(float)
+    sparse[np.random.default_rng(7).random(sparse.shape) < 0.4] = np.nan
+    estimate = fit_irt(DenseResponseMatrix.from_array(sparse), "2pl")
+    assert estimate.num_students == 8000
+    assert estimate.statistics.answered.sum() == pytest.approx(np.sum(~np.isnan(sparse)))
+    # Missing at random: the same parameters, with more noise
+    assert np.abs(estimate.params.b - complete.params.b).max() < 0.25
+    # Imputing 0 instead would make every item look harder
+    assert abs(np.mean(estimate.params.b - complete.params.b)) < 0.05
+
+
+def test_dense_sparse_and_array_inputs_agree():
+    params = draw_item_parameters(8, "2pl", seed=8)
+    _, responses = simulate_responses(1000, params, seed=9)
+    dense = DenseResponseMatrix.from_array(responses)
+    fits = [fit_irt(data, "2pl") for data in (responses, dense, SparseResponseMatrix.from_dense(dense))]
+    for estimate in fits[1:]:
+        assert np.allclose(estimate.params.b, fits[0].params.b)
+        assert estimate.log_likelihood == pytest.approx(fits[0].log_likelihood)
+
+
+def test_update_irt_matches_a_full_fit():
+    params = draw_item_parameters(10, "2pl", seed=10)
+    _, responses = simulate_responses(6000, params, seed=11)
+    first = fit_irt(responses[:4000], "2pl")
+    updated = update_irt(first, responses[4000:])
+    full = fit_irt(responses, "2pl")
+    assert updated.num_students == 6000
+    assert np.abs(updated.params.b - full.params.b).max() < 0.05
+    assert np.abs(updated.params.a - full.params.a).max() < 0.05
+
+
+def test_progress_reports_every_iteration():
+    params = draw_item_parameters(5, "2pl", seed=12)
+    _, responses = simulate_responses(500, params, seed=13)
+    calls = []
+    estimate = fit_irt(responses, "2pl", progress=lambda iteration, log_likelihood: calls.append(iteration))
+    assert calls == list(range(1, estimate.n_iter + 1))
+
+
+def test_item_fit_flags_a_misfitting_item():
+    params = draw_item_parameters(10, "2pl", seed=14)
+    theta, responses = simulate_responses(5000, params, seed=15)
+    # Item 0 is answered correctly at both ends of the ability scale, which no 2PL curve fits
+    responses[:, 0] = np.abs(theta) > 0.8
+    estimate = fit_irt(responses, "2pl")
+    chi_square, df, p_value = item_fit(responses, estimate)
+    assert chi_square.shape == df.shape == p_value.shape == (10,)
+    assert p_value[0] < 1e-6
+    assert np.median(p_value[1:]) > 0.01
+
+
+def test_unknown_model_type_is_rejected():
+    with pytest.raises(ValueError):
+        fit_irt(np.zeros((5, 2)), "4pl")
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from services.irt_information import information_curves, item_information, marginal_reliability
+from services.irt_models import ItemParameters, PolytomousParameters
+
+THETA = np.array([-2.0, -0.5, 0.0, 0.5, 1.7])
+
+
+def logistic(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def test_2pl_information_is_a_squared_p_q():
+    a, b = np.array([1.5, 0.8]), np.array([0.5, -1.0])
+    information = item_information(THETA, ItemParameters(a, b, np.zeros(2)))
+    p = logistic(a[:, None] * (THETA[None, :] - b[:, None]))
+    assert information.shape == (2, len(THETA))
+    assert np.allclose(information, a[:, None] ** 2 * p * (1 - p))
+    # At theta = b, P = 1/2 and the information peaks at a^2 / 4
+    assert item_information(np.array([0.5]), ItemParameters(a[:1], b[:1], np.zeros(1)))[0, 0] == pytest.approx(0.5625)
+
+
+def test_3pl_information_matches_birnbaum():
+    a, b, c = np.array([1.2]), np.array([0.3]), np.array([0.2])
+    information = item_information(THETA, ItemParameters(a, b, c))[0]
+    p = c + (1 - c) * logistic(a * (THETA - b))
+    expected = a ** 2 * (p - c) ** 2 * (1 - p) / ((1 - c) ** 2 * p)
+    assert np.allclose(information, expected)
+    # Guessing only ever removes information
+    assert np.all(information < item_information(THETA, ItemParameters(a, b, np.zeros(1)))[0])
+
+
+def test_two_category_grm_is_2pl():
+    params = PolytomousParameters("grm", np.array([1.3]), np.array([[0.4]]), np.array([2]))
+    expected = item_information(THETA, ItemParameters(np.array([1.3]), np.array([0.4]), np.zeros(1)))
+    assert np.allclose(item_information(THETA, params), expected)
+
+
+def test_grm_information_matches_numerical_derivatives():
+    a, thresholds = 1.4, np.array([-1.0, 0.2, 1.1])
+
+    def probabilities(theta):
+        at_least = np.concatenate([[1.0], logistic(a * (theta - thresholds)), [0.0]])
+        return at_least[:-1] - at_least[1:]
+
+    h = 1e-5
+    expected = [
+        np.sum(((probabilities(t + h) - probabilities(t - h)) / (2 * h)) ** 2 / probabilities(t)) for t in THETA
+    ]
+    params = PolytomousParameters("grm", np.array([a]), thresholds[None, :], np.array([4]))
+    assert np.allclose(item_information(THETA, params)[0], expected, rtol=1e-6)
+
+
+def test_gpcm_information_is_a_squared_variance():
+    a, steps = 1.2, np.array([-0.5, 0.8])
+    numerators = np.exp(np.stack([
+        np.zeros_like(THETA), a * (THETA - steps[0]), a * (2 * THETA - steps[0] - steps[1])
+    ]))
+    p = numerators / numerators.sum(axis=0)
+    k = np.arange(3)[:, None]
+    variance = (p * k ** 2).sum(axis=0) - (p * k).sum(axis=0) ** 2
+    params = PolytomousParameters("gpcm", np.array([a]), steps[None, :], np.array([3]))
+    assert np.allclose(item_information(THETA, params)[0], a ** 2 * variance)
+
+
+def test_unused_categories_add_no_information():
+    # The second item uses 2 of 4 categories; its unused thresholds are ignored
+    thresholds = np.array([[-1.0, 0.0, 1.0], [0.4, 9.0, 9.0]])
+    params = PolytomousParameters("gpcm", np.array([1.0, 1.3]), thresholds, np.array([4, 2]))
+    expected = item_information(THETA, ItemParameters(np.array([1.3]), np.array([0.4]), np.zeros(1)))
+    assert np.allclose(item_information(THETA, params)[1], expected[0])
+
+
+def test_curves_sum_items_and_give_the_standard_error():
+    params = ItemParameters(np.array([1.0, 1.5, 0.7]), np.array([-1.0, 0.0, 1.0]), np.zeros(3))
+    curves = information_curves(THETA, params)
+    assert np.allclose(curves.test_information, curves.item_information.sum(axis=0))
+    assert np.allclose(curves.sem, 1 / np.sqrt(curves.test_information))
+
+
+def test_marginal_reliability_integrates_over_the_ability_distribution():
+    params = ItemParameters(np.full(10, 1.2), np.linspace(-2, 2, 10), np.zeros(10))
+    theta = np.linspace(-10, 10, 20001)
+    density = np.exp(-theta ** 2 / 2) / np.sqrt(2 * np.pi)
+    error_variance = np.trapz(density / item_information(theta, params).sum(axis=0), theta)
+    assert marginal_reliability(params) == pytest.approx(1 / (1 + error_variance), rel=1e-3)
+
+    longer = ItemParameters(np.tile(params.a, 2), np.tile(params.b, 2), np.zeros(20))
+    assert marginal_reliability(params) < marginal_reliability(longer) < 1
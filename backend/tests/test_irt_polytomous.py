@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from services.irt_polytomous import fit_polytomous, polytomous_item_fit
+from services.irt_simulation import draw_polytomous_parameters, simulate_responses
+from services.response_matrix import DenseResponseMatrix
+
+
+@pytest.mark.parametrize("model_type", ["grm", "gpcm"])
+def test_recovers_parameters(model_type):
+    params = draw_polytomous_parameters(10, model_type, num_categories=4, seed=1)
+    _, responses = simulate_responses(6000, params, seed=2)
+    estimate = fit_polytomous(responses, model_type)
+    assert estimate.converged
+    assert np.abs(estimate.params.a - params.a).max() < 0.25
+    assert np.abs(estimate.params.thresholds - params.thresholds).max() < 0.35
+    assert estimate.num_params == 40
+
+
+def test_items_with_fewer_categories():
+    params = draw_polytomous_parameters(8, "grm", num_categories=4, seed=3)
+    _, responses = simulate_responses(4000, params, seed=4)
+    responses = responses.astype(float)
+    responses[:, :3] = np.minimum(responses[:, :3], 1)  # dichotomized items
+    estimate = fit_polytomous(responses, "grm")
+    assert estimate.params.num_categories.tolist() == [2, 2, 2, 4, 4, 4, 4, 4]
+    assert estimate.num_params == 3 * 2 + 5 * 4
+    assert np.abs(estimate.params.thresholds[3:] - params.thresholds[3:]).max() < 0.4
+
+
+def test_missing_responses_are_skipped():
+    params = draw_polytomous_parameters(8, "gpcm", num_categories=3, seed=5)
+    _, responses = simulate_responses(6000, params, seed=6)
+    complete = fit_polytomous(responses, "gpcm")
+    sparse = responses.astype(float)
+    sparse[np.random.default_rng(7).random(sparse.shape) < 0.4] = np.nan
+    estimate = fit_polytomous(DenseResponseMatrix.from_array(sparse), "gpcm")
+    assert estimate.statistics.counts.sum() == pytest.approx(np.sum(~np.isnan(sparse)))
+    assert abs(np.mean(estimate.params.thresholds - complete.params.thresholds)) < 0.05
+
+
+def test_item_fit_shapes():
+    params = draw_polytomous_parameters(6, "grm", num_categories=3, seed=8)
+    _, responses = simulate_responses(2000, params, seed=9)
+    estimate = fit_polytomous(responses, "grm")
+    chi_square, df, p_value = polytomous_item_fit(responses, estimate)
+    assert chi_square.shape == df.shape == p_value.shape == (6,)
+    assert np.all((p_value >= 0) & (p_value <= 1))
+
+
+def test_unknown_model_type_is_rejected():
+    with pytest.raises(ValueError):
+        fit_polytomous(np.zeros((5, 2)), "2pl")
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from services.jobs import JobManager, JobStatus
+
+
+def square(x, progress=None):
+    if progress is not None:
+        for iteration in range(1, 4):
+            progress(iteration, -float(iteration))
+        time.sleep(0.2)  # progress is forwarded asynchronously; let it arrive before the result
+    return x * x
+
+
+def crash_worker():
+    os._exit(1)
+
+
+def run(coroutine_fn):
+    return asyncio.run(coroutine_fn())
+
+
+def test_task_completes_and_stores_the_result():
+    results = []
+
+    async def main():
+        manager = JobManager()
+
+        async def work(job):
+            job.update({"done": 1.0}, result="partial")
+            await asyncio.sleep(0)
+            return "full"
+
+        job = manager.submit_task("key", "kind", "sim", work, on_result=results.append)
+        assert job.status == JobStatus.PENDING
+        assert await job.wait() == "full"
+        assert job.status == JobStatus.COMPLETED and job.finished_at is not None
+        assert manager.get(job.id) is job
+
+    run(main)
+    assert results == ["full"]
+
+
+def test_same_key_reuses_the_job():
+    async def main():
+        manager = JobManager()
+        calls = []
+
+        async def work(job):
+            calls.append(job.id)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        first = manager.submit_task("key", "kind", "sim", work)
+        assert manager.submit_task("key", "kind", "sim", work) is first  # while running
+        await first.wait()
+        assert manager.submit_task("key", "kind", "sim", work) is first  # once completed
+        assert manager.submit_task("other", "kind", "sim", work) is not first
+        await asyncio.sleep(0.05)
+        assert len(calls) == 2
+
+    run(main)
+
+
+def test_failed_job_reports_the_error_and_can_be_resubmitted():
+    async def main():
+        manager = JobManager()
+
+        async def fail(job):
+            raise ValueError("bad input")
+
+        job = manager.submit_task("key", "kind", "sim", fail)
+        with pytest.raises(RuntimeError, match="bad input"):
+            await job.wait()
+        assert job.status == JobStatus.FAILED and job.error == "bad input"
+        assert manager.find("key") is None
+
+        async def succeed(job):
+            return 1
+
+        retry = manager.submit_task("key", "kind", "sim", succeed)
+        assert retry is not job and await retry.wait() == 1
+
+    run(main)
+
+
+def test_events_stream_until_the_job_finishes():
+    async def main():
+        manager = JobManager()
+        release = asyncio.Event()
+
+        async def work(job):
+            await release.wait()
+            job.update({"iteration": 1})
+            return "done"
+
+        job = manager.submit_task("key", "kind", "sim", work)
+        events = []
+
+        async def listen():
+            async for event in job.events():
+                events.append((event["event"], event["status"]))
+
+        listener = asyncio.create_task(listen())
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.wait_for(listener, 1)
+        return events
+
+    events = run(main)
+    assert events[-2:] == [("progress", "running"), ("completed", "completed")]
+
+
+def test_completed_and_invalidate():
+    async def main():
+        manager = JobManager()
+        cached = manager.completed("key", "kind", "sim", {"cached": True})
+        assert manager.find("key") is cached and await cached.wait() == {"cached": True}
+        manager.completed("other", "kind", "other-sim", 1)
+        manager.invalidate("sim")
+        assert manager.find("key") is None and manager.get(cached.id) is None
+        assert manager.find("other") is not None
+
+    run(main)
+
+
+def test_process_pool_runs_jobs_and_forwards_progress():
+    async def main():
+        manager = JobManager(max_workers=1)
+        try:
+            job = manager.submit("key", "kind", "sim", square, 7, reports_progress=True)
+            events = [event async for event in job.events()]
+            assert await asyncio.wait_for(job.wait(), 60) == 49
+            assert [event["progress"]["iteration"] for event in events if event["event"] == "progress"] == [1, 2, 3]
+
+            results = [result async for result in manager.map(square, [(1,), (2,), (3,)])]
+            assert sorted(results) == [1, 4, 9]
+        finally:
+            manager.shutdown()
+
+    run(main)
+
+
+def test_crashed_worker_fails_the_job_and_the_pool_recovers():
+    async def main():
+        manager = JobManager(max_workers=1)
+        try:
+            crashed = manager.submit("crash", "kind", "sim", crash_worker)
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(crashed.wait(), 60)
+            assert crashed.status == JobStatus.FAILED
+            assert await asyncio.wait_for(manager.submit("ok", "kind", "sim", square, 3).wait(), 60) == 9
+        finally:
+            manager.shutdown()
+
+    run(main)
+
+
+def test_failing_on_result_does_not_hang_the_job(caplog):
+    async def main():
+        manager = JobManager()
+
+        async def work(job):
+            return 1
+
+        def store(result):
+            raise OSError("disk full")
+
+        job = manager.submit_task("key", "kind", "sim", work, on_result=store)
+        assert await asyncio.wait_for(job.wait(), 1) == 1
+        assert job.status == JobStatus.COMPLETED
+
+    run(main)
+    assert "disk full" in caplog.text
+
+
+def test_cancelled_job_is_marked_failed():
+    async def main():
+        manager = JobManager()
+
+        async def work(job):
+            await asyncio.sleep(10)
+
+        job = manager.submit_task("key", "kind", "sim", work)
+        await asyncio.sleep(0)
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await asyncio.wait_for(job.wait(), 1)
+        assert manager.find("key") is None
+
+    run(main)
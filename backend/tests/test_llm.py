@@ -0,0 +1,97 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import httpx
+import openai
+import pytest
+
+from services import llm as llm_module
+from services.llm import LLMClient, RetriesExhausted
+
+
+def completion(content, prompt_tokens=20, completion_tokens=5):
+    return Mock(
+        choices=[Mock(message=Mock(content=content))],
+        usage=Mock(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+def api_request():
+    return httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_module, "backoff_delay", lambda attempt: 0)
+
+
+def fake_client(create, **settings):
+    client = LLMClient(model="fake-model", **settings)
+    client._client = Mock()
+    client._client.chat.completions.create = create
+    return client
+
+
+def test_reply_is_parsed_and_usage_recorded():
+    create = AsyncMock(return_value=completion('{"answer": 4}'))
+    client = fake_client(create)
+    assert asyncio.run(client.complete_json([], lambda reply: reply["answer"])) == 4
+    assert create.call_args.kwargs["response_format"] == {"type": "json_object"}
+    assert client.usage == {"requests": 1, "prompt_tokens": 20, "completion_tokens": 5}
+
+
+def test_invalid_replies_and_transient_errors_are_retried():
+    def parse(reply):
+        if reply["answer"] < 0:
+            raise ValueError("negative")
+        return reply["answer"]
+
+    create = AsyncMock(side_effect=[
+        openai.APIConnectionError(request=api_request()),
+        completion("not json"),
+        completion('{"answer": -1}'),
+        completion('{"answer": 2}'),
+    ])
+    client = fake_client(create, max_retries=3)
+    assert asyncio.run(client.complete_json([], parse)) == 2
+    assert create.call_count == 4
+
+
+def test_exhausted_retries_raise_with_the_last_error():
+    create = AsyncMock(return_value=completion("not json"))
+    client = fake_client(create, max_retries=2)
+    with pytest.raises(RetriesExhausted) as raised:
+        asyncio.run(client.complete_json([], dict))
+    assert isinstance(raised.value.__cause__, ValueError)
+    assert create.call_count == 3
+
+
+def test_errors_retrying_cannot_fix_are_raised_at_once():
+    create = AsyncMock(side_effect=openai.AuthenticationError(
+        "bad key", response=httpx.Response(401, request=api_request()), body=None
+    ))
+    client = fake_client(create)
+    with pytest.raises(openai.AuthenticationError):
+        asyncio.run(client.complete_json([], dict))
+    assert create.call_count == 1
+
+
+def test_concurrency_is_bounded():
+    in_flight = peak = 0
+
+    async def create(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return completion("{}")
+
+    client = fake_client(create, concurrency=3)
+
+    async def main():
+        await asyncio.gather(*(client.complete_json([], dict) for _ in range(10)))
+
+    asyncio.run(main())
+    assert peak == 3
+    assert client.usage["requests"] == 10
@@ -0,0 +1,38 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from main import EventStreamAwareGZipMiddleware
+
+BODY = "x" * 5000
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(EventStreamAwareGZipMiddleware, minimum_size=1000)
+
+    @app.get("/jobs/{job_id}/events")
+    async def events(job_id: str):
+        # text/plain, which any GZipMiddleware would compress
+        return StreamingResponse(iter([BODY]), media_type="text/plain")
+
+    @app.get("/page")
+    async def page():
+        return PlainTextResponse(BODY)
+
+    return TestClient(app)
+
+
+def test_large_responses_are_gzipped():
+    response = make_client().get("/page", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == BODY
+
+
+def test_event_streams_are_not_gzipped():
+    client = make_client()
+    by_path = client.get("/jobs/1/events", headers={"Accept-Encoding": "gzip"})
+    by_accept = client.get("/page", headers={"Accept-Encoding": "gzip", "Accept": "text/event-stream"})
+    for response in (by_path, by_accept):
+        assert "content-encoding" not in response.headers
+        assert response.text == BODY
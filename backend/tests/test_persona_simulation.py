@@ -0,0 +1,133 @@
+import asyncio
+import re
+
+import pytest
+
+from services.llm import RetriesExhausted
+from services.persona_simulation import (
+    Persona, ResponseCache, SimulationItem, parse_answers, persona_ids, simulate_quiz
+)
+
+ITEMS = [
+    SimulationItem("q1", "What is 2 + 2?", ["3", "4", "5"]),
+    SimulationItem("q2", "What is 3 x 3?", ["6", "9"]),
+]
+
+
+class FakeClient:
+    """Answers every question it is asked with `answers[item id]`."""
+
+    model = "fake-model"
+
+    def __init__(self, answers, fail_for=(), hang_for=()):
+        self.answers = answers
+        self.fail_for = set(fail_for)
+        self.hang_for = set(hang_for)
+        self.requests = []
+        self.cancelled = 0
+
+    async def complete_json(self, messages, parse, temperature=0.7, max_tokens=1024):
+        prompt = messages[-1]["content"]
+        persona = prompt.splitlines()[0].removeprefix("Student: ")
+        item_ids = re.findall(r"^Question (\S+):", prompt, flags=re.MULTILINE)
+        self.requests.append((persona, item_ids))
+        if persona in self.hang_for:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        await asyncio.sleep(0)
+        if persona in self.fail_for:
+            raise RetriesExhausted("4 attempts failed: Connection error.")
+        return parse({"answers": {item_id: self.answers[item_id] for item_id in item_ids}})
+
+
+def personas(*descriptions):
+    return [Persona(persona_id, text) for persona_id, text in zip(persona_ids(descriptions), descriptions)]
+
+
+def test_persona_ids_are_stable_and_count_repeats():
+    first = persona_ids(["A curious pupil", "Quiet  student", "a curious PUPIL"])
+    assert first == persona_ids(["A curious pupil", "Quiet student", "A curious pupil"])
+    # The same description again is the same persona, answering as a second student
+    assert first[0].split("-")[0] == first[2].split("-")[0]
+    assert first[0].endswith("-0") and first[2].endswith("-1")
+
+
+def test_parse_answers_maps_onto_the_exact_options():
+    reply = {"answers": {" q1 ": " 4", "q2": "9 "}}
+    assert parse_answers(reply, ITEMS) == {"q1": "4", "q2": "9"}
+    with pytest.raises(ValueError):
+        parse_answers({"answers": {"q1": "4"}}, ITEMS)
+    with pytest.raises(ValueError):
+        parse_answers({"answers": {"q1": "4", "q2": "10"}}, ITEMS)
+    with pytest.raises(ValueError):
+        parse_answers({"q1": "4"}, ITEMS)
+
+
+def test_cached_answers_skip_the_request():
+    cache = ResponseCache(":memory:")
+    client = FakeClient({"q1": "4", "q2": "9"})
+    students = personas("A curious pupil", "A tired pupil")
+
+    first = asyncio.run(simulate_quiz(students, ITEMS, client, cache=cache))
+    assert len(client.requests) == 2
+    assert [result.cached for result in first] == [0, 0]
+
+    second = asyncio.run(simulate_quiz(students, ITEMS, client, cache=cache))
+    assert len(client.requests) == 2
+    assert [result.answers for result in second] == [result.answers for result in first]
+    assert [result.cached for result in second] == [2, 2]
+    assert cache.stats() == {"entries": 4, "hits": 4, "misses": 4}
+
+
+def test_only_edited_items_are_asked_again():
+    cache = ResponseCache(":memory:")
+    client = FakeClient({"q1": "4", "q2": "9"})
+    students = personas("A curious pupil")
+    asyncio.run(simulate_quiz(students, ITEMS, client, cache=cache))
+
+    edited = [ITEMS[0], SimulationItem("q2", "What is 3 x 3?", ["6", "9", "12"])]
+    result, = asyncio.run(simulate_quiz(students, edited, client, cache=cache))
+    assert client.requests[-1] == ("A curious pupil", ["q2"])
+    assert result.answers == {"q1": "4", "q2": "9"} and result.cached == 1
+
+    # Another temperature is another cache entry
+    asyncio.run(simulate_quiz(students, edited, client, temperature=0.2, cache=cache))
+    assert client.requests[-1] == ("A curious pupil", ["q1", "q2"])
+
+
+def test_progress_reports_completed_personas_and_cached_answers():
+    cache = ResponseCache(":memory:")
+    client = FakeClient({"q1": "4", "q2": "9"})
+    asyncio.run(simulate_quiz(personas("A curious pupil"), ITEMS, client, cache=cache))
+
+    calls = []
+    results = asyncio.run(simulate_quiz(
+        personas("A curious pupil", "A tired pupil", "A keen pupil"), ITEMS, client, cache=cache,
+        progress=lambda completed, cached: calls.append((completed, cached))
+    ))
+    assert [completed for completed, _ in calls] == [1, 2, 3]
+    assert calls[-1][1] == sum(result.cached for result in results) == 2
+    # Results come back in persona order, whatever order they finished in
+    assert [result.persona.description for result in results] == ["A curious pupil", "A tired pupil", "A keen pupil"]
+
+
+def test_a_failing_persona_fails_the_simulation_and_cancels_the_rest():
+    client = FakeClient({"q1": "4", "q2": "9"}, fail_for={"A tired pupil"}, hang_for={"A keen pupil"})
+    cache = ResponseCache(":memory:")
+    with pytest.raises(RetriesExhausted):
+        asyncio.run(simulate_quiz(
+            personas("A curious pupil", "A tired pupil", "A keen pupil"), ITEMS, client, cache=cache
+        ))
+    assert client.cancelled == 1
+    # Answers of personas that did finish are kept for the next run
+    assert cache.stats()["entries"] == 2
+
+
+def test_simulation_without_a_cache_always_asks():
+    client = FakeClient({"q1": "4", "q2": "9"})
+    for _ in range(2):
+        asyncio.run(simulate_quiz(personas("A curious pupil"), ITEMS, client, cache=None))
+    assert len(client.requests) == 2
@@ -0,0 +1,55 @@
+import pytest
+from fastapi import HTTPException
+
+from routers.simulation import load_student_personas
+from services import persona_store
+from services.persona_store import clear_cache, sample_personas
+
+PERSONAS = 'id,persona,grade\n001,"Likes\nfractions",7\n002,Plays chess,8\n003,NA,\n'
+
+
+@pytest.fixture(params=["pandas", "arrow"])
+def reader(request, monkeypatch):
+    """Run a test with the pandas reader and, when it imports, the pyarrow one."""
+    if request.param == "pandas":
+        monkeypatch.setattr(persona_store, "pa", None)
+    elif persona_store.pa is None:
+        pytest.skip("pyarrow is not available")
+    clear_cache()
+    yield request.param
+    clear_cache()
+
+
+def test_columns_are_read_as_strings(tmp_path, reader):
+    (tmp_path / "middle_students.csv").write_text(PERSONAS, encoding="utf-8")
+    personas = sample_personas("middle", directory=tmp_path)
+    assert personas["id"].tolist() == ["001", "002", "003"]
+    assert personas["grade"].tolist() == ["7", "8", ""]
+    assert personas["persona"].tolist() == ["Likes\nfractions", "Plays chess", "NA"]
+
+
+def test_sample_is_seeded_and_indexed_by_row(tmp_path, reader):
+    (tmp_path / "middle_students.csv").write_text(PERSONAS, encoding="utf-8")
+    first = sample_personas("middle", 2, seed=4, directory=tmp_path)
+    again = sample_personas("middle", 2, seed=4, directory=tmp_path)
+    assert first.equals(again)
+    assert sorted(first["id"]) == sorted("00" + str(i + 1) for i in first.index)
+    assert len(sample_personas("middle", 10, seed=4, directory=tmp_path)) == 10  # with replacement
+
+
+@pytest.mark.parametrize("contents", ["", "id,persona\n"])
+def test_empty_persona_file_is_not_found(tmp_path, reader, contents):
+    (tmp_path / "middle_students.csv").write_text(contents, encoding="utf-8")
+    with pytest.raises(FileNotFoundError, match="empty"):
+        sample_personas("middle", 5, directory=tmp_path)
+
+
+def test_missing_or_empty_personas_are_a_404(tmp_path, monkeypatch):
+    monkeypatch.setattr(persona_store, "PERSONA_DIR", tmp_path)
+    clear_cache()
+    with pytest.raises(HTTPException) as missing:
+        load_student_personas("middle", 5)
+    (tmp_path / "middle_students.csv").write_text("id,persona\n", encoding="utf-8")
+    with pytest.raises(HTTPException) as empty:
+        load_student_personas("middle", 5)
+    assert missing.value.status_code == empty.value.status_code == 404
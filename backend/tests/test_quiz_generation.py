@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import json
+import re
+from unittest.mock import Mock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from routers import quiz
+from services import llm as llm_module
+from services.llm import LLMClient
+from services.quiz_generation import DIFFICULTIES, FailedItem, generate_items, item_specs
+
+
+def item_reply(number):
+    return {
+        "question": f"What is {number} + {number}?",
+        "options": [str(2 * number), str(2 * number + 1), str(2 * number - 1), "0"],
+        "correct_answer": str(2 * number),
+        "explanation": "Add the numbers.",
+    }
+
+
+def fake_client(reply=item_reply, max_retries=1):
+    """LLM client whose reply to the prompt for item n is `reply(n)`."""
+    calls = []
+
+    async def create(messages, **kwargs):
+        number = int(re.search(r"Write item (\d+)", messages[-1]["content"]).group(1))
+        calls.append(number)
+        await asyncio.sleep(0.005 * (10 - number))  # later items finish first
+        return Mock(choices=[Mock(message=Mock(content=json.dumps(reply(number))))], usage=None)
+
+    client = LLMClient(model="fake-model", max_retries=max_retries)
+    client._client = Mock()
+    client._client.chat.completions.create = create
+    client.calls = calls
+    return client
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_module, "backoff_delay", lambda attempt: 0)
+
+
+def collect(client, num_items, parse=lambda reply, number: (number, reply)):
+    async def main():
+        return [item async for item in generate_items("addition", "primary", "dichotomous", num_items, parse, client)]
+    return asyncio.run(main())
+
+
+def test_difficulties_rise_through_the_quiz():
+    specs = item_specs(10)
+    assert [spec.number for spec in specs] == list(range(1, 11))
+    assert specs[0].difficulty == DIFFICULTIES[0] and specs[-1].difficulty == DIFFICULTIES[-1]
+    order = [DIFFICULTIES.index(spec.difficulty) for spec in specs]
+    assert order == sorted(order) and set(order) == set(range(len(DIFFICULTIES)))
+
+
+def test_items_are_yielded_as_they_complete():
+    items = collect(fake_client(), 5)
+    assert [number for number, _ in items] == [5, 4, 3, 2, 1]
+    assert dict(items)[3]["correct_answer"] == "6"
+
+
+def test_an_invalid_item_is_regenerated_on_its_own():
+    attempts = {}
+
+    def parse(reply, number):
+        attempts[number] = attempts.get(number, 0) + 1
+        if number == 2 and attempts[number] == 1:
+            raise ValueError("Duplicate options")
+        return number
+
+    client = fake_client()
+    assert sorted(collect(client, 3, parse)) == [1, 2, 3]
+    assert sorted(client.calls) == [1, 2, 2, 3]
+
+
+def test_an_item_exhausting_its_retries_fails_alone():
+    client = fake_client(lambda number: {"question": ""} if number == 2 else item_reply(number))
+    items = collect(client, 3, lambda reply, number: quiz.parse_quiz_item(reply, number, quiz.ItemType.DICHOTOMOUS))
+    failed = [item for item in items if isinstance(item, FailedItem)]
+    assert [item.number for item in failed] == [2]
+    assert "2 attempts failed" in failed[0].error
+    assert sorted(item.id for item in items if not isinstance(item, FailedItem)) == [1, 3]
+
+
+def test_unknown_item_type_is_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(generate_items("addition", "primary", "essay", 3, lambda reply, number: reply).__anext__())
+
+
+@pytest.fixture
+def client():
+    import main
+    return TestClient(main.app)
+
+
+def use_llm(monkeypatch, llm_client):
+    monkeypatch.setattr(quiz, "generate_items", functools.partial(generate_items, client=llm_client))
+
+
+QUIZ_REQUEST = {"knowledge_point": "addition", "school_level": "primary", "item_type": "dichotomous", "num_items": 4}
+
+
+def test_quiz_keeps_the_items_that_were_generated(client, monkeypatch):
+    use_llm(monkeypatch, fake_client(lambda number: {"question": "?"} if number == 3 else item_reply(number)))
+    response = client.post("/api/quiz/generate", json=QUIZ_REQUEST)
+    assert response.status_code == 200
+    generated = response.json()
+    assert [item["id"] for item in generated["items"]] == [1, 2, 4]
+    assert [item["id"] for item in generated["failed_items"]] == [3]
+
+    stored = client.get(f"/api/quiz/quiz/{generated['id']}")
+    assert stored.status_code == 200 and stored.json() == generated
+
+
+def test_quiz_fails_when_no_item_was_generated(client, monkeypatch):
+    use_llm(monkeypatch, fake_client(lambda number: {"question": "?"}))
+    response = client.post("/api/quiz/generate", json=QUIZ_REQUEST)
+    assert response.status_code == 500
+    assert "No item could be generated" in response.json()["detail"]
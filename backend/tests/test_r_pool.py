@@ -0,0 +1,146 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from services import r_pool
+from services.r_pool import RWorkerError, RWorkerPool
+
+
+def fake_worker_main(conn):
+    """The worker protocol of `r_pool._worker_main`, without R."""
+    conn.send(("ready", []))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            conn.send(("ok", fn(*args)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def broken_worker_main(conn):
+    conn.send(("error", "R initialisation failed"))
+
+
+def slow_echo(value, seconds):
+    time.sleep(seconds)
+    return value
+
+
+def fail():
+    raise ValueError("bad data")
+
+
+def exit_worker():
+    os._exit(1)
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """Patch the pool to start fake workers, with `targets` deciding the target of each one."""
+    created = []
+    targets = []
+    real_worker = r_pool.RWorker
+
+    def make_worker(context):
+        worker = real_worker(context, target=targets.pop(0) if targets else fake_worker_main)
+        created.append(worker)
+        return worker
+
+    monkeypatch.setattr(r_pool, "RWorker", make_worker)
+    return created, targets
+
+
+def run(coroutine_fn):
+    return asyncio.run(coroutine_fn())
+
+
+def test_runs_jobs_and_reports_errors(workers):
+    async def main():
+        pool = RWorkerPool(size=2)
+        await pool.start()
+        try:
+            assert await pool.run(slow_echo, "a", 0) == "a"
+            with pytest.raises(RWorkerError, match="bad data"):
+                await pool.run(fail)
+            assert await asyncio.gather(*(pool.run(slow_echo, i, 0.05) for i in range(4))) == [0, 1, 2, 3]
+        finally:
+            await pool.shutdown()
+
+    run(main)
+
+
+def test_cancelled_caller_does_not_free_a_busy_worker(workers):
+    async def main():
+        pool = RWorkerPool(size=1)
+        await pool.start()
+        try:
+            first = asyncio.create_task(pool.run(slow_echo, "first", 0.5))
+            await asyncio.sleep(0.1)
+            first.cancel()
+            await asyncio.sleep(0)
+            # The only worker is still running the first job, so it is not idle yet
+            assert pool._idle.empty()
+            assert await asyncio.wait_for(pool.run(slow_echo, "second", 0), 5) == "second"
+        finally:
+            await pool.shutdown()
+
+    run(main)
+
+
+def test_partial_start_failure_stops_the_started_workers(workers):
+    created, targets = workers
+    targets.extend([fake_worker_main, broken_worker_main])
+
+    async def main():
+        pool = RWorkerPool(size=2)
+        with pytest.raises(RWorkerError, match="initialisation failed"):
+            await pool.start()
+
+    run(main)
+    assert all(not worker.alive for worker in created)
+
+
+def test_failed_replacement_of_the_last_worker_raises(workers):
+    _, targets = workers
+
+    async def main():
+        pool = RWorkerPool(size=1)
+        await pool.start()
+        try:
+            targets.append(broken_worker_main)  # the replacement fails to start
+            waiting = asyncio.create_task(pool.run(slow_echo, "queued", 0))
+            with pytest.raises(RWorkerError):
+                await pool.run(exit_worker)
+            with pytest.raises(RWorkerError, match="No R workers"):
+                await asyncio.wait_for(waiting, 5)
+            with pytest.raises(RWorkerError, match="No R workers"):
+                await asyncio.wait_for(pool.run(slow_echo, "later", 0), 5)
+        finally:
+            await pool.shutdown()
+
+    run(main)
+
+
+def test_dead_worker_is_replaced(workers):
+    created, _ = workers
+
+    async def main():
+        pool = RWorkerPool(size=1)
+        await pool.start()
+        try:
+            with pytest.raises(RWorkerError):
+                await pool.run(exit_worker)
+            assert await asyncio.wait_for(pool.run(slow_echo, "again", 0), 10) == "again"
+        finally:
+            await pool.shutdown()
+
+    run(main)
+    assert len(created) == 2
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from services.response_matrix import DenseResponseMatrix, ResponseMatrix, SparseResponseMatrix
+
+
+def responses_with_missing(seed=0, shape=(50, 6), num_categories=3, missing=0.3):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, num_categories, shape).astype(float)
+    values[rng.random(shape) < missing] = np.nan
+    return values
+
+
+def test_dense_round_trip_keeps_missing_cells():
+    values = responses_with_missing()
+    matrix = DenseResponseMatrix.from_array(values, [f"q{j}" for j in range(6)])
+    assert matrix.shape == (50, 6)
+    assert np.array_equal(matrix.to_array(), values, equal_nan=True)
+    assert matrix.num_answered == np.sum(~np.isnan(values))
+    assert matrix.num_categories == 3
+    assert list(matrix.to_dataframe().columns) == [f"q{j}" for j in range(6)]
+
+
+def test_sparse_and_dense_layouts_agree():
+    values = responses_with_missing(seed=1)
+    dense = DenseResponseMatrix.from_array(values)
+    sparse = SparseResponseMatrix.from_dense(dense)
+    assert np.array_equal(sparse.to_array(), values, equal_nan=True)
+    assert sparse.num_answered == dense.num_answered
+    assert sparse.fingerprint() == dense.fingerprint()
+    assert np.allclose(sparse.pairwise_correlation(), dense.pairwise_correlation())
+
+
+def test_from_long_builds_the_same_matrix():
+    values = responses_with_missing(seed=2)
+    students, items = np.nonzero(~np.isnan(values))
+    sparse = SparseResponseMatrix.from_long(students, items, values[students, items], 50, [str(j) for j in range(6)])
+    assert np.array_equal(sparse.to_array(), values, equal_nan=True)
+
+
+def test_fingerprint_depends_on_responses_and_item_ids():
+    values = responses_with_missing(seed=3)
+    matrix = DenseResponseMatrix.from_array(values)
+    changed = values.copy()
+    changed[0, 0] = 1 if changed[0, 0] != 1 else 0
+    assert DenseResponseMatrix.from_array(changed).fingerprint() != matrix.fingerprint()
+    assert DenseResponseMatrix.from_array(values, list("abcdef")).fingerprint() != matrix.fingerprint()
+    # A missing response is not the same as a 0 response
+    values[np.isnan(values)] = 0
+    assert DenseResponseMatrix.from_array(values).fingerprint() != matrix.fingerprint()
+
+
+@pytest.mark.parametrize("layout", ["dense", "sparse"])
+def test_slicing_and_take(layout):
+    values = responses_with_missing(seed=4)
+    matrix = DenseResponseMatrix.from_array(values)
+    if layout == "sparse":
+        matrix = SparseResponseMatrix.from_dense(matrix)
+    assert np.array_equal(matrix[10:20].to_array(), values[10:20], equal_nan=True)
+    rows = np.array([3, 3, 0, 49])
+    assert np.array_equal(matrix.take(rows).to_array(), values[rows], equal_nan=True)
+
+
+@pytest.mark.parametrize("layout", ["dense", "sparse"])
+def test_blocks_cover_all_rows(layout):
+    values = responses_with_missing(seed=5)
+    matrix = DenseResponseMatrix.from_array(values)
+    if layout == "sparse":
+        matrix = SparseResponseMatrix.from_dense(matrix)
+    blocks = list(matrix.indicator_blocks(block_size=7))
+    assert [len(codes) for codes, _ in blocks] == [7] * 7 + [1]
+    codes = np.vstack([codes for codes, _ in blocks])
+    answered = np.vstack([answered for _, answered in blocks])
+    assert np.array_equal(answered, ~np.isnan(values))
+    assert np.array_equal(codes, np.nan_to_num(values))
+
+
+def test_pairwise_correlation_skips_missing_cells():
+    values = responses_with_missing(seed=6, shape=(400, 5))
+    expected = pd.DataFrame(values).corr(min_periods=2).to_numpy()
+    assert np.allclose(DenseResponseMatrix.from_array(values).pairwise_correlation(), expected)
+
+
+@pytest.mark.parametrize("bad", [[[0.5, 1.0]], [[-1.0, 0.0]], [[127.0, 0.0]]])
+def test_rejects_non_codes(bad):
+    with pytest.raises(ValueError):
+        DenseResponseMatrix.from_array(bad)
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ResponseMatrix()
+
+
+def test_from_long_rejects_duplicate_cells():
+    with pytest.raises(ValueError, match="Duplicate"):
+        SparseResponseMatrix.from_long(np.array([0, 1, 0]), np.array([1, 0, 1]), np.array([0, 1, 1]), 2, ["q1", "q2"])
+
+
+def test_sparse_rejects_duplicate_stored_entries():
+    # Row 0 stores item 1 twice; summing code + 1 entries would turn two 0 responses into a 1
+    matrix = sparse.csr_matrix((np.array([1, 1, 2], dtype=np.int8), np.array([1, 1, 0]), np.array([0, 2, 3])), shape=(2, 2))
+    with pytest.raises(ValueError, match="Duplicate"):
+        SparseResponseMatrix(matrix, ["q1", "q2"])
+    # The same item in different rows is fine
+    matrix = sparse.csr_matrix((np.array([1, 2], dtype=np.int8), np.array([1, 1]), np.array([0, 1, 2])), shape=(2, 2))
+    assert SparseResponseMatrix(matrix, ["q1", "q2"]).num_answered == 2
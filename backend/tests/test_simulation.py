@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from routers import simulation
+from routers.simulation import SimulationRequest, ability_priors, draw_groups, run_simulation
+from services.irt_models import check_parameter_lists
+from services.storage import storage
+
+
+@pytest.fixture
+def client():
+    import main
+    return TestClient(main.app)
+
+
+def simulate(client, **settings):
+    request = {"quiz_id": "quiz", "school_level": "middle", "include_responses": False, "seed": 3, **settings}
+    return client.post("/api/simulation/simulate", json=request)
+
+
+def mean_score(client, **settings):
+    response = simulate(client, num_students=4000, **settings)
+    assert response.status_code == 200
+    return response.json()["summary_statistics"]["mean_score"]
+
+
+def test_school_level_sets_the_ability_prior(client):
+    primary, middle, undergraduate = (mean_score(client, school_level=level)
+                                      for level in ("primary", "middle", "undergraduate"))
+    assert primary < middle - 0.1 and undergraduate > middle + 0.1
+    assert abs(mean_score(client, school_level="undergraduate", ability_mean=0.0) - middle) < 0.02
+
+
+def test_groups_are_drawn_in_proportion():
+    request = SimulationRequest(
+        quiz_id="quiz", school_level="middle", num_students=10000,
+        group_proportions={"primary": 1, "undergraduate": 3},
+    )
+    groups = draw_groups(request, np.random.default_rng(0))
+    assert set(groups) == {"primary", "undergraduate"}
+    assert abs(np.mean(groups == "undergraduate") - 0.75) < 0.02
+
+
+def test_requested_priors_override_the_defaults():
+    request = SimulationRequest(
+        quiz_id="quiz", school_level="high", ability_sd=2.0, ability_priors={"primary": (-2.0, 0.5)}
+    )
+    priors = ability_priors(request)
+    assert priors["high"] == (0.0, 2.0)
+    assert priors["primary"] == (-2.0, 0.5)
+    assert priors["middle"] == (0.0, 1.0)
+
+
+def test_mixed_groups_are_stored(client):
+    response = simulate(client, num_students=50, group_proportions={"primary": 1, "middle": 1})
+    assert response.status_code == 200
+    assert storage.load_simulation(response.json()["simulation_id"]).num_students == 50
+
+
+@pytest.mark.parametrize("settings", [
+    {"model_type": "3pl", "item_parameters": {"q1": [1.0]}},
+    {"model_type": "2pl", "item_parameters": {"q1": [1.0, 0.0, 0.2]}},
+    {"model_type": "3pl", "item_parameters": {"q1": [1.0, 0.0, 1.5]}},
+    {"model_type": "rasch", "item_parameters": {"q1": [1.0, 0.0], "q2": [1.4, 0.5]}},
+    {"model_type": "grm", "item_parameters": {"q1": [1.0]}},
+    {"model_type": "grm", "item_parameters": {"q1": [1.0, 0.5, -0.5]}},
+    {"group_proportions": {"middle": 1, "graduate": 1}},
+    {"group_proportions": {"middle": 0}},
+    {"ability_sd": 0},
+    {"ability_priors": {"middle": [0.0, -1.0]}},
+    {"num_students": -5},
+    {"num_students": 0},
+    {"num_items": 0},
+    {"model_type": "grm", "num_categories": 1},
+])
+def test_invalid_settings_are_a_422(client, settings):
+    assert simulate(client, **settings).status_code == 422
+
+
+@pytest.mark.parametrize("model_type,item_parameters", [
+    ("rasch", {"q1": [0.0], "q2": [1.0]}),
+    ("rasch", {"q1": [1.3, 0.0], "q2": [1.3, 1.0]}),
+    ("3pl", {"q1": [1.2, -0.5, 0.2]}),
+    ("gpcm", {"q1": [1.0, 0.5, -0.5]}),
+])
+def test_valid_parameter_lists(client, model_type, item_parameters):
+    check_parameter_lists(item_parameters, model_type)
+    response = simulate(client, num_students=20, model_type=model_type, item_parameters=item_parameters)
+    assert response.status_code == 200
+    assert response.json()["summary_statistics"]["num_items"] == len(item_parameters)
+
+
+def test_irt_simulation_does_not_block_the_event_loop(monkeypatch):
+    original = simulation.run_irt_simulation
+    threads = []
+
+    def slow_simulation(*args):
+        threads.append(threading.current_thread())
+        time.sleep(0.3)
+        return original(*args)
+
+    monkeypatch.setattr(simulation, "run_irt_simulation", slow_simulation)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        request = SimulationRequest(quiz_id="quiz", school_level="middle", num_students=100, seed=1)
+        result = await run_simulation(request, "loop-sim")
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(main())
+    assert threads and threads[0] is not threading.main_thread()
+    assert ticks > 10
+    assert result.summary_statistics["num_students"] == 100
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from services.response_matrix import DenseResponseMatrix, SparseResponseMatrix
+from services.storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return Storage(tmp_path)
+
+
+def matrix(seed=0, shape=(30, 4), num_categories=2):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, num_categories, shape).astype(float)
+    values[rng.random(shape) < 0.2] = np.nan
+    return DenseResponseMatrix.from_array(values, [f"q{j}" for j in range(shape[1])])
+
+
+def test_quiz_round_trip(storage):
+    quiz = {"id": "quiz-1", "knowledge_point": "fractions", "school_level": "primary", "questions": []}
+    storage.save_quiz(quiz)
+    assert storage.load_quiz("quiz-1") == quiz
+    assert storage.load_quiz("missing") is None
+
+
+def test_simulation_round_trip(storage):
+    responses, choices = matrix(1), matrix(2, num_categories=4)
+    options = [["a", "b", "c", "d"]] * 4
+    saved = storage.save_simulation(
+        "sim-1", "quiz-1", "irt", responses, [1, 1, 1, 1], {"mean_score": 0.5}, choices, options
+    )
+    record = storage.load_simulation("sim-1")
+    assert record == saved
+    assert record.options == options and record.fingerprint == responses.fingerprint()
+
+    loaded = storage.load_responses("sim-1")
+    assert isinstance(loaded.codes, np.memmap)
+    assert np.array_equal(loaded.to_array(), responses.to_array(), equal_nan=True)
+    assert loaded.fingerprint() == responses.fingerprint()
+    assert np.array_equal(storage.load_choices("sim-1").to_array(), choices.to_array(), equal_nan=True)
+
+
+def test_sparse_responses_are_stored_densely(storage):
+    responses = matrix(3)
+    storage.save_simulation("sim-1", "quiz-1", "irt", SparseResponseMatrix.from_dense(responses), [1] * 4, {})
+    assert np.array_equal(storage.load_responses("sim-1").to_array(), responses.to_array(), equal_nan=True)
+    assert storage.load_choices("sim-1") is None
+
+
+def test_saving_again_replaces_the_simulation(storage):
+    storage.save_simulation("sim-1", "quiz-1", "irt", matrix(4), [1] * 4, {})
+    replacement = matrix(5, shape=(10, 4))
+    storage.save_simulation("sim-1", "quiz-1", "irt", replacement, [1] * 4, {})
+    assert storage.load_simulation("sim-1").num_students == 10
+    assert storage.load_responses("sim-1").fingerprint() == replacement.fingerprint()
+
+
+def test_list_and_delete(storage):
+    for simulation_id in ("sim-1", "sim-2"):
+        storage.save_simulation(simulation_id, "quiz-1", "irt", matrix(), [1] * 4, {})
+    storage.save_simulation("sim-3", "quiz-2", "irt", matrix(), [1] * 4, {})
+    assert [record.simulation_id for record in storage.list_simulations("quiz-1")] == ["sim-1", "sim-2"]
+
+    assert storage.delete_simulation("sim-1")
+    assert not storage.delete_simulation("sim-1")
+    assert storage.load_simulation("sim-1") is None and storage.load_responses("sim-1") is None
+    assert not any(path.exists() for path in storage._matrix_paths("sim-1", "responses"))
+
+
+def test_store_reopens_from_disk(tmp_path):
+    responses = matrix(6)
+    Storage(tmp_path).save_simulation("sim-1", "quiz-1", "irt", responses, [1] * 4, {})
+    assert Storage(tmp_path).load_responses("sim-1").fingerprint() == responses.fingerprint()
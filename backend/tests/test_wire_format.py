@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from services import wire_format
+from services.response_matrix import DenseResponseMatrix
+from services.wire_format import ARROW, JSON, MSGPACK, encode_page, negotiate, read_rows
+
+
+@pytest.mark.parametrize("accept,expected", [
+    (None, JSON),
+    ("", JSON),
+    ("*/*", JSON),
+    ("application/json", JSON),
+    ("text/html, application/*;q=0.5", JSON),
+    ("text/csv", None),
+    ("application/json;q=0", None),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_negotiate_prefers_quality_then_order(monkeypatch):
+    monkeypatch.setattr(wire_format, "available_media_types", lambda: [JSON, MSGPACK, ARROW])
+    assert negotiate(f"{JSON};q=0.5, {MSGPACK}") == MSGPACK
+    assert negotiate(f"{ARROW}, {MSGPACK}") == ARROW
+    assert negotiate("application/x-msgpack") == MSGPACK
+    monkeypatch.setattr(wire_format, "available_media_types", lambda: [JSON])
+    assert negotiate(MSGPACK) is None
+
+
+def page(values):
+    matrix = DenseResponseMatrix.from_array(values, ["q1", "q2", "q3"])
+    codes, answered = read_rows(matrix, 1, 2)
+    header = {"item_ids": matrix.item_ids, "offset": 1}
+    return codes, answered, header
+
+
+VALUES = np.array([[0, 1, 1], [1, np.nan, 2], [np.nan, 0, 1], [1, 1, 1]])
+
+
+def test_read_rows_pages_and_past_the_end():
+    codes, answered, _ = page(VALUES)
+    assert codes.tolist() == [[1, 0, 2], [0, 0, 1]]
+    assert answered.tolist() == [[True, False, True], [False, True, True]]
+    codes, answered = read_rows(DenseResponseMatrix.from_array(VALUES), 10, 5)
+    assert codes.shape == answered.shape == (0, 3)
+
+
+def test_json_page_marks_missing_cells():
+    codes, answered, header = page(VALUES)
+    payload = json.loads(encode_page(JSON, header, codes, answered, np.array([0.75, 0.25])))
+    assert payload == {"item_ids": ["q1", "q2", "q3"], "offset": 1,
+                       "codes": [[1, -1, 2], [-1, 0, 1]], "scores": [0.75, 0.25]}
+
+
+def test_json_without_orjson_is_the_same(monkeypatch):
+    codes, answered, header = page(VALUES)
+    choices = (codes, answered)
+    expected = json.loads(encode_page(JSON, header, codes, answered, np.array([0.5, 0.5]), choices))
+    monkeypatch.setattr(wire_format, "orjson", None)
+    assert json.loads(encode_page(JSON, header, codes, answered, np.array([0.5, 0.5]), choices)) == expected
+
+
+def test_msgpack_page():
+    msgpack = pytest.importorskip("msgpack")
+    codes, answered, header = page(VALUES)
+    payload = msgpack.unpackb(encode_page(MSGPACK, header, codes, answered, np.array([0.75, 0.25])))
+    assert payload["codes"] == [[1, -1, 2], [-1, 0, 1]]
+
+
+def test_arrow_page():
+    if wire_format.pa is None:
+        pytest.skip("pyarrow is not available")
+    pa = wire_format.pa
+    codes, answered, header = page(VALUES)
+    table = pa.ipc.open_stream(encode_page(ARROW, header, codes, answered, np.array([0.75, 0.25]))).read_all()
+    assert table.column("q2").to_pylist() == [None, 0]
+    assert json.loads(table.schema.metadata[b"header"]) == header
+
+
+@pytest.fixture
+def client():
+    import main
+    return TestClient(main.app)
+
+
+def test_matrix_endpoint_pages_a_stored_simulation(client):
+    from services.storage import storage
+    responses = DenseResponseMatrix.from_array(VALUES, ["q1", "q2", "q3"])
+    storage.save_simulation("wire-sim", "wire-quiz", "irt", responses, [1, 1, 2], {"mean_score": 0.5})
+
+    response = client.get("/api/simulation/simulation/wire-sim/matrix?offset=1&limit=2")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(JSON)
+    assert "Accept" in response.headers["vary"]
+    body = response.json()
+    assert body["codes"] == [[1, -1, 2], [-1, 0, 1]]
+    assert body["scores"] == [0.75, 0.25]
+    assert body["next_offset"] == 3
+
+    last = client.get("/api/simulation/simulation/wire-sim/matrix?offset=2&limit=5").json()
+    assert last["next_offset"] is None and len(last["codes"]) == 2
+
+    assert client.get("/api/simulation/simulation/wire-sim/matrix", headers={"Accept": "text/csv"}).status_code == 406
+    assert client.get("/api/simulation/simulation/missing/matrix").status_code == 404
@@ -0,0 +1,171 @@
+"""
+Benchmark cases for the analysis, simulation and persona hot paths.
+
+Response matrices are simulated from 2PL (dichotomous) or GRM (4-category)
+parameters with a fixed seed and shared between cases of the same size.
+The LLM-bound paths (persona simulation and persona classification) run
+against `StubChatClient`, which answers after `STUB_LATENCY` seconds
+without any network access. That measures the pipeline's own overhead and
+how well it overlaps requests, not the provider.
+"""
+import asyncio
+import json
+import re
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+
+from harness import Size, benchmark
+from services.ctt import classical_statistics
+from services.irt_estimation import fit_irt
+from services.irt_information import information_curves, theta_grid
+from services.irt_polytomous import fit_polytomous
+from services.irt_simulation import draw_item_parameters, draw_polytomous_parameters, simulate_responses
+from services.llm import LLMClient
+from services.persona_simulation import Persona, SimulationItem, simulate_quiz
+from services.response_matrix import DenseResponseMatrix
+
+SEED = 20240101
+STUB_LATENCY = 0.01  # seconds per stubbed chat completion; set by run.py
+# Fits get expensive quickly; larger sizes are skipped
+MAX_FIT_CELLS = 2_000_000
+# Stubbed LLM cases make one request per student (or batch of personas)
+MAX_LLM_CELLS = 100_000
+
+
+class StubChatClient:
+    """
+    Stand-in for AsyncOpenAI: `chat.completions.create` sleeps for the
+    latency and returns `respond(messages)` as the reply content.
+    """
+
+    def __init__(self, respond, latency: float):
+        self.respond = respond
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content=self.respond(messages))
+        usage = SimpleNamespace(prompt_tokens=len(messages[-1]["content"]) // 4, completion_tokens=8)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+@lru_cache(maxsize=4)
+def dichotomous_matrix(size: Size) -> DenseResponseMatrix:
+    params = draw_item_parameters(size.items, "2pl", seed=SEED)
+    _, responses = simulate_responses(size.students, params, seed=SEED)
+    return DenseResponseMatrix.from_array(responses)
+
+
+@lru_cache(maxsize=4)
+def polytomous_matrix(size: Size) -> DenseResponseMatrix:
+    params = draw_polytomous_parameters(size.items, "grm", num_categories=4, seed=SEED)
+    _, responses = simulate_responses(size.students, params, seed=SEED)
+    return DenseResponseMatrix.from_array(responses)
+
+
+def _cells(size: Size) -> int:
+    return size.students * size.items
+
+
+@benchmark("efa", unit="cells", count=_cells)
+def efa(size: Size):
+    from routers.analysis import perform_efa_analysis
+    data = dichotomous_matrix(size)
+    return lambda: perform_efa_analysis(data)
+
+
+@benchmark("ctt", unit="cells", count=_cells)
+def ctt(size: Size):
+    data = dichotomous_matrix(size)
+    choices = DenseResponseMatrix.from_array(
+        np.random.default_rng(SEED).integers(0, 4, size=data.shape).astype(float)
+    )
+    return lambda: classical_statistics(data, choices=choices, num_options=[4] * size.items)
+
+
+def _register_fit(model_type: str):
+    polytomous = model_type in ("grm", "gpcm")
+
+    def setup(size: Size):
+        data = polytomous_matrix(size) if polytomous else dichotomous_matrix(size)
+        fit = fit_polytomous if polytomous else fit_irt
+        return lambda: fit(data, model_type)
+
+    benchmark(f"irt-fit-{model_type}", max_cells=MAX_FIT_CELLS, unit="cells", count=_cells)(setup)
+
+
+for _model_type in ("rasch", "2pl", "3pl", "grm", "gpcm"):
+    _register_fit(_model_type)
+
+
+@benchmark("information-curves", unit="item-points", count=lambda size: size.items * 401)
+def information(size: Size):
+    # Depends on the number of items only; evaluated on a fine grid as for plotting
+    params = draw_polytomous_parameters(size.items, "gpcm", num_categories=4, seed=SEED)
+    theta = theta_grid(num_points=401)
+    return lambda: information_curves(theta, params)
+
+
+@benchmark("simulate-irt", unit="cells", count=_cells)
+def simulate_irt(size: Size):
+    params = draw_item_parameters(size.items, "2pl", seed=SEED)
+    return lambda: simulate_responses(size.students, params, seed=SEED)
+
+
+_QUESTION_ID = re.compile(r"^Question (\S+):", re.MULTILINE)
+
+
+def _quiz_answers(messages) -> str:
+    ids = _QUESTION_ID.findall(messages[-1]["content"])
+    return json.dumps({"answers": {item_id: "b" for item_id in ids}})
+
+
+@benchmark("simulate-llm", max_cells=MAX_LLM_CELLS, unit="students", count=lambda size: size.students)
+def simulate_llm(size: Size):
+    items = [SimulationItem(str(j + 1), f"Question text {j + 1}", ["a", "b", "c", "d"]) for j in range(size.items)]
+    personas = [Persona(f"persona-{i}", f"A student who likes topic {i % 17}") for i in range(size.students)]
+
+    def run():
+        client = LLMClient(model="stub")
+        client._client = StubChatClient(_quiz_answers, STUB_LATENCY)
+        return asyncio.run(simulate_quiz(personas, items, client=client, cache=None))
+
+    return run
+
+
+_PERSONA_NUMBER = re.compile(r"^(\d+)\. ", re.MULTILINE)
+
+
+def _persona_labels(messages) -> str:
+    content = messages[-1]["content"]
+    numbers = _PERSONA_NUMBER.findall(content)
+    if not numbers:
+        return "primary"
+    return json.dumps([{"index": int(number), "label": "middle"} for number in numbers])
+
+
+@benchmark("classify-personas", max_cells=MAX_LLM_CELLS, unit="personas", count=lambda size: size.students)
+def classify_personas(size: Size):
+    # Depends on the number of students only, each one a persona to classify
+    from extract_from_personaHub import DeepSeekLLM
+
+    class StubDeepSeekLLM(DeepSeekLLM):
+        def _async_client(self):
+            return StubChatClient(_persona_labels, STUB_LATENCY)
+
+    personas = [{"id": str(i), "persona": f"A learner who enjoys subject {i % 23}"} for i in range(size.students)]
+
+    def run():
+        llm = StubDeepSeekLLM("stub-key", "http://stub.invalid", max_workers=16, batch_size=10)
+        return llm.process_all_personas(personas)
+
+    return run
@@ -0,0 +1,192 @@
+"""
+Timing, history and baseline comparison for the benchmark suite.
+
+A benchmark case is a function registered with `@benchmark(...)` that takes
+a `Size` (students x items) and returns a zero-argument callable. Setup such
+as simulating the response matrix happens before the callable is returned,
+so only the callable is timed. Each case runs once to warm up and then
+`repeat` times; the median is what gets compared.
+
+Every run is appended to a JSON lines history file with the git commit and
+library versions. A baseline file maps each case to its median seconds, and
+a case regresses when its median exceeds the baseline by more than the
+threshold ratio and by more than a small absolute margin, so timer noise on
+sub-millisecond cases does not fail the run.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+# The backend and persona pipeline are not installed packages; import them from the tree
+for path in (ROOT / "backend" / "app", ROOT / "student_persona"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+DEFAULT_THRESHOLD = 1.25  # median may be 25% slower than the baseline
+MIN_DIFFERENCE = 0.005  # seconds; smaller slowdowns are never regressions
+
+
+class Size(NamedTuple):
+    students: int
+    items: int
+
+    def __str__(self) -> str:
+        return f"{self.students}x{self.items}"
+
+    @classmethod
+    def parse(cls, text: str) -> "Size":
+        students, _, items = text.lower().partition("x")
+        return cls(int(students), int(items))
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[Size], Callable[[], object]]
+    max_cells: Optional[int]  # sizes with more students x items are skipped
+    unit: Optional[str]  # what `count(size)` counts, for a throughput figure
+    count: Optional[Callable[[Size], int]]
+
+
+class Result(NamedTuple):
+    case: str
+    size: str
+    repeat: int
+    min_seconds: float
+    median_seconds: float
+    throughput: Optional[float]  # units per second at the median
+    unit: Optional[str]
+
+    @property
+    def key(self) -> str:
+        return f"{self.case}[{self.size}]"
+
+
+CASES: Dict[str, Case] = {}
+
+
+def benchmark(
+    name: str,
+    max_cells: Optional[int] = None,
+    unit: Optional[str] = None,
+    count: Optional[Callable[[Size], int]] = None,
+):
+    """Register a benchmark case under `name`."""
+    def register(setup: Callable[[Size], Callable[[], object]]):
+        CASES[name] = Case(name, setup, max_cells, unit, count)
+        return setup
+    return register
+
+
+def run_case(case: Case, size: Size, repeat: int) -> Result:
+    fn = case.setup(size)
+    fn()  # warm-up: imports, lazily built caches and pools
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    throughput = case.count(size) / median if case.count is not None and median > 0 else None
+    return Result(case.name, str(size), repeat, min(timings), median, throughput, case.unit)
+
+
+def run_cases(
+    cases: Sequence[Case],
+    sizes: Sequence[Size],
+    repeat: int,
+    report: Optional[Callable[[Result], None]] = None,
+) -> List[Result]:
+    results = []
+    for case in cases:
+        for size in sizes:
+            if case.max_cells is not None and size.students * size.items > case.max_cells:
+                continue
+            result = run_case(case, size, repeat)
+            results.append(result)
+            if report is not None:
+                report(result)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, object]:
+    import scipy
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor() or None,
+    }
+
+
+def append_history(path: Path, results: Sequence[Result]):
+    """Append one run (timestamp, environment and every result) as a JSON line."""
+    entry = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "results": [result._asdict() for result in results],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_baseline(path: Path) -> Dict[str, float]:
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["median_seconds"]
+
+
+def save_baseline(path: Path, results: Sequence[Result], merge: bool = True):
+    """Write the medians of `results` as the new baseline, keeping other cases' entries when `merge`."""
+    medians = load_baseline(path) if merge else {}
+    medians.update({result.key: result.median_seconds for result in results})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "median_seconds": dict(sorted(medians.items()))}, f, indent=2)
+        f.write("\n")
+
+
+class Comparison(NamedTuple):
+    key: str
+    baseline_seconds: float
+    median_seconds: float
+    ratio: float
+    regressed: bool
+
+
+def compare(
+    results: Sequence[Result],
+    baseline: Dict[str, float],
+    threshold: float = DEFAULT_THRESHOLD,
+    min_difference: float = MIN_DIFFERENCE,
+) -> List[Comparison]:
+    """Compare each result that has a baseline entry; results without one are left out."""
+    comparisons = []
+    for result in results:
+        reference = baseline.get(result.key)
+        if reference is None or reference <= 0:
+            continue
+        ratio = result.median_seconds / reference
+        regressed = ratio > threshold and result.median_seconds - reference > min_difference
+        comparisons.append(Comparison(result.key, reference, result.median_seconds, ratio, regressed))
+    return comparisons
@@ -0,0 +1,104 @@
+"""
+Run the benchmark suite offline and compare it against a baseline.
+
+    python benchmarks/run.py                        # quick sweep, all cases
+    python benchmarks/run.py --sizes full --cases 'irt-fit-*'
+    python benchmarks/run.py --save-baseline        # record the current medians
+
+Results are appended to the history file. The exit status is 1 when a case
+is slower than its baseline by more than --threshold (and --min-difference
+seconds).
+"""
+import argparse
+import fnmatch
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Keep the backend's stores out of the working tree and progress bars out of the report
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp(prefix="genmeasure-bench-storage-"))
+os.environ.setdefault("ANALYSIS_CACHE_DIR", tempfile.mkdtemp(prefix="genmeasure-bench-cache-"))
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import harness  # noqa: E402  (sets up sys.path)
+import cases  # noqa: E402,F401  (registers the cases)
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SIZE_SWEEPS = {
+    "quick": ["500x20", "2000x40"],
+    "full": ["1000x20", "5000x50", "20000x100", "100000x100"],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark analysis and simulation hot paths")
+    parser.add_argument("--cases", nargs="+", default=["*"],
+                        help="Case names or glob patterns (default: all). Use --list to see them.")
+    parser.add_argument("--sizes", nargs="+", default=["quick"],
+                        help=f"Sweep name ({', '.join(SIZE_SWEEPS)}) or STUDENTSxITEMS sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case and size, after a warm-up")
+    parser.add_argument("--latency", type=float, default=cases.STUB_LATENCY,
+                        help="Seconds per stubbed LLM request")
+    parser.add_argument("--history", type=Path, default=RESULTS_DIR / "history.jsonl")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline.json")
+    parser.add_argument("--threshold", type=float, default=harness.DEFAULT_THRESHOLD,
+                        help="Slowdown ratio against the baseline that counts as a regression")
+    parser.add_argument("--min-difference", type=float, default=harness.MIN_DIFFERENCE,
+                        help="Seconds a case must slow down by, besides the ratio, to count as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these medians as the baseline")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    return parser.parse_args()
+
+
+def select_cases(patterns):
+    selected = [case for name, case in harness.CASES.items()
+                if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+    if not selected:
+        raise SystemExit(f"No benchmark case matches {' '.join(patterns)}")
+    return selected
+
+
+def select_sizes(specs):
+    sizes = []
+    for spec in specs:
+        for text in SIZE_SWEEPS.get(spec, [spec]):
+            size = harness.Size.parse(text)
+            if size not in sizes:
+                sizes.append(size)
+    return sizes
+
+
+def report(result: harness.Result):
+    throughput = f"{result.throughput:>14,.0f} {result.unit}/s" if result.throughput is not None else ""
+    print(f"{result.key:<36} median {result.median_seconds:9.4f}s  min {result.min_seconds:9.4f}s  {throughput}")
+
+
+def main():
+    args = parse_args()
+    if args.list:
+        print("\n".join(harness.CASES))
+        return 0
+    cases.STUB_LATENCY = args.latency
+
+    results = harness.run_cases(select_cases(args.cases), select_sizes(args.sizes), args.repeat, report)
+    harness.append_history(args.history, results)
+
+    comparisons = harness.compare(
+        results, harness.load_baseline(args.baseline), args.threshold, args.min_difference
+    )
+    regressions = [comparison for comparison in comparisons if comparison.regressed]
+    if comparisons:
+        print(f"\nAgainst {args.baseline} (threshold {args.threshold:.2f}x):")
+        for comparison in comparisons:
+            status = "REGRESSED" if comparison.regressed else "ok"
+            print(f"{comparison.key:<36} {comparison.baseline_seconds:9.4f}s -> "
+                  f"{comparison.median_seconds:9.4f}s  {comparison.ratio:5.2f}x  {status}")
+    if args.save_baseline:
+        harness.save_baseline(args.baseline, results)
+        print(f"\nSaved baseline to {args.baseline}")
+    return 1 if regressions and not args.save_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
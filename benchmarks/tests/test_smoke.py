@@ -0,0 +1,34 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+RUN = Path(__file__).resolve().parent.parent / "run.py"
+
+
+def run_benchmarks(tmp_path, *args):
+    return subprocess.run(
+        [sys.executable, str(RUN), "--cases", "ctt", "--sizes", "50x5", "--repeat", "1",
+         "--history", str(tmp_path / "history.jsonl"), "--baseline", str(tmp_path / "baseline.json"), *args],
+        capture_output=True, text=True, timeout=300,
+    )
+
+
+def test_one_tiny_case_runs_end_to_end(tmp_path):
+    saved = run_benchmarks(tmp_path, "--save-baseline")
+    assert saved.returncode == 0, saved.stderr
+    assert "ctt[50x5]" in saved.stdout
+
+    baseline = json.loads((tmp_path / "baseline.json").read_text())
+    assert list(baseline["median_seconds"]) == ["ctt[50x5]"]
+    history = [json.loads(line) for line in (tmp_path / "history.jsonl").read_text().splitlines()]
+    assert [result["case"] for result in history[0]["results"]] == ["ctt"]
+    assert history[0]["results"][0]["median_seconds"] > 0
+
+    # Against a baseline it cannot match, the run reports a regression and exits 1
+    baseline["median_seconds"]["ctt[50x5]"] = 1e-9
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+    compared = run_benchmarks(tmp_path, "--min-difference", "0")
+    assert compared.returncode == 1, compared.stderr
+    assert "REGRESSED" in compared.stdout
+    assert len((tmp_path / "history.jsonl").read_text().splitlines()) == 2
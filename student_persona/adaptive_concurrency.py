@@ -0,0 +1,81 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RetriesExhausted(Exception):
+    """Raised when every attempt of an API request failed."""
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on the number of in-flight requests to a rate-limited API.
+
+    Every successful request grows the limit by 1/limit (about +1 per round
+    trip). A throttled request (HTTP 429) halves it, and a request whose latency
+    exceeds `latency_tolerance` times the fastest latency seen shrinks it by 10%,
+    since rising latency means requests are queueing at the provider. At most
+    one decrease is applied per round trip so a burst of 429s from the same
+    window only counts once.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 3.0,
+    ):
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._min_latency: Optional[float] = None
+        self._last_decrease = float('-inf')
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def _cond(self) -> asyncio.Condition:
+        # Created lazily so the condition binds to the running loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, throttled: bool = False):
+        async with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.throttle_events += 1
+                self._decrease(now, self.backoff_ratio)
+            else:
+                if self._min_latency is None or latency < self._min_latency:
+                    self._min_latency = latency
+                if latency > self.latency_tolerance * self._min_latency:
+                    self._decrease(now, 0.9)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self, now: float, ratio: float):
+        if now - self._last_decrease < (self._min_latency or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * ratio)
@@ -0,0 +1,124 @@
+import csv
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set, Union
+
+from columnar import csv_to_arrow
+
+CATEGORIES = ("primary", "middle", "undergraduate", "other")
+
+
+def persona_id(persona: dict) -> str:
+    """
+    Stable identifier for a persona record.
+
+    Uses the record's own `id` when present, otherwise a hash of the persona text
+    (PersonaHub rows carry no id of their own).
+    """
+    if persona.get('id') is not None:
+        return str(persona['id'])
+    return hashlib.sha1(persona['persona'].encode('utf-8')).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Append-only, on-disk record of finished persona classifications.
+
+    Every result is appended to a JSONL journal and to the matching
+    `{category}_students.csv` as soon as it is known. The journal is the source of
+    truth: on open, the set of finished ids is rebuilt from it and the CSVs are
+    rewritten from it, so a run killed at any point can be resumed without
+    repeating LLM calls or duplicating CSV rows.
+    """
+
+    def __init__(self, output_dir: Union[str, Path], journal_name: str = 'classified.jsonl'):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.journal_path = self.output_dir / journal_name
+        self.done_ids: Set[str] = set()
+        self.counts: Dict[str, int] = {category: 0 for category in CATEGORIES}
+        self._csv_files: Dict[str, tuple] = {}
+
+        self._recover_journal()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _recover_journal(self):
+        """Load finished ids and rewrite the CSVs from the journal."""
+        if not self.journal_path.exists():
+            return
+
+        good_offset = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in iter(f.readline, b''):
+                if not line.endswith(b'\n'):
+                    # The run died mid-write; drop the partial record
+                    break
+                good_offset += len(line)
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self.done_ids.add(record['id'])
+                self._write_csv_row(record['category'], record['persona'])
+
+        for f, _ in self._csv_files.values():
+            f.flush()
+        if good_offset != self.journal_path.stat().st_size:
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+
+    def _write_csv_row(self, category: str, persona: dict):
+        if category not in self._csv_files:
+            path = self.output_dir / f'{category}_students.csv'
+            f = open(path, 'w', newline='', encoding='utf-8')
+            writer = csv.DictWriter(f, fieldnames=list(persona.keys()), extrasaction='ignore')
+            writer.writeheader()
+            self._csv_files[category] = (f, writer)
+        f, writer = self._csv_files[category]
+        writer.writerow(persona)
+        self.counts[category] += 1
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self.done_ids
+
+    def filter_pending(self, personas: Iterable[dict]) -> Iterator[dict]:
+        """Yield only the personas that have not been classified yet."""
+        for persona in personas:
+            if persona_id(persona) not in self.done_ids:
+                yield persona
+
+    def record(
+        self, persona: dict, category: str, confidence: Optional[float] = None, source: Optional[str] = None
+    ):
+        """
+        Persist one classification result, with the model's confidence when it
+        scored the labels and the source when something other than the LLM
+        (e.g. the prefilter) decided it.
+        """
+        pid = persona_id(persona)
+        if pid in self.done_ids:
+            return
+        entry = {'id': pid, 'category': category, 'persona': persona}
+        if confidence is not None:
+            entry['confidence'] = confidence
+        if source is not None:
+            entry['source'] = source
+        self._journal.write(json.dumps(entry) + '\n')
+        self._journal.flush()
+        self._write_csv_row(category, persona)
+        self._csv_files[category][0].flush()
+        self.done_ids.add(pid)
+
+    def close(self):
+        """Close the journal and CSVs and refresh the columnar (`.arrow`) copies."""
+        self._journal.close()
+        for category, (f, _) in self._csv_files.items():
+            f.close()
+            csv_to_arrow(self.output_dir / f'{category}_students.csv')
+        self._csv_files = {}
+
+    def __enter__(self) -> 'CheckpointStore':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
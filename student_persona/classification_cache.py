@@ -0,0 +1,103 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_persona(text: str) -> str:
+    """Collapse case, whitespace and trailing punctuation so near-duplicates share a key."""
+    return _WHITESPACE.sub(' ', text).strip().rstrip('.!').lower()
+
+
+class ClassificationCache:
+    """
+    Persistent content-addressed cache of persona classifications.
+
+    Entries are keyed on a hash of (normalized persona text, prompt template,
+    model name, temperature), so a cached label is only reused when the exact
+    same question would have been asked of the same model. The cache holds at
+    most `max_entries` labels and evicts the least recently used ones first.
+    It is safe to share between threads.
+    """
+
+    def __init__(self, path: Union[str, Path] = ':memory:', max_entries: int = 1_000_000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS classifications ('
+            'key TEXT PRIMARY KEY, label TEXT NOT NULL, last_used INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_used ON classifications (last_used)')
+        self._size, clock = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM classifications'
+        ).fetchone()
+        # Logical clock for LRU ordering; survives restarts via the stored maximum
+        self._clock = clock
+
+    @staticmethod
+    def make_key(persona: str, prompt_template: str, model: str, temperature: float) -> str:
+        payload = '\x1f'.join([normalize_persona(persona), prompt_template, model, repr(float(temperature))])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT label FROM classifications WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._clock += 1
+            self._conn.execute('UPDATE classifications SET last_used = ? WHERE key = ?', (self._clock, key))
+            return row[0]
+
+    def put(self, key: str, label: str):
+        with self._lock:
+            self._clock += 1
+            inserted = self._conn.execute(
+                'INSERT OR IGNORE INTO classifications (key, label, last_used) VALUES (?, ?, ?)',
+                (key, label, self._clock),
+            ).rowcount
+            if not inserted:
+                self._conn.execute(
+                    'UPDATE classifications SET label = ?, last_used = ? WHERE key = ?',
+                    (label, self._clock, key),
+                )
+                return
+            self._size += 1
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+
+    def _evict(self, count: int):
+        self._conn.execute(
+            'DELETE FROM classifications WHERE key IN '
+            '(SELECT key FROM classifications ORDER BY last_used LIMIT ?)',
+            (count,),
+        )
+        self._size -= count
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self._size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
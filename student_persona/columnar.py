@@ -0,0 +1,43 @@
+import csv
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+
+def csv_to_arrow(csv_path: Union[str, Path]) -> Optional[Path]:
+    """
+    Write an Arrow IPC copy of a persona CSV next to it (`*.arrow`).
+
+    The file is uncompressed so readers can memory-map it without copying.
+    Conversion streams record batches, so memory stays bounded for large files.
+    All columns are stored as strings. Returns None if pyarrow is unavailable.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        return None
+
+    csv_path = Path(csv_path)
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        return None
+
+    arrow_path = csv_path.with_suffix('.arrow')
+    tmp_path = arrow_path.with_name(arrow_path.name + '.tmp')
+    reader = pacsv.open_csv(
+        csv_path,
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            strings_can_be_null=False,
+        ),
+    )
+    with pa.OSFile(str(tmp_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    # Atomic swap so a reader never maps a half-written file
+    os.replace(tmp_path, arrow_path)
+    return arrow_path
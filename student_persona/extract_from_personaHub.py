@@ -1,121 +1,646 @@
+import asyncio
 import json
+import os
+import re
+import time
+from itertools import islice
 from pathlib import Path
 import csv
-from typing import Literal, Union, List
-from openai import OpenAI
+from typing import Any, Callable, Dict, Literal, NamedTuple, Tuple, Union, List, Iterable, Iterator, Optional
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
 # from vllm import LLM, SamplingParams
 import argparse
-from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import numpy as np
+from adaptive_concurrency import AdaptiveConcurrencyLimiter, RetriesExhausted, backoff_delay
+from checkpoint_store import CheckpointStore
+from columnar import csv_to_arrow
+from classification_cache import ClassificationCache
+from prefilter import PREFILTER_SOURCE, KeywordPrefilter, PersonaPrefilter, TfidfPrefilter, load_labelled_personas
 
 StudentType = Literal["primary", "middle", "undergraduate", "other"]
+STUDENT_TYPES: List[StudentType] = ["primary", "middle", "undergraduate", "other"]
+
+PROMPT_TEMPLATE = """Analyze the following persona description and determine if they are a primary school student, middle school student, undergraduate student, or other. 
+Only respond with one of these exact words: "primary", "middle", "undergraduate", "other".
+
+Persona: {persona}"""
+
+# Ends on "Answer:" so the label is the very next token, for logprob scoring
+SCORING_PROMPT_TEMPLATE = PROMPT_TEMPLATE + "\n\nAnswer:"
+
+BATCH_PROMPT_TEMPLATE = """For each numbered persona description below, determine if they are a primary school student, middle school student, undergraduate student, or other.
+Respond with only a JSON array containing one object per persona, in the same order, of the form {{"index": <persona number>, "label": <label>}}, where <label> is one of these exact words: "primary", "middle", "undergraduate", "other".
+
+Personas:
+{personas}"""
+
+# Completion budget per persona in a batched request; one {"index": n, "label": "..."} entry
+BATCH_TOKENS_PER_PERSONA = 16
+
+DEFAULT_PERSONA_PATH = '/data/home/jjl7137/PersonalHub/persona.jsonl'
+
+
+# Errors worth another attempt; a ValueError means the reply could not be parsed
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError, ValueError)
+
+
+def retry_delay(attempt: int, last_error: Optional[Exception]) -> float:
+    """Jittered backoff before retry `attempt` (1-based), at least any Retry-After of a 429."""
+    delay = backoff_delay(attempt - 1)
+    retry_after = getattr(getattr(last_error, 'response', None), 'headers', {}).get('retry-after')
+    if isinstance(last_error, openai.RateLimitError) and retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def parse_student_type(content: str) -> StudentType:
+    response = content.strip().lower()
+    if response not in STUDENT_TYPES:
+        raise ValueError(f"Invalid response: {response}")
+    return response
+
+
+_JSON_OBJECT = re.compile(r'\{[^{}]*\}')
+
+
+def parse_batch_labels(content: str, num_personas: int) -> Dict[int, StudentType]:
+    """
+    Extract the valid {index: label} pairs from a batched classification reply.
+
+    Indices are 1-based and must fall within the batch. An index that appears
+    with conflicting labels is dropped. If the reply is not a well-formed array
+    (for example because it was cut off), every complete object in it is still
+    used.
+    """
+    try:
+        entries = json.loads(content.strip().removeprefix('```json').strip('`'))
+        if not isinstance(entries, list):
+            entries = []
+    except json.JSONDecodeError:
+        entries = []
+        for match in _JSON_OBJECT.findall(content):
+            try:
+                entries.append(json.loads(match))
+            except json.JSONDecodeError:
+                continue
+    
+    labels: Dict[int, Optional[StudentType]] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        index, label = entry.get('index'), str(entry.get('label', '')).strip().lower()
+        if not isinstance(index, int) or not 1 <= index <= num_personas or label not in STUDENT_TYPES:
+            continue
+        labels[index] = label if labels.get(index, label) == label else None
+    return {index: label for index, label in labels.items() if label is not None}
+
+
+def iter_persona_lines(path: Union[str, Path], shard_index: int = 0, num_shards: int = 1) -> Iterator[bytes]:
+    """
+    Yield the raw lines of one shard of a JSONL file.
+
+    The file is split into `num_shards` contiguous byte ranges; a line belongs to
+    the shard its first byte falls into, so shards are disjoint and together
+    cover every line. Only one line is held in memory at a time.
+    """
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        start = size * shard_index // num_shards
+        end = size * (shard_index + 1) // num_shards
+        if start > 0:
+            # Align to the first line that starts inside this shard
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line
+
+
+def iter_personas(
+    path: Union[str, Path],
+    offset: int = 0,
+    limit: Optional[int] = None,
+    shard_index: int = 0,
+    num_shards: int = 1,
+) -> Iterator[dict]:
+    """
+    Lazily parse personas from a PersonaHub JSONL file.
+
+    `offset` and `limit` count non-empty lines within the selected shard. Lines
+    outside the window are never decoded.
+    """
+    lines = (line for line in iter_persona_lines(path, shard_index, num_shards) if line.strip())
+    stop = offset + limit if limit is not None else None
+    for line in islice(lines, offset, stop):
+        yield json.loads(line)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def route_prefiltered(
+    prefilter: Optional[PersonaPrefilter],
+    persona_ls: Iterable[dict],
+    categories: dict[StudentType, List[dict]],
+    store: Optional[CheckpointStore] = None,
+) -> List[dict]:
+    """Record the personas the prefilter can decide and return the ones that still need the LLM."""
+    if store is not None:
+        persona_ls = store.filter_pending(persona_ls)
+    persona_ls = list(persona_ls)
+    if prefilter is None:
+        return persona_ls
+    
+    decided, pending = prefilter.route(persona_ls)
+    for persona, student_type in decided:
+        categories[student_type].append(persona)
+        if store is not None:
+            store.record(persona, student_type, source=PREFILTER_SOURCE)
+    return pending
+
+
+class ScoredLabel(NamedTuple):
+    label: StudentType
+    confidence: float
+    probabilities: Dict[StudentType, float]
+
+
+def label_token_ids(tokenizer) -> Dict[StudentType, List[int]]:
+    """Tokens of each label as the model would write it after "Answer:"."""
+    return {label: tokenizer.encode(f" {label}", add_special_tokens=False) for label in STUDENT_TYPES}
+
+
+def label_logprob(prompt_logprobs: list, token_ids: List[int]) -> float:
+    """
+    Log probability of a prompt ending in `token_ids`, summed over those
+    tokens; -inf if any of them is missing from `prompt_logprobs`.
+    """
+    total = 0.0
+    for position, token_id in zip(prompt_logprobs[-len(token_ids):], token_ids):
+        if not position or token_id not in position:
+            return -np.inf
+        total += position[token_id].logprob
+    return total
+
 
 class LocalLLM:
-    def __init__(self, model_path: str, batch_size: int = 32):
-        self.llm = LLM(model=model_path)
+    """
+    Classifies personas with a local vLLM model.
+
+    mode="generate" decodes a short free-text answer and string-matches it
+    against the labels. mode="score" appends each label to the prompt and
+    reads the log probability of its tokens from the prompt logprobs, so every
+    persona gets a valid label and a confidence. The prompts of one persona
+    share everything up to the label, which prefix caching computes once.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        batch_size: int = 32,
+        cache: Optional[ClassificationCache] = None,
+        mode: Literal["generate", "score"] = "generate",
+        prefilter: Optional[PersonaPrefilter] = None,
+    ):
+        if mode not in ("generate", "score"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.llm = LLM(model=model_path, enable_prefix_caching=mode == "score")
+        self.model = model_path
         self.batch_size = batch_size
+        self.cache = cache
+        self.mode = mode
+        self.prefilter = prefilter
         self.sampling_params = SamplingParams(
             temperature=0,
             max_tokens=10,
             stop=None
         )
+        if mode == "score":
+            self.prompt_template = SCORING_PROMPT_TEMPLATE
+            self.tokenizer = self.llm.get_tokenizer()
+            self.label_token_ids = label_token_ids(self.tokenizer)
+            # prompt_logprobs=0 returns the logprob of each prompt token itself
+            self.scoring_params = SamplingParams(temperature=0, max_tokens=1, prompt_logprobs=0)
+        else:
+            self.prompt_template = PROMPT_TEMPLATE
 
-    def analyze_student_types_batch(self, personas: List[str]) -> List[StudentType]:
-        prompts = [
-            f"""Analyze the following persona description and determine if they are a primary school student, middle school student, undergraduate student, or other. 
-            Only respond with one of these exact words: "primary", "middle", "undergraduate", "other".
-            
-            Persona: {persona}"""
-            for persona in personas
-        ]
+    def analyze_student_types_scored(self, personas: List[str]) -> List[ScoredLabel]:
+        """
+        Score every label for each persona, one prompt per label.
+
+        Probabilities are renormalised over the labels. A label whose tokens are
+        missing from the prompt logprobs gets probability 0; if that holds for
+        every label the persona falls back to "other" with confidence 0.
+        """
+        if self.mode != "score":
+            raise RuntimeError("analyze_student_types_scored requires mode='score'")
+        token_ids = list(self.label_token_ids.values())
+        prompts = []
+        for persona in personas:
+            prefix = self.tokenizer.encode(self.prompt_template.format(persona=persona))
+            prompts.extend({"prompt_token_ids": prefix + label_ids} for label_ids in token_ids)
+        outputs = self.llm.generate(prompts, self.scoring_params)
         
+        results = []
+        for start in range(0, len(outputs), len(token_ids)):
+            scores = np.array([
+                label_logprob(output.prompt_logprobs, label_ids)
+                for output, label_ids in zip(outputs[start:start + len(token_ids)], token_ids)
+            ])
+            if not np.isfinite(scores).any():
+                results.append(ScoredLabel(
+                    label="other", confidence=0.0, probabilities={label: 0.0 for label in STUDENT_TYPES}
+                ))
+                continue
+            probs = np.exp(scores - scores.max())
+            probs /= probs.sum()
+            best = int(probs.argmax())
+            results.append(ScoredLabel(
+                label=STUDENT_TYPES[best],
+                confidence=float(probs[best]),
+                probabilities={label: float(p) for label, p in zip(STUDENT_TYPES, probs)},
+            ))
+        return results
+
+    def _generate_labels(self, personas: List[str]) -> List[Optional[StudentType]]:
+        prompts = [self.prompt_template.format(persona=persona) for persona in personas]
         outputs = self.llm.generate(prompts, self.sampling_params)
         results = []
         for output in outputs:
             response = output.outputs[0].text.strip().lower()
-            if response not in ["primary", "middle", "undergraduate", "other"]:
+            if response not in STUDENT_TYPES:
                 print(f"Warning: Invalid response '{response}', defaulting to 'other'")
-                response = "other"
+                response = None
             results.append(response)
         return results
 
-    def process_all_personas(self, persona_ls: List[dict]) -> dict[StudentType, List[dict]]:
+    def analyze_student_types_batch(self, personas: List[str]) -> List[StudentType]:
+        return self._classify_batch(personas)[0]
+
+    def _classify_batch(self, personas: List[str]) -> Tuple[List[StudentType], List[Optional[float]]]:
+        """Labels and, for personas scored in this call, their confidence."""
+        results: List[Optional[StudentType]] = [None] * len(personas)
+        confidences: List[Optional[float]] = [None] * len(personas)
+        keys = [None] * len(personas)
+        if self.cache is not None:
+            for i, persona in enumerate(personas):
+                keys[i] = self.cache.make_key(persona, self.prompt_template, self.model, self.sampling_params.temperature)
+                results[i] = self.cache.get(keys[i])
+        
+        # Only send cache misses to the model
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results, confidences
+        pending_personas = [personas[i] for i in pending]
+        if self.mode == "score":
+            scored = self.analyze_student_types_scored(pending_personas)
+            labels = [label.label for label in scored]
+            for i, label in zip(pending, scored):
+                confidences[i] = label.confidence
+        else:
+            labels = self._generate_labels(pending_personas)
+        
+        for i, label in zip(pending, labels):
+            if label is None:
+                label = "other"
+            elif self.cache is not None:
+                self.cache.put(keys[i], label)
+            results[i] = label
+        return results, confidences
+
+    def process_all_personas(
+        self, persona_ls: Iterable[dict], store: Optional[CheckpointStore] = None
+    ) -> dict[StudentType, List[dict]]:
         categories: dict[StudentType, List[dict]] = {
             "primary": [], "middle": [], "undergraduate": [], "other": []
         }
-        
-        # Process in batches
-        persona_batches = [
-            persona_ls[i:i + self.batch_size] 
-            for i in range(0, len(persona_ls), self.batch_size)
-        ]
+        persona_ls = route_prefiltered(self.prefilter, persona_ls, categories, store)
         
         with tqdm(total=len(persona_ls), desc="Processing personas (Local LLM)") as pbar:
-            for batch in persona_batches:
+            # Process in batches
+            for batch in chunked(persona_ls, self.batch_size):
                 persona_texts = [p['persona'] for p in batch]
-                results = self.analyze_student_types_batch(persona_texts)
+                results, confidences = self._classify_batch(persona_texts)
                 
-                for persona, student_type in zip(batch, results):
+                for persona, student_type, confidence in zip(batch, results, confidences):
                     categories[student_type].append(persona)
+                    if store is not None:
+                        store.record(persona, student_type, confidence=confidence)
                 pbar.update(len(batch))
         
         return categories
 
 class DeepSeekLLM:
-    def __init__(self, api_key: str, base_url: str, max_workers: int = 10):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        max_workers: int = 10,
+        cache: Optional[ClassificationCache] = None,
+        model: str = "deepseek-chat",
+        temperature: float = 0.2,
+        max_concurrency: int = 64,
+        max_retries: int = 5,
+        timeout: float = 60.0,
+        batch_size: int = 1,
+        prefilter: Optional[PersonaPrefilter] = None,
+    ):
+        # Retries are handled by _chat/_chat_async
         self.client = OpenAI(
             base_url=base_url,
-            api_key=api_key
+            api_key=api_key,
+            max_retries=0
         )
+        self.api_key = api_key
+        self.base_url = base_url
+        # max_workers is the starting concurrency; the limiter adapts it between
+        # 1 and max_concurrency and the learned value carries over between calls
         self.max_workers = max_workers
+        self.max_concurrency = max(max_concurrency, max_workers)
+        self.concurrency_limit = float(max_workers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.cache = cache
+        self.model = model
+        self.temperature = temperature
+        # Personas classified per chat completion; 1 disables batched prompts
+        self.batch_size = max(1, batch_size)
+        self.batch_fallbacks = 0
+        self.prefilter = prefilter
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'personas': 0}
 
-    def analyze_student_type(self, persona: str) -> StudentType:
-        prompt = """Analyze the following persona description and determine if they are a primary school student, middle school student, undergraduate student, or other. 
-        Only respond with one of these exact words: "primary", "middle", "undergraduate", "other".
-        
-        Persona: {persona}"""
+    def _messages(self, persona: str) -> List[dict]:
+        return [{"role": "user", "content": PROMPT_TEMPLATE.format(persona=persona)}]
+
+    def analyze_student_type(self, persona: str) -> Optional[StudentType]:
+        """
+        Classify one persona with blocking requests.
+
+        Returns None if the API kept failing, like `analyze_student_type_async`,
+        so callers can leave the persona unrecorded.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(persona, PROMPT_TEMPLATE, self.model, self.temperature)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
         
         try:
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[{"role": "user", "content": prompt.format(persona=persona)}],
-                temperature=0.2,
-                max_tokens=10
-            )
-            response = response.choices[0].message.content.strip().lower()
-            if response not in ["primary", "middle", "undergraduate", "other"]:
-                raise ValueError(f"Invalid response: {response}")
-            return response
-        except ValueError as e:
+            response = self._chat(self._messages(persona), 10, parse_student_type)
+        except RetriesExhausted as e:
+            if isinstance(e.__cause__, ValueError):
+                print(f"Warning: {e}, defaulting to 'other'")
+                return "other"
             print(f"Error processing persona: {e}")
-            self.analyze_student_type(persona)
+            return None
+        
+        if self.cache is not None:
+            self.cache.put(key, response)
+        return response
+
+    def _chat(self, messages: List[dict], max_tokens: int, parse: Callable[[str], Any], personas: int = 1) -> Any:
+        """Blocking counterpart of `_chat_async`, without the concurrency limiter."""
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(retry_delay(attempt, last_error))
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=max_tokens
+                )
+                self._record_usage(response, personas)
+                return parse(response.choices[0].message.content)
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+        
+        raise RetriesExhausted(f"{self.max_retries + 1} attempts failed: {last_error}") from last_error
+
+    def _record_usage(self, response, personas: int):
+        usage = getattr(response, 'usage', None)
+        for field in ('prompt_tokens', 'completion_tokens'):
+            tokens = getattr(usage, field, None)
+            if isinstance(tokens, int):
+                self.usage[field] += tokens
+        self.usage['requests'] += 1
+        self.usage['personas'] += personas
+
+    def tokens_per_persona(self) -> Dict[str, float]:
+        """Average prompt/completion tokens spent per persona sent to the API."""
+        personas = self.usage['personas'] or 1
+        return {
+            'prompt': self.usage['prompt_tokens'] / personas,
+            'completion': self.usage['completion_tokens'] / personas,
+            'total': (self.usage['prompt_tokens'] + self.usage['completion_tokens']) / personas,
+        }
+
+    async def _chat_async(
+        self,
+        client: AsyncOpenAI,
+        limiter: AdaptiveConcurrencyLimiter,
+        messages: List[dict],
+        max_tokens: int,
+        parse: Callable[[str], Any],
+        personas: int = 1,
+    ) -> Any:
+        """
+        Send one chat completion with bounded, jittered retries and return
+        `parse(content)`. A ValueError from `parse` is retried like a transient
+        API error. Raises RetriesExhausted once every attempt has failed; errors
+        that retrying cannot fix (authentication, bad request) are raised as is.
+        """
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(retry_delay(attempt, last_error))
             
-        except Exception as e:
+            await limiter.acquire()
+            started = time.monotonic()
+            throttled = False
+            try:
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=max_tokens
+                )
+                self._record_usage(response, personas)
+                return parse(response.choices[0].message.content)
+            except RETRYABLE_ERRORS as e:
+                throttled = isinstance(e, openai.RateLimitError)
+                last_error = e
+            finally:
+                await limiter.release(time.monotonic() - started, throttled=throttled)
+        
+        raise RetriesExhausted(f"{self.max_retries + 1} attempts failed: {last_error}") from last_error
+
+    async def analyze_student_type_async(
+        self, client: AsyncOpenAI, limiter: AdaptiveConcurrencyLimiter, persona: str
+    ) -> Optional[StudentType]:
+        """
+        Classify one persona.
+
+        Returns None if the API kept failing, so the persona is left unrecorded
+        and picked up again on the next run.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(persona, PROMPT_TEMPLATE, self.model, self.temperature)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        try:
+            response = await self._chat_async(client, limiter, self._messages(persona), 10, parse_student_type)
+        except RetriesExhausted as e:
+            if isinstance(e.__cause__, ValueError):
+                print(f"Warning: {e}, defaulting to 'other'")
+                return "other"
             print(f"Error processing persona: {e}")
-            return "other"
+            return None
+        
+        if self.cache is not None:
+            self.cache.put(key, response)
+        return response
+
+    async def analyze_student_types_batch_async(
+        self, client: AsyncOpenAI, limiter: AdaptiveConcurrencyLimiter, personas: List[str]
+    ) -> List[Optional[StudentType]]:
+        """
+        Classify several personas with a single chat completion.
+
+        The model answers with a JSON array of {"index", "label"} objects. Entries
+        that are missing, duplicated or carry an unknown label are re-asked one
+        persona at a time, so a partially garbled reply only costs the
+        affected personas.
+        """
+        results: List[Optional[StudentType]] = [None] * len(personas)
+        keys = [None] * len(personas)
+        if self.cache is not None:
+            for i, persona in enumerate(personas):
+                keys[i] = self.cache.make_key(persona, BATCH_PROMPT_TEMPLATE, self.model, self.temperature)
+                results[i] = self.cache.get(keys[i])
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        if len(pending) > 1:
+            prompt = BATCH_PROMPT_TEMPLATE.format(
+                personas="\n".join(f"{n}. {' '.join(personas[i].split())}" for n, i in enumerate(pending, 1))
+            )
+            try:
+                labels = await self._chat_async(
+                    client,
+                    limiter,
+                    [{"role": "user", "content": prompt}],
+                    max_tokens=BATCH_TOKENS_PER_PERSONA * len(pending) + 16,
+                    parse=lambda content: parse_batch_labels(content, len(pending)),
+                    personas=len(pending),
+                )
+            except RetriesExhausted as e:
+                print(f"Error processing persona batch: {e}")
+                labels = {}
+            for n, i in enumerate(pending, 1):
+                if n in labels:
+                    results[i] = labels[n]
+                    if self.cache is not None:
+                        self.cache.put(keys[i], labels[n])
+        
+        # Fall back to one request per persona for whatever the batch missed
+        fallback = [i for i, result in enumerate(results) if result is None]
+        self.batch_fallbacks += len(fallback) if len(pending) > 1 else 0
+        singles = await asyncio.gather(
+            *(self.analyze_student_type_async(client, limiter, personas[i]) for i in fallback)
+        )
+        for i, result in zip(fallback, singles):
+            results[i] = result
+        return results
 
+    def _async_client(self) -> AsyncOpenAI:
+        # One pooled HTTP client shared by every in-flight request
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            timeout=self.timeout,
+        )
+        return AsyncOpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=0, http_client=http_client)
 
-    def process_all_personas(self, persona_ls: List[dict]) -> dict[StudentType, List[dict]]:
+    async def process_all_personas_async(
+        self, persona_ls: Iterable[dict], store: Optional[CheckpointStore] = None
+    ) -> dict[StudentType, List[dict]]:
         categories: dict[StudentType, List[dict]] = {
             "primary": [], "middle": [], "undergraduate": [], "other": []
         }
+        persona_ls = route_prefiltered(self.prefilter, persona_ls, categories, store)
+        
+        limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=round(self.concurrency_limit),
+            max_limit=self.max_concurrency,
+        )
         
-        def process_single_persona(persona):
-            student_type = self.analyze_student_type(persona['persona'])
-            return persona, student_type
+        async def process_batch(batch):
+            if len(batch) == 1:
+                results = [await self.analyze_student_type_async(client, limiter, batch[0]['persona'])]
+            else:
+                results = await self.analyze_student_types_batch_async(client, limiter, [p['persona'] for p in batch])
+            return batch, results
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = [executor.submit(process_single_persona, persona) for persona in persona_ls]
-            
-            with tqdm(total=len(persona_ls), desc="Processing personas (DeepSeek)") as pbar:
-                for future in futures:
-                    persona, student_type = future.result()
-                    categories[student_type].append(persona)
-                    pbar.update(1)
+        failed = 0
+        async with self._async_client() as client:
+            tasks = [asyncio.ensure_future(process_batch(batch)) for batch in chunked(persona_ls, self.batch_size)]
+            try:
+                with tqdm(total=len(persona_ls), desc="Processing personas (DeepSeek)") as pbar:
+                    # Consume in completion order so a slow request holds up nothing
+                    for next_done in asyncio.as_completed(tasks):
+                        batch, results = await next_done
+                        for persona, student_type in zip(batch, results):
+                            if student_type is None:
+                                failed += 1
+                                continue
+                            categories[student_type].append(persona)
+                            if store is not None:
+                                store.record(persona, student_type)
+                        pbar.update(len(batch))
+                        pbar.set_postfix(
+                            concurrency=int(limiter.limit),
+                            throttled=limiter.throttle_events,
+                            tokens_per_persona=round(self.tokens_per_persona()['total'], 1),
+                        )
+            finally:
+                for task in tasks:
+                    task.cancel()
+                self.concurrency_limit = limiter.limit
         
+        if failed:
+            print(f"Warning: {failed} personas failed after retries and were left unclassified")
         return categories
 
+    def process_all_personas(
+        self, persona_ls: Iterable[dict], store: Optional[CheckpointStore] = None
+    ) -> dict[StudentType, List[dict]]:
+        return asyncio.run(self.process_all_personas_async(persona_ls, store=store))
+
 def save_categories(categories: dict[StudentType, List[dict]], output_dir: Path):
     for category, personas in categories.items():
         if not personas:  # Skip empty categories
@@ -126,6 +651,7 @@ def save_categories(categories: dict[StudentType, List[dict]], output_dir: Path)
             writer = csv.DictWriter(f, fieldnames=personas[0].keys())
             writer.writeheader()
             writer.writerows(personas)
+        csv_to_arrow(output_path)
         
         print(f"Saved {len(personas)} {category} student personas to {output_path}")
 
@@ -138,32 +664,119 @@ def main():
     parser.add_argument('--deepseek-base-url', type=str, default='https://api.deepseek.com/v1',
                         help='DeepSeek API base URL')
     parser.add_argument('--batch-size', type=int, default=32, help='Batch size for local LLM processing')
-    parser.add_argument('--max-workers', type=int, default=10, help='Max workers for DeepSeek API calls')
+    parser.add_argument('--local-mode', choices=['generate', 'score'], default='generate',
+                        help='Local LLM classification: free generation or single-token label scoring')
+    parser.add_argument('--max-workers', type=int, default=10,
+                        help='Initial number of concurrent DeepSeek API requests')
+    parser.add_argument('--max-concurrency', type=int, default=64,
+                        help='Upper bound for the adaptive DeepSeek request concurrency')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries per DeepSeek request')
+    parser.add_argument('--personas-per-request', type=int, default=1,
+                        help='Number of personas classified per DeepSeek chat completion')
+    parser.add_argument('--input', type=Path, default=Path(DEFAULT_PERSONA_PATH),
+                        help='Path to PersonaHub persona.jsonl')
+    parser.add_argument('--output-dir', type=Path, default=Path(__file__).parent,
+                        help='Directory to write the per-category CSV files and checkpoint journal to '
+                             '(use a separate directory per shard)')
+    parser.add_argument('--offset', type=int, default=0, help='Number of personas to skip')
+    parser.add_argument('--limit', type=int, default=10000,
+                        help='Maximum number of personas to process (0 for no limit)')
+    parser.add_argument('--num-shards', type=int, default=1, help='Split the input into this many line ranges')
+    parser.add_argument('--shard-index', type=int, default=0, help='Which line range of the input to process')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='Number of personas handed to the model per process_all_personas call')
+    parser.add_argument('--cache-path', type=Path, default=None,
+                        help='Classification cache database (default: <output-dir>/classification_cache.sqlite)')
+    parser.add_argument('--cache-size', type=int, default=1_000_000,
+                        help='Maximum number of cached classifications')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the classification cache')
+    parser.add_argument('--prefilter', choices=['none', 'keyword', 'tfidf', 'both'], default='none',
+                        help='Route obvious personas without an LLM call')
+    parser.add_argument('--prefilter-keyword-min-matches', type=int, default=1,
+                        help='Distinct adult roles a persona must name for the keyword tier to route it to "other"')
+    parser.add_argument('--prefilter-training-dir', type=Path, default=None,
+                        help='Labelled output of an earlier run to train the tfidf tier on (default: --output-dir)')
+    parser.add_argument('--prefilter-other-threshold', type=float, default=0.9,
+                        help='Minimum tfidf probability to route a persona to "other"')
+    parser.add_argument('--prefilter-student-threshold', type=float, default=0.97,
+                        help='Minimum tfidf probability to route a persona to a student category')
     args = parser.parse_args()
 
-    # Load personas
-    with open( '/data/home/jjl7137/PersonalHub/persona.jsonl', 'r', encoding='utf-8') as f:
-        persona_ls = []
-        for line in f.readlines():
-            persona_ls.append(json.loads(line))
+    # Stream personas lazily instead of loading the whole file
+    persona_stream = iter_personas(
+        args.input,
+        offset=args.offset,
+        limit=args.limit or None,
+        shard_index=args.shard_index,
+        num_shards=args.num_shards,
+    )
+    
+    cache = None
+    if not args.no_cache:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        cache = ClassificationCache(
+            args.cache_path or args.output_dir / 'classification_cache.sqlite',
+            max_entries=args.cache_size,
+        )
     
-    persona_ls = persona_ls[:10000]
+    prefilter = None
+    if args.prefilter != 'none':
+        tiers = []
+        if args.prefilter in ('keyword', 'both'):
+            tiers.append(KeywordPrefilter(min_matches=args.prefilter_keyword_min_matches))
+        if args.prefilter in ('tfidf', 'both'):
+            texts, labels = load_labelled_personas(args.prefilter_training_dir or args.output_dir)
+            if len(set(labels)) < 2:
+                raise ValueError("The tfidf prefilter needs labelled personas from at least two categories")
+            tiers.append(TfidfPrefilter(thresholds={
+                'other': args.prefilter_other_threshold,
+                'primary': args.prefilter_student_threshold,
+                'middle': args.prefilter_student_threshold,
+                'undergraduate': args.prefilter_student_threshold,
+            }).fit(texts, labels))
+            print(f"Trained tfidf prefilter on {len(texts)} labelled personas")
+        prefilter = PersonaPrefilter(tiers)
     
     # Initialize LLM
     if args.use_local:
         print(f"Using local Llama model: {args.model_path}")
-        llm = LocalLLM(args.model_path, batch_size=args.batch_size)
+        llm = LocalLLM(args.model_path, batch_size=args.batch_size, cache=cache, mode=args.local_mode,
+                       prefilter=prefilter)
     else:
         if not args.deepseek_api_key:
             raise ValueError("DeepSeek API key is required when not using local model")
         print("Using DeepSeek API")
-        llm = DeepSeekLLM(args.deepseek_api_key, args.deepseek_base_url, max_workers=args.max_workers)
+        llm = DeepSeekLLM(
+            args.deepseek_api_key,
+            args.deepseek_base_url,
+            max_workers=args.max_workers,
+            cache=cache,
+            max_concurrency=args.max_concurrency,
+            max_retries=args.max_retries,
+            batch_size=args.personas_per_request,
+            prefilter=prefilter,
+        )
+    
+    # Process personas in bounded chunks. Results are checkpointed as they arrive,
+    # so re-running the same command resumes where the previous run stopped.
+    with CheckpointStore(args.output_dir) as store:
+        if store.done_ids:
+            print(f"Resuming: {len(store.done_ids)} personas already classified")
+        for chunk in chunked(persona_stream, args.chunk_size):
+            llm.process_all_personas(chunk, store=store)
     
-    # Process personas
-    categories = llm.process_all_personas(persona_ls)
+        for category, count in store.counts.items():
+            if count:
+                print(f"Saved {count} {category} student personas to {args.output_dir / f'{category}_students.csv'}")
     
-    # Save results
-    save_categories(categories, Path(__file__).parent)
+    if prefilter is not None:
+        print(f"Prefilter: {prefilter.summary()}")
+    if isinstance(llm, DeepSeekLLM):
+        print(f"API usage: {llm.usage}, tokens per persona: {llm.tokens_per_persona()}, "
+              f"batch fallbacks: {llm.batch_fallbacks}")
+    if cache is not None:
+        print(f"Classification cache: {cache.stats()}")
+        cache.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,182 @@
+import csv
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from checkpoint_store import CATEGORIES
+
+# Anything that hints at a learner keeps the persona away from the keyword tier
+STUDENT_PATTERN = re.compile(
+    r"\b(students?|pupils?|school(child|children|boy|girl|kid|kids)?|kids?|child(ren)?|boys?|girls?|"
+    r"sons?|daughters?|teens?|teenagers?|teenaged|adolescents?|freshm[ae]n|sophomores?|juniors?|"
+    r"seniors?|undergrad(uate)?s?|graders?|grade|year[- ]old|majors?|majoring|college|university|"
+    r"campus|classmates?|learners?|young|youth|minor|scholars?|aspiring|novice|enrolled|studying)\b",
+    re.IGNORECASE,
+)
+
+# Adult roles that settle the question on their own
+NON_STUDENT_PATTERN = re.compile(
+    r"\b(retired|retiree|ceo|cfo|cto|coo|executive|manager|engineer|lawyer|attorney|judge|doctor|"
+    r"physician|surgeon|nurse|dentist|pharmacist|professor|teacher|lecturer|instructor|researcher|"
+    r"scientist|analyst|consultant|entrepreneur|founder|journalist|reporter|editor|politician|"
+    r"senator|diplomat|veteran|soldier|officer|grand(parent|mother|father|ma|pa)|parent|mother|"
+    r"father|husband|wife|owner|director|librarian|pastor|priest|accountant|architect|farmer|"
+    r"chef|historian|economist|therapist|psychologist|designer|developer|programmer|artist|"
+    r"musician|writer|author|novelist|photographer|coach|investor|banker|curator|technician|"
+    r"mechanic|electrician|plumber|pilot|activist|advocate|specialist|expert|official|"
+    r"administrator|supervisor|employee|worker|professional)s?\b",
+    re.IGNORECASE,
+)
+
+# Journal `source` of the personas routed by a prefilter tier rather than the LLM
+PREFILTER_SOURCE = "prefilter"
+
+DEFAULT_THRESHOLDS: Dict[str, float] = {
+    "primary": 0.97,
+    "middle": 0.97,
+    "undergraduate": 0.97,
+    "other": 0.9,
+}
+
+
+class KeywordPrefilter:
+    """
+    Regex tier: a persona that names at least `min_matches` distinct adult
+    roles and nothing student-like is routed to "other" without an LLM call.
+    Everything else is ambiguous. Raising `min_matches` trades fewer
+    short-circuits for fewer misrouted personas.
+    """
+
+    tier = "keyword"
+
+    def __init__(self, min_matches: int = 1):
+        if min_matches < 1:
+            raise ValueError(f"min_matches must be at least 1, got {min_matches}")
+        self.min_matches = min_matches
+
+    def predict(self, texts: List[str]) -> List[Optional[str]]:
+        return [
+            "other" if not STUDENT_PATTERN.search(text) and self._roles(text) >= self.min_matches else None
+            for text in texts
+        ]
+
+    @staticmethod
+    def _roles(text: str) -> int:
+        return len({match.group(1).lower() for match in NON_STUDENT_PATTERN.finditer(text)})
+
+
+class TfidfPrefilter:
+    """
+    TF-IDF + logistic-regression tier trained on previously labelled personas.
+
+    A prediction is only accepted when its probability reaches the threshold
+    configured for that label; the rest is left to the LLM.
+    """
+
+    tier = "tfidf"
+
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.pipeline = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), min_df=2, sublinear_tf=True),
+            LogisticRegression(max_iter=1000, class_weight="balanced"),
+        )
+
+    def fit(self, texts: List[str], labels: List[str]) -> "TfidfPrefilter":
+        self.pipeline.fit(texts, labels)
+        return self
+
+    def predict(self, texts: List[str]) -> List[Optional[str]]:
+        if not texts:
+            return []
+        probs = self.pipeline.predict_proba(texts)
+        classes = self.pipeline.classes_
+        best = probs.argmax(axis=1)
+        return [
+            str(classes[b]) if probs[i, b] >= self.thresholds.get(classes[b], 1.0) else None
+            for i, b in enumerate(best)
+        ]
+
+
+def load_labelled_personas(directory: Union[str, Path]) -> Tuple[List[str], List[str]]:
+    """
+    Load (text, label) training pairs from an earlier run's output.
+
+    Prefers the checkpoint journal, skipping the personas the prefilter itself
+    decided so the tfidf tier never learns from its own labels. Falls back to
+    the per-category CSVs (`{category}_students.csv`, and `others.csv` for
+    "other"), which cannot tell the two apart.
+    """
+    directory = Path(directory)
+    texts: List[str] = []
+    labels: List[str] = []
+
+    journal = directory / "classified.jsonl"
+    if journal.exists():
+        with open(journal, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("source") == PREFILTER_SOURCE:
+                    continue
+                texts.append(record["persona"]["persona"])
+                labels.append(record["category"])
+        return texts, labels
+
+    for category in CATEGORIES:
+        candidates = [f"{category}_students.csv"] + (["others.csv"] if category == "other" else [])
+        path = next((directory / name for name in candidates if (directory / name).exists()), None)
+        if path is None:
+            continue
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                texts.append(row["persona"])
+                labels.append(category)
+    return texts, labels
+
+
+class PersonaPrefilter:
+    """
+    Cheap routing stage in front of the LLM classifiers.
+
+    Tiers are tried in order; the first one that is confident decides the
+    persona. `stats` counts how many personas each tier short-circuited.
+    """
+
+    def __init__(self, tiers: Iterable):
+        self.tiers = list(tiers)
+        self.stats: Counter = Counter()
+
+    def route(self, personas: List[dict]) -> Tuple[List[Tuple[dict, str]], List[dict]]:
+        """Split personas into (persona, label) decided here and the ones left for the LLM."""
+        decided: List[Tuple[dict, str]] = []
+        pending = list(personas)
+        self.stats["total"] += len(pending)
+        for tier in self.tiers:
+            if not pending:
+                break
+            labels = tier.predict([p["persona"] for p in pending])
+            remaining = []
+            for persona, label in zip(pending, labels):
+                if label is None:
+                    remaining.append(persona)
+                else:
+                    decided.append((persona, label))
+                    self.stats[f"{tier.tier}:{label}"] += 1
+            pending = remaining
+        self.stats["llm"] += len(pending)
+        return decided, pending
+
+    def summary(self) -> Dict[str, float]:
+        total = self.stats["total"]
+        summary = dict(self.stats)
+        summary["short_circuit_rate"] = (total - self.stats["llm"]) / total if total else 0.0
+        return summary
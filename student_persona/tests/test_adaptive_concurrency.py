@@ -0,0 +1,81 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+from adaptive_concurrency import AdaptiveConcurrencyLimiter, backoff_delay
+
+def test_backoff_delay_is_bounded():
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base=0.5, cap=4.0)
+        assert 0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+
+def test_additive_increase():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=5)
+
+    async def run():
+        for _ in range(40):
+            await limiter.acquire()
+            await limiter.release(0.1)
+
+    asyncio.run(run())
+    assert limiter.limit == 5
+    assert limiter.in_flight == 0
+
+def test_throttle_halves_once_per_round_trip():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16)
+
+    async def run():
+        await limiter.acquire()
+        await limiter.release(1.0)
+        for _ in range(3):
+            await limiter.acquire()
+        for _ in range(3):
+            await limiter.release(1.0, throttled=True)
+
+    asyncio.run(run())
+    assert limiter.throttle_events == 3
+    assert 8 <= limiter.limit < 9
+
+def test_latency_spike_decreases_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, latency_tolerance=2.0)
+
+    async def run():
+        await limiter.acquire()
+        await limiter.release(0.1)
+        await limiter.acquire()
+        with patch("adaptive_concurrency.time.monotonic", return_value=1e9):
+            await limiter.release(1.0)
+
+    asyncio.run(run())
+    assert limiter.limit < 10
+
+def test_acquire_respects_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+    peak = 0
+
+    async def worker():
+        nonlocal peak
+        await limiter.acquire()
+        peak = max(peak, limiter.in_flight)
+        await asyncio.sleep(0.01)
+        await limiter.release(0.01)
+
+    async def run():
+        await asyncio.gather(*(worker() for _ in range(10)))
+
+    asyncio.run(run())
+    assert peak == 2
+
+def test_limit_never_below_minimum():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, min_limit=1)
+
+    async def run():
+        for _ in range(5):
+            await limiter.acquire()
+            limiter._last_decrease = float("-inf")
+            await limiter.release(0.1, throttled=True)
+
+    asyncio.run(run())
+    assert limiter.limit == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__])
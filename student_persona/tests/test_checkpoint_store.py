@@ -0,0 +1,63 @@
+import pytest
+import csv
+import json
+from checkpoint_store import CheckpointStore, persona_id
+
+MOCK_PERSONAS = [
+    {"id": "1", "persona": "I am a 7-year-old who loves math and science."},
+    {"id": "2", "persona": "I'm a high school student preparing for college."},
+    {"id": "3", "persona": "As a computer science major in university..."},
+]
+
+def read_csv(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+def test_persona_id_falls_back_to_text_hash():
+    assert persona_id({"id": 5, "persona": "x"}) == "5"
+    assert persona_id({"persona": "x"}) == persona_id({"persona": "x"})
+    assert persona_id({"persona": "x"}) != persona_id({"persona": "y"})
+
+def test_record_writes_csv_incrementally(tmp_path):
+    """Test that each result is visible in the CSV as soon as it is recorded"""
+    with CheckpointStore(tmp_path) as store:
+        store.record(MOCK_PERSONAS[0], "primary")
+        assert read_csv(tmp_path / "primary_students.csv") == [MOCK_PERSONAS[0]]
+        store.record(MOCK_PERSONAS[1], "middle")
+        store.record(MOCK_PERSONAS[0], "primary")  # Duplicate is ignored
+        assert store.counts["primary"] == 1
+
+    assert read_csv(tmp_path / "middle_students.csv") == [MOCK_PERSONAS[1]]
+
+def test_resume_skips_finished_personas(tmp_path):
+    """Test that a reopened store skips ids recorded by an earlier run"""
+    with CheckpointStore(tmp_path) as store:
+        store.record(MOCK_PERSONAS[0], "primary")
+        store.record(MOCK_PERSONAS[1], "middle")
+
+    with CheckpointStore(tmp_path) as store:
+        assert "1" in store and "2" in store
+        assert list(store.filter_pending(MOCK_PERSONAS)) == [MOCK_PERSONAS[2]]
+        store.record(MOCK_PERSONAS[2], "undergraduate")
+
+    # CSVs are rebuilt from the journal rather than duplicated
+    assert read_csv(tmp_path / "primary_students.csv") == [MOCK_PERSONAS[0]]
+    assert read_csv(tmp_path / "undergraduate_students.csv") == [MOCK_PERSONAS[2]]
+
+def test_truncated_journal_is_recovered(tmp_path):
+    """Test that a partially written last record is dropped on restart"""
+    with CheckpointStore(tmp_path) as store:
+        store.record(MOCK_PERSONAS[0], "primary")
+
+    with open(tmp_path / "classified.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "2", "category": "middle", "persona": MOCK_PERSONAS[1]})[:20])
+
+    with CheckpointStore(tmp_path) as store:
+        assert store.done_ids == {"1"}
+        store.record(MOCK_PERSONAS[1], "middle")
+
+    with CheckpointStore(tmp_path) as store:
+        assert store.done_ids == {"1", "2"}
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,51 @@
+import pytest
+from classification_cache import ClassificationCache, normalize_persona
+
+TEMPLATE = "Persona: {persona}"
+
+def test_normalize_persona_merges_near_duplicates():
+    assert normalize_persona("A  Young child\nwho loves math.") == normalize_persona("a young child who loves math")
+
+def test_key_depends_on_prompt_model_and_temperature():
+    key = ClassificationCache.make_key("a student", TEMPLATE, "deepseek-chat", 0.2)
+    assert key == ClassificationCache.make_key("A student.", TEMPLATE, "deepseek-chat", 0.2)
+    assert key != ClassificationCache.make_key("a student", "Other: {persona}", "deepseek-chat", 0.2)
+    assert key != ClassificationCache.make_key("a student", TEMPLATE, "llama", 0.2)
+    assert key != ClassificationCache.make_key("a student", TEMPLATE, "deepseek-chat", 0)
+
+def test_hit_miss_counters():
+    cache = ClassificationCache()
+    assert cache.get("k") is None
+    cache.put("k", "middle")
+    assert cache.get("k") == "middle"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted once the cap is hit"""
+    cache = ClassificationCache(max_entries=2)
+    cache.put("a", "primary")
+    cache.put("b", "middle")
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", "other")
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "primary"
+    assert cache.get("c") == "other"
+
+def test_cache_persists_across_instances(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = ClassificationCache(path, max_entries=2)
+    cache.put("a", "primary")
+    cache.put("b", "middle")
+    cache.close()
+
+    cache = ClassificationCache(path, max_entries=2)
+    assert len(cache) == 2
+    cache.get("a")
+    cache.put("c", "other")  # Recency survives the restart, so "b" goes
+    assert cache.get("b") is None
+    assert cache.get("a") == "primary"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,30 @@
+import pytest
+from columnar import csv_to_arrow
+from extract_from_personaHub import save_categories
+
+try:
+    import pyarrow as pa
+except ImportError:  # missing, or built against another NumPy
+    pytest.skip("pyarrow is not available", allow_module_level=True)
+
+def read_arrow(path):
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+def test_csv_to_arrow_round_trip(tmp_path):
+    """Test that the Arrow copy keeps every row, including multi-line values, as strings"""
+    csv_path = tmp_path / "middle_students.csv"
+    csv_path.write_text('id,persona\n1,"A line\nbreak"\n002,Plain\n', encoding="utf-8")
+
+    table = read_arrow(csv_to_arrow(csv_path))
+    assert table.column_names == ["id", "persona"]
+    assert table.column("id").to_pylist() == ["1", "002"]
+    assert table.column("persona").to_pylist() == ["A line\nbreak", "Plain"]
+    assert not (tmp_path / "middle_students.arrow.tmp").exists()
+
+def test_save_categories_writes_arrow(tmp_path):
+    save_categories({"primary": [{"id": "1", "persona": "Primary school student"}], "other": []}, tmp_path)
+    assert read_arrow(tmp_path / "primary_students.arrow").num_rows == 1
+    assert not (tmp_path / "other_students.arrow").exists()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
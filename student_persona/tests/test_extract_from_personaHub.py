@@ -1,8 +1,16 @@
+import numpy as np
 import pytest
 from pathlib import Path
-from extract_from_personaHub import LocalLLM, DeepSeekLLM, save_categories
-from unittest.mock import Mock, patch, mock_open
+from extract_from_personaHub import (
+    LocalLLM, DeepSeekLLM, save_categories, iter_personas, chunked, parse_batch_labels, STUDENT_TYPES
+)
+from checkpoint_store import CheckpointStore
+from classification_cache import ClassificationCache
+from prefilter import KeywordPrefilter, PersonaPrefilter, load_labelled_personas
+from unittest.mock import AsyncMock, MagicMock, Mock, patch, mock_open
+import httpx
 import json
+import openai
 
 # Test data
 MOCK_PERSONAS = [
@@ -104,15 +112,330 @@ def test_invalid_llm_response(mock_local_llm):
         result = local_llm.analyze_student_types_batch(["test persona"])
         assert result == ["other"]  # Should default to "other" for invalid responses
 
-def test_deepseek_api_error(mock_deepseek_llm):
-    """Test handling of API errors in DeepSeekLLM"""
-    with patch('openai.OpenAI') as mock_client:
-        mock_instance = mock_client.return_value
-        mock_instance.chat.completions.create.side_effect = Exception("API Error")
-        
-        deepseek_llm = DeepSeekLLM("mock_api_key", "mock_base_url")
-        result = deepseek_llm.analyze_student_type("test persona")
-        assert result == "other"  # Should default to "other" on API errors
+@pytest.fixture
+def mock_openai():
+    """Patch the blocking OpenAI client so that `create` can be configured per test"""
+    with patch('extract_from_personaHub.OpenAI') as mock_client, \
+            patch('extract_from_personaHub.backoff_delay', return_value=0):
+        yield mock_client.return_value.chat.completions.create
+
+def test_deepseek_api_error(mock_openai):
+    """Test that a persona failing every retry is reported as a failure, not labelled"""
+    mock_openai.side_effect = openai.APIConnectionError(
+        request=httpx.Request("POST", "https://api.deepseek.com/v1/chat/completions")
+    )
+    deepseek_llm = DeepSeekLLM("mock_api_key", "mock_base_url", max_retries=2)
+    assert deepseek_llm.analyze_student_type("test persona") is None
+    assert mock_openai.call_count == 3
+
+def test_deepseek_retries_then_succeeds(mock_openai):
+    mock_openai.side_effect = [
+        openai.APIConnectionError(request=httpx.Request("POST", "https://api.deepseek.com/v1/chat/completions")),
+        Mock(choices=[Mock(message=Mock(content="teacher"))]),
+        Mock(choices=[Mock(message=Mock(content="Undergraduate"))]),
+    ]
+    assert DeepSeekLLM("mock_api_key", "mock_base_url").analyze_student_type("test persona") == "undergraduate"
+    assert mock_openai.call_count == 3
+
+def test_deepseek_invalid_label_falls_back_to_other(mock_openai):
+    mock_openai.return_value = Mock(choices=[Mock(message=Mock(content="teacher"))])
+    assert DeepSeekLLM("mock_api_key", "mock_base_url", max_retries=1).analyze_student_type("test persona") == "other"
+    assert mock_openai.call_count == 2
+
+def test_deepseek_non_retryable_error_is_raised(mock_openai):
+    mock_openai.side_effect = openai.AuthenticationError(
+        "bad key",
+        response=httpx.Response(401, request=httpx.Request("POST", "https://api.deepseek.com/v1/chat/completions")),
+        body=None
+    )
+    with pytest.raises(openai.AuthenticationError):
+        DeepSeekLLM("mock_api_key", "mock_base_url").analyze_student_type("test persona")
+    assert mock_openai.call_count == 1
+
+@pytest.fixture
+def persona_file(tmp_path):
+    path = tmp_path / "persona.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(100):
+            f.write(json.dumps({"id": str(i), "persona": f"Persona number {i}"}) + "\n")
+            if i == 50:
+                f.write("\n")  # Blank lines are skipped
+    return path
+
+def test_iter_personas_offset_and_limit(persona_file):
+    """Test that offset/limit select a window of the file"""
+    personas = list(iter_personas(persona_file, offset=10, limit=5))
+    assert [p["id"] for p in personas] == ["10", "11", "12", "13", "14"]
+
+    assert len(list(iter_personas(persona_file))) == 100
+    assert [p["id"] for p in iter_personas(persona_file, offset=98)] == ["98", "99"]
+
+def test_iter_personas_is_lazy(tmp_path):
+    """Test that lines outside the window are never parsed"""
+    path = tmp_path / "persona.jsonl"
+    path.write_text('{"id": "0", "persona": "ok"}\nnot json\n', encoding="utf-8")
+    assert [p["id"] for p in iter_personas(path, limit=1)] == ["0"]
+
+@pytest.mark.parametrize("num_shards", [1, 2, 3, 7, 150])
+def test_iter_personas_shards_partition_file(persona_file, num_shards):
+    """Test that shards are disjoint and together cover every line"""
+    ids = []
+    for shard_index in range(num_shards):
+        ids.extend(p["id"] for p in iter_personas(persona_file, shard_index=shard_index, num_shards=num_shards))
+    assert ids == [str(i) for i in range(100)]
+
+def test_iter_personas_invalid_shard(persona_file):
+    with pytest.raises(ValueError):
+        list(iter_personas(persona_file, shard_index=2, num_shards=2))
+
+def test_chunked():
+    assert list(chunked(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(chunked([], 3)) == []
+
+@pytest.fixture
+def mock_async_openai():
+    """Patch AsyncOpenAI so that `create` can be configured per test"""
+    with patch('extract_from_personaHub.AsyncOpenAI') as mock_client, \
+            patch('extract_from_personaHub.backoff_delay', return_value=0):
+        instance = mock_client.return_value
+        instance.__aenter__ = AsyncMock(return_value=instance)
+        instance.__aexit__ = AsyncMock(return_value=False)
+        instance.chat.completions.create = AsyncMock()
+        yield instance.chat.completions.create
+
+def completion(content, prompt_tokens=50, completion_tokens=2):
+    return Mock(
+        choices=[Mock(message=Mock(content=content))],
+        usage=Mock(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+def api_request():
+    return httpx.Request("POST", "https://api.deepseek.com/v1/chat/completions")
+
+def test_process_all_personas_skips_checkpointed(tmp_path, mock_async_openai):
+    """Test that personas already in the checkpoint store are not sent to the API"""
+    mock_async_openai.return_value = completion("other")
+    llm = DeepSeekLLM("mock_api_key", "mock_base_url")
+
+    with CheckpointStore(tmp_path) as store:
+        store.record(MOCK_PERSONAS[0], "primary")
+        store.record(MOCK_PERSONAS[1], "middle")
+        categories = llm.process_all_personas(MOCK_PERSONAS, store=store)
+
+    assert mock_async_openai.call_count == 2
+    assert sorted(p["id"] for p in categories["other"]) == ["3", "4"]
+
+    with CheckpointStore(tmp_path) as store:
+        assert store.counts == {"primary": 1, "middle": 1, "undergraduate": 0, "other": 2}
+
+def test_async_process_all_personas_categorizes(mock_async_openai):
+    """Test that the async engine returns every persona under its label"""
+    labels = {p["persona"]: label for p, label in zip(MOCK_PERSONAS, ["primary", "middle", "undergraduate", "other"])}
+
+    async def create(messages, **kwargs):
+        persona = messages[0]["content"].split("Persona: ")[-1]
+        return completion(labels[persona])
+
+    mock_async_openai.side_effect = create
+    categories = DeepSeekLLM("mock_api_key", "mock_base_url").process_all_personas(MOCK_PERSONAS)
+    assert {k: [p["id"] for p in v] for k, v in categories.items()} == {
+        "primary": ["1"], "middle": ["2"], "undergraduate": ["3"], "other": ["4"]
+    }
+
+def test_async_retries_rate_limit_and_backs_off(mock_async_openai):
+    """Test that a 429 is retried, returns its result and shrinks the concurrency limit"""
+    rate_limited = openai.RateLimitError(
+        "rate limited", response=httpx.Response(429, request=api_request()), body=None
+    )
+    mock_async_openai.side_effect = [rate_limited, completion("middle")]
+    llm = DeepSeekLLM("mock_api_key", "mock_base_url", max_workers=8)
+
+    categories = llm.process_all_personas(MOCK_PERSONAS[:1])
+    assert [p["id"] for p in categories["middle"]] == ["1"]
+    assert mock_async_openai.call_count == 2
+    assert llm.concurrency_limit < 8
+
+def test_async_gives_up_without_recording(tmp_path, mock_async_openai):
+    """Test that personas failing every retry are left for the next run"""
+    mock_async_openai.side_effect = openai.APIConnectionError(request=api_request())
+    llm = DeepSeekLLM("mock_api_key", "mock_base_url", max_retries=2)
+
+    with CheckpointStore(tmp_path) as store:
+        categories = llm.process_all_personas(MOCK_PERSONAS[:1], store=store)
+        assert not store.done_ids
+
+    assert all(not personas for personas in categories.values())
+    assert mock_async_openai.call_count == 3
+
+def test_async_invalid_label_falls_back_to_other(mock_async_openai):
+    mock_async_openai.return_value = completion("teacher")
+    llm = DeepSeekLLM("mock_api_key", "mock_base_url", max_retries=1)
+    categories = llm.process_all_personas(MOCK_PERSONAS[:1])
+    assert [p["id"] for p in categories["other"]] == ["1"]
+    assert mock_async_openai.call_count == 2
+
+def test_async_non_retryable_error_is_raised(mock_async_openai):
+    mock_async_openai.side_effect = openai.AuthenticationError(
+        "bad key", response=httpx.Response(401, request=api_request()), body=None
+    )
+    with pytest.raises(openai.AuthenticationError):
+        DeepSeekLLM("mock_api_key", "mock_base_url").process_all_personas(MOCK_PERSONAS[:1])
+    assert mock_async_openai.call_count == 1
+
+def test_parse_batch_labels():
+    """Test that only well-formed, in-range, unambiguous entries are kept"""
+    content = '```json\n[{"index": 1, "label": "Primary"}, {"index": 2, "label": "teacher"}, {"index": 4, "label": "other"}]\n```'
+    assert parse_batch_labels(content, 3) == {1: "primary"}
+
+    conflicting = '[{"index": 1, "label": "middle"}, {"index": 1, "label": "other"}, {"index": 2, "label": "other"}]'
+    assert parse_batch_labels(conflicting, 2) == {2: "other"}
+
+    truncated = '[{"index": 1, "label": "middle"}, {"index": 2, "label": "undergraduate"}, {"index": 3, "la'
+    assert parse_batch_labels(truncated, 3) == {1: "middle", 2: "undergraduate"}
+
+    assert parse_batch_labels("I cannot help with that", 3) == {}
+
+def test_batched_prompt_mode_with_fallback(mock_async_openai):
+    """Test that one request classifies a batch and unparsed entries are re-asked singly"""
+    async def create(messages, **kwargs):
+        content = messages[0]["content"]
+        if "JSON array" in content:
+            return completion(
+                '[{"index": 1, "label": "primary"}, {"index": 2, "label": "middle"}, {"index": 3, "label": "??"}]',
+                prompt_tokens=200, completion_tokens=30,
+            )
+        return completion("other")
+
+    mock_async_openai.side_effect = create
+    llm = DeepSeekLLM("mock_api_key", "mock_base_url", batch_size=3)
+    categories = llm.process_all_personas(MOCK_PERSONAS)
+
+    assert {k: sorted(p["id"] for p in v) for k, v in categories.items()} == {
+        "primary": ["1"], "middle": ["2"], "undergraduate": [], "other": ["3", "4"]
+    }
+    # One batched request for personas 1-3, then single requests for 3 and 4
+    assert mock_async_openai.call_count == 3
+    assert llm.batch_fallbacks == 1
+    assert llm.usage["personas"] == 5
+    assert llm.tokens_per_persona()["total"] == pytest.approx((200 + 30 + 2 * 52) / 5)
+
+LABEL_TOKENS = {" primary": [11], " middle": [12], " undergraduate": [13, 15], " other": [14]}
+PROMPT_TOKENS = [1, 2, 3]
+
+@pytest.fixture
+def mock_scoring_llm():
+    with patch('extract_from_personaHub.LLM', create=True) as mock_llm, \
+            patch('extract_from_personaHub.SamplingParams', create=True) as mock_sampling_params:
+        instance = mock_llm.return_value
+        instance.get_tokenizer.return_value.encode.side_effect = (
+            lambda text, **kwargs: LABEL_TOKENS.get(text, PROMPT_TOKENS)
+        )
+        instance.sampling_params = mock_sampling_params
+        yield instance
+
+def scoring_generate(token_logprobs):
+    """generate() stand-in where prompt token t of persona n has logprob token_logprobs[n][t]"""
+    def generate(prompts, params):
+        return [
+            Mock(prompt_logprobs=[None] + [
+                {t: Mock(logprob=token_logprobs[i // len(STUDENT_TYPES)].get(t, -1.0))}
+                for t in prompt["prompt_token_ids"][1:]
+            ])
+            for i, prompt in enumerate(prompts)
+        ]
+    return generate
+
+def test_local_llm_scoring_mode(mock_scoring_llm):
+    """Test that score mode scores every label and renormalises over them"""
+    mock_scoring_llm.generate.side_effect = scoring_generate([
+        {11: -0.1, 12: -2.5, 13: -2.0, 15: -2.0, 14: -4.0},
+        {11: -3.0, 12: -3.0, 13: -0.2, 15: -0.1, 14: -5.0},
+    ])
+    llm = LocalLLM("mock_model_path", mode="score")
+    scored = llm.analyze_student_types_scored(["a", "b"])
+
+    assert scored[0].label == "primary"
+    assert sum(scored[0].probabilities.values()) == pytest.approx(1.0)
+    assert scored[0].confidence == pytest.approx(scored[0].probabilities["primary"])
+    # A multi-token label is scored on all of its tokens
+    assert scored[0].probabilities["undergraduate"] == pytest.approx(scored[0].probabilities["other"])
+    assert scored[1].label == "undergraduate"
+    # Every label gets a probability, however unlikely
+    assert all(p > 0 for p in scored[1].probabilities.values())
+    assert scored[1].confidence == pytest.approx(1 / (1 + 2 * np.exp(-2.7) + np.exp(-4.7)))
+
+    # One prompt per persona and label, each ending in the label's tokens
+    prompts = mock_scoring_llm.generate.call_args[0][0]
+    assert [prompt["prompt_token_ids"] for prompt in prompts[:4]] == [
+        PROMPT_TOKENS + tokens for tokens in LABEL_TOKENS.values()
+    ]
+    scoring_kwargs = mock_scoring_llm.sampling_params.call_args.kwargs
+    assert scoring_kwargs["max_tokens"] == 1
+    assert scoring_kwargs["prompt_logprobs"] == 0
+
+def test_local_llm_scoring_without_label_tokens_falls_back_to_other(mock_scoring_llm):
+    """Test that a persona whose prompt logprobs hold none of the label tokens is 'other' with confidence 0, not NaN"""
+    mock_scoring_llm.generate.side_effect = lambda prompts, params: [
+        Mock(prompt_logprobs=[None] + [{} for _ in prompt["prompt_token_ids"][1:]]) for prompt in prompts
+    ]
+    llm = LocalLLM("mock_model_path", mode="score")
+    for scored in llm.analyze_student_types_scored(["a", "b"]):
+        assert scored.label == "other"
+        assert scored.confidence == 0
+        assert scored.probabilities == {label: 0.0 for label in STUDENT_TYPES}
+
+def test_local_llm_scoring_mode_process_all_personas(tmp_path, mock_scoring_llm):
+    """Test that score mode labels every persona and journals its confidence"""
+    mock_scoring_llm.generate.side_effect = scoring_generate([
+        {token: -0.1 if token in favoured else -3.0 for token in (11, 12, 13, 14, 15)}
+        for favoured in LABEL_TOKENS.values()
+    ])
+    llm = LocalLLM("mock_model_path", mode="score")
+    with CheckpointStore(tmp_path) as store:
+        categories = llm.process_all_personas(MOCK_PERSONAS, store=store)
+    assert {k: [p["id"] for p in v] for k, v in categories.items()} == {
+        "primary": ["1"], "middle": ["2"], "undergraduate": ["3"], "other": ["4"]
+    }
+    encoded = [call.args[0] for call in mock_scoring_llm.get_tokenizer.return_value.encode.call_args_list]
+    assert encoded[-1].endswith("Answer:")
+
+    with open(tmp_path / "classified.jsonl", encoding="utf-8") as f:
+        confidences = [json.loads(line)["confidence"] for line in f]
+    assert len(confidences) == 4 and all(0.25 < confidence <= 1 for confidence in confidences)
+
+def test_prefilter_short_circuits_llm(tmp_path, mock_async_openai):
+    """Test that personas decided by the prefilter never reach the API but are still recorded"""
+    mock_async_openai.return_value = completion("middle")
+    prefilter = PersonaPrefilter([KeywordPrefilter()])
+    llm = DeepSeekLLM("mock_api_key", "mock_base_url", prefilter=prefilter)
+    personas = [
+        {"id": "1", "persona": "A retired engineer who restores clocks"},
+        {"id": "2", "persona": "A middle school student who likes chess"},
+    ]
+
+    with CheckpointStore(tmp_path) as store:
+        categories = llm.process_all_personas(personas, store=store)
+        assert store.counts["other"] == 1
+
+    assert mock_async_openai.call_count == 1
+    assert [p["id"] for p in categories["other"]] == ["1"]
+    assert [p["id"] for p in categories["middle"]] == ["2"]
+    assert prefilter.summary()["short_circuit_rate"] == 0.5
+    # Only the LLM's labels are training data for the tfidf tier
+    assert load_labelled_personas(tmp_path) == (["A middle school student who likes chess"], ["middle"])
+
+def test_deepseek_uses_classification_cache():
+    """Test that repeated (near-duplicate) personas are answered from the cache"""
+    with patch('extract_from_personaHub.OpenAI') as mock_client:
+        create = mock_client.return_value.chat.completions.create
+        create.return_value = Mock(choices=[Mock(message=Mock(content="middle"))])
+        cache = ClassificationCache()
+        llm = DeepSeekLLM("mock_api_key", "mock_base_url", cache=cache)
+
+        assert llm.analyze_student_type("A high school student.") == "middle"
+        assert llm.analyze_student_type("a high  school student") == "middle"
+        assert create.call_count == 1
+        assert cache.hits == 1
 
 if __name__ == "__main__":
     pytest.main([__file__]) 
\ No newline at end of file
@@ -0,0 +1,77 @@
+import pytest
+import json
+from prefilter import KeywordPrefilter, PersonaPrefilter, TfidfPrefilter, load_labelled_personas
+
+def test_keyword_prefilter_routes_obvious_adults():
+    predictions = KeywordPrefilter().predict([
+        "A retired engineer who enjoys woodworking",
+        "A CFO of a mid-sized logistics company",
+        "A high school student preparing for the SAT",
+        "A parent of a middle school student",
+        "An aspiring data scientist learning NLP",
+        "Someone who likes hiking",
+    ])
+    assert predictions == ["other", "other", None, None, None, None]
+
+def test_keyword_prefilter_threshold():
+    texts = ["A retired engineer who enjoys woodworking", "A lawyer", "A lawyer and former lawyer"]
+    assert KeywordPrefilter(min_matches=2).predict(texts) == ["other", None, None]
+    with pytest.raises(ValueError):
+        KeywordPrefilter(min_matches=0)
+
+def training_data():
+    texts = (
+        [f"a young child in grade {i} who loves drawing" for i in range(1, 6)] * 4
+        + [f"a retired banker number {i} who plays golf" for i in range(20)]
+    )
+    labels = ["primary"] * 20 + ["other"] * 20
+    return texts, labels
+
+def test_tfidf_prefilter_respects_thresholds():
+    texts, labels = training_data()
+    confident = TfidfPrefilter(thresholds={"other": 0.5, "primary": 0.5}).fit(texts, labels)
+    assert confident.predict(["a retired banker who plays golf", "a young child who loves drawing"]) == [
+        "other", "primary"
+    ]
+
+    cautious = TfidfPrefilter(thresholds={"other": 1.0, "primary": 1.0}).fit(texts, labels)
+    assert cautious.predict(["a retired banker who plays golf"]) == [None]
+
+def test_persona_prefilter_routes_and_counts():
+    prefilter = PersonaPrefilter([KeywordPrefilter()])
+    personas = [
+        {"id": "1", "persona": "A retired engineer"},
+        {"id": "2", "persona": "A middle school student"},
+    ]
+    decided, pending = prefilter.route(personas)
+
+    assert decided == [(personas[0], "other")]
+    assert pending == [personas[1]]
+    summary = prefilter.summary()
+    assert summary["keyword:other"] == 1
+    assert summary["llm"] == 1
+    assert summary["short_circuit_rate"] == 0.5
+
+def test_load_labelled_personas_from_journal_and_csvs(tmp_path):
+    (tmp_path / "primary_students.csv").write_text("persona\nA young child\n", encoding="utf-8")
+    (tmp_path / "others.csv").write_text("persona\nA lawyer\nA chef\n", encoding="utf-8")
+    assert load_labelled_personas(tmp_path) == (
+        ["A young child", "A lawyer", "A chef"], ["primary", "other", "other"]
+    )
+
+    with open(tmp_path / "classified.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "1", "category": "middle", "persona": {"persona": "A 7th grader"}}) + "\n")
+    assert load_labelled_personas(tmp_path) == (["A 7th grader"], ["middle"])
+
+def test_tfidf_training_skips_prefilter_labels(tmp_path):
+    """Test that only LLM-labelled journal records are used, so the tfidf tier does not learn its own output"""
+    from checkpoint_store import CheckpointStore
+    from prefilter import PREFILTER_SOURCE
+
+    with CheckpointStore(tmp_path) as store:
+        store.record({"id": "1", "persona": "A 7th grader"}, "middle")
+        store.record({"id": "2", "persona": "A retired engineer"}, "other", source=PREFILTER_SOURCE)
+    assert load_labelled_personas(tmp_path) == (["A 7th grader"], ["middle"])
+
+if __name__ == "__main__":
+    pytest.main([__file__])